@@ -5,170 +5,170 @@ Includes quality assurance for layout management and validation
 Uses Anthropic SDK for intelligent Manim code generation
 """
 
-import os
-import anthropic
-from anthropic.types import MessageParam
-from typing import Generator, List
-from functools import wraps
-from .models import AnsciOutline, AnsciSceneBlock, AnsciAnimation
+from __future__ import annotations
+
+import re
+import json
+import threading
+import contextvars
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Generator, List
+from .models import AnsciOutline, AnsciOutlineBlock, AnsciSceneBlock, AnsciAnimation
+from .outline import OutlineStream
+from .cache import DiskCache, make_key
+from .retrieval import DEFAULT_TOP_K, PaperIndex, format_passages
+from .similarity import SceneIndex
+from .routing import route, scene_routes
+from .clients import anthropic_client
+from .llm import (
+    cached_system,
+    is_paper_block,
+    paper_blocks,
+    format_usage,
+    stream_message,
+    track_usage,
+    with_paper_prefix,
+)
 from .verify import (
+    RUNTIME_MODULE,
+    SCENE_HEADER,
+    dry_run_manim_code,
     validate_generated_manim_code,
     ValidationResult,
     print_validation_summary,
 )
 
-from manim import Text, WHITE
-
-# Load API key directly from environment
-api_key = os.environ.get("ANTHROPIC_API_KEY")
-if not api_key:
-    # Try loading from .env file manually
-    env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                if line.startswith("ANTHROPIC_API_KEY="):
-                    api_key = line.split("=", 1)[1].strip()
-                    break
-
-# Initialize Anthropic client
-ANTHROPIC_CLIENT = anthropic.Anthropic(api_key=api_key)
-
-from manim import *
-
-
-class LayoutManager:
-    """Advanced layout management for Manim animations"""
-
-    # Screen boundaries with safe margins
-    SAFE_MARGIN = 0.5
-    SCREEN_WIDTH = 14.22  # Standard Manim config
-    SCREEN_HEIGHT = 8.0  # Standard Manim config
-
-    # Safe boundaries
-    LEFT_BOUND = -SCREEN_WIDTH / 2 + SAFE_MARGIN
-    RIGHT_BOUND = SCREEN_WIDTH / 2 - SAFE_MARGIN
-    TOP_BOUND = SCREEN_HEIGHT / 2 - SAFE_MARGIN
-    BOTTOM_BOUND = -SCREEN_HEIGHT / 2 + SAFE_MARGIN
-
-    @classmethod
-    def safe_position(cls, mobject, target_position):
-        """
-        Ensure a mobject is positioned within safe screen boundaries
-
-        Args:
-            mobject: The Manim object to position
-            target_position: [x, y, z] coordinates
-
-        Returns:
-            Safe position as array or list
-        """
-        x, y, z = target_position
-
-        # Get object dimensions - with fallbacks
-        try:
-            if hasattr(mobject, "get_width") and hasattr(mobject, "get_height"):
-                obj_width = mobject.get_width()
-                obj_height = mobject.get_height()
-            else:
-                obj_width = 1.0
-                obj_height = 0.5
-        except:
-            obj_width = 1.0
-            obj_height = 0.5
-
-        # Adjust x coordinate
-        half_width = obj_width / 2
-        if x - half_width < cls.LEFT_BOUND:
-            x = cls.LEFT_BOUND + half_width
-        elif x + half_width > cls.RIGHT_BOUND:
-            x = cls.RIGHT_BOUND - half_width
-
-        # Adjust y coordinate
-        half_height = obj_height / 2
-        if y + half_height > cls.TOP_BOUND:
-            y = cls.TOP_BOUND - half_height
-        elif y - half_height < cls.BOTTOM_BOUND:
-            y = cls.BOTTOM_BOUND + half_height
-
-        return np.array([x, y, z])
-
-
-class AnimationPresets:
-    """Predefined quality settings for consistent animations"""
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
 
-    # Timing presets
-    FAST = 0.5
-    NORMAL = 1.0
-    SLOW = 1.5
+# Bump whenever the scene prompts change so cached scenes are regenerated
+PROMPT_TEMPLATE_VERSION = 3
 
-    # Font size presets
-    TITLE_SIZE = 28
-    SUBTITLE_SIZE = 22
-    BODY_SIZE = 14
+# Sampling temperature for all scene calls in deterministic mode
+DETERMINISTIC_TEMPERATURE = 0.0
 
-    @classmethod
-    def get_title_text(cls, text, position=None):
-        """Create a title with consistent styling"""
-
-        from manim import Text, BLUE
-
-        text_obj = Text(text, font_size=cls.TITLE_SIZE, color=BLUE)
-
-        if position is not None:
-            safe_pos = LayoutManager.safe_position(text_obj, position)
-            text_obj.move_to(safe_pos)
-
-        return text_obj
-
-    @classmethod
-    def get_body_text(cls, text, position=None):
-        """Create body text with consistent styling"""
-
-        text_obj = Text(text, font_size=cls.BODY_SIZE, color=WHITE)
-
-        if position is not None:
-            safe_pos = LayoutManager.safe_position(text_obj, position)
-            text_obj.move_to(safe_pos)
-
-        return text_obj
-
-
-def validate_scene(scene_construct_method):
-    """
-    Decorator to add quality validation to scene construct methods
-    """
-
-    @wraps(scene_construct_method)
-    def wrapper(self, *args, **kwargs):
-        # Run the original construct method
-        result = scene_construct_method(self, *args, **kwargs)
+# Worked example included in the Manim system prompt
+_EXAMPLE_SCENE = r"""
+class Scene3(Scene):
+    @validate_scene
+    def construct(self):
+        title = AnimationPresets.get_title_text("Scaled Dot-Product Attention", [0, 3, 0])
+        self.play(Write(title))
+        self.wait(AnimationPresets.NORMAL)
 
-        # Perform quality checks
-        _run_quality_check(self)
+        formula = MathTex(r"\mathrm{softmax}\left(\frac{QK^T}{\sqrt{d_k}}\right)V", font_size=40)
+        formula.move_to(LayoutManager.safe_position(formula, [0, 1.5, 0]))
+        self.play(Write(formula), run_time=AnimationPresets.SLOW)
+        self.wait(2)
+
+        labels = VGroup(
+            *[AnimationPresets.get_body_text(name) for name in ("Query", "Key", "Value")]
+        ).arrange(RIGHT, buff=1.5)
+        boxes = VGroup(
+            *[
+                SurroundingRectangle(label, color=color, buff=0.2)
+                for label, color in zip(labels, (BLUE, GREEN, ORANGE))
+            ]
+        )
+        row = VGroup(labels, boxes)
+        row.move_to(LayoutManager.safe_position(row, [0, -0.5, 0]))
+        self.play(LaggedStart(*[Create(box) for box in boxes], lag_ratio=0.3), FadeIn(labels))
+        self.wait(2)
 
-        return result
+        note = AnimationPresets.get_body_text(
+            "Scaling by sqrt(d_k) keeps the softmax from saturating", [0, -2.5, 0]
+        )
+        self.play(FadeIn(note, shift=UP))
+        self.wait(3)
+        self.play(FadeOut(VGroup(title, formula, row, note)))
+"""
 
-    return wrapper
+# Static instructions for every Manim code call (code, code fix, scene block).
+# Sent as a cacheable system prompt, so scenes after the first read it from
+# the prompt cache; only the scene-specific request follows it. Keep it free of
+# per-scene values, and above the model's minimum cacheable prefix (1024
+# tokens), or it is not cached at all.
+MANIM_SYSTEM_PROMPT = (
+    f"""You are an expert Manim animator creating educational content. Each request gives you the content for one scene of a series (CONTENT TO ANIMATE), the scene's class name (SCENE NAME), a visual description and the animation context. Generate a complete, working Manim scene class that visualizes the given content.
 
+MANIM CODE REQUIREMENTS:
+1. Create a complete Scene class named exactly as SCENE NAME that inherits from Scene
+2. Include a construct(self) method with the animation logic
+3. Use safe positioning with LayoutManager.safe_position() for all objects
+4. Include quality validation with @validate_scene decorator
+5. Use AnimationPresets for consistent timing and styling
+6. Make the animation educational and visually engaging
+7. Import the quality assurance components with `from {RUNTIME_MODULE} import *` - do NOT define LayoutManager, validate_scene or AnimationPresets yourself
+8. The animation should be 45-60 seconds long with detailed explanations and multiple scenes
+9. Use multiple visual elements, step-by-step reveals, and rich transitions for high production value
+10. Include detailed diagrams, equations, graphs, and interactive elements
+11. Use vibrant colors, professional typography, and smooth transitions with variety
+12. Focus on making complex concepts easy to understand with rich, detailed visuals
+13. Consider the context and user preferences provided
+14. If this is part of a series, ensure it builds appropriately on previous concepts
+15. IMPORTANT: Only use basic Manim imports - do NOT import external libraries like librosa, scipy, etc.
+16. Use only: from manim import *, from {RUNTIME_MODULE} import *, numpy as np - no other imports
+17. Keep animations simple and avoid complex mathematical computations
+18. Include multiple visual elements: detailed graphs, step-by-step equations, comprehensive diagrams, animated text
+19. Add strategic wait() periods (2-4 seconds) to let viewers absorb information
+20. Use Write(), Create(), Transform(), FadeIn(), FadeOut(), ReplacementTransform() for engaging transitions
+21. Create professional-quality educational content with detailed narration timing
+22. Include at least 5-8 distinct visual elements or animation sequences
+23. Use multiple colors, highlight important parts, and create visual hierarchy
+24. Add explanatory text boxes, labels, and annotations for clarity
+25. Make each animation comprehensive and self-contained for maximum educational value
 
-def _run_quality_check(scene):
-    """
-    Run comprehensive quality check on a scene
-    """
+QUALITY ASSURANCE COMPONENTS (provided by {RUNTIME_MODULE}):
+- LayoutManager.safe_position(mobject, [x, y, z]) -> position keeping the object inside the safe frame
+- @validate_scene - decorator for construct()
+- AnimationPresets.FAST / NORMAL / SLOW run times (0.5 / 1.0 / 1.5 s)
+- AnimationPresets.TITLE_SIZE / SUBTITLE_SIZE / BODY_SIZE font sizes (28 / 22 / 14)
+- AnimationPresets.get_title_text(text, position=None), get_body_text(text, position=None)
+
+COMMON PITFALLS (these fail validation or rendering):
+- Use Text for plain words and MathTex/Tex only for LaTeX; never put LaTeX markup in Text
+- Use current Manim Community APIs: Create (not ShowCreation), Text/Tex/MathTex (not TextMobject/TexMobject)
+- No images, SVGs, sound files or other external assets - build every visual from Manim objects
+- No ThreeDScene, camera movement or updaters that depend on wall-clock time
+- Never call self.play() without at least one animation
+- Fade out or transform old objects before placing new ones in the same region, so nothing overlaps
+- Lay out groups with arrange() / next_to() and keep font sizes at or below 40 so text stays on screen
+- Do not index into MathTex submobjects by guessed positions; split the expression into separate strings instead
+- Only use color constants that exist in Manim (BLUE, GREEN, RED, YELLOW, ORANGE, PURPLE, TEAL, WHITE, GREY...)
 
-    if not hasattr(scene, "mobjects"):
-        print("✅ Quality check: No objects to validate")
-        return True
+TEMPLATE STRUCTURE:
+```python
+{SCENE_HEADER}
+class <SCENE NAME>(Scene):
+    @validate_scene
+    def construct(self):
+        # Your animation logic here
+        pass
+```
 
-    print(f"✅ Quality check: Validated {len(scene.mobjects)} objects")
-    return True
+EXAMPLE SCENE (for SCENE NAME "Scene3"):
+```python
+{SCENE_HEADER}"""
+    + _EXAMPLE_SCENE
+    + "```\n"
+)
 
 
 # Main Animation Creation Interface
 def create_ansci_animation(
     history: list[MessageParam],
-    outline: AnsciOutline,
+    outline: AnsciOutline | OutlineStream,
+    max_concurrency: int = 1,
+    single_call: bool = False,
+    paper_context: bool = False,
+    paper_index: PaperIndex | None = None,
+    retrieval_k: int = DEFAULT_TOP_K,
+    scene_cache: DiskCache | None = None,
+    refresh_cache: bool = False,
+    deterministic: bool = False,
+    similar_scenes: SceneIndex | None = None,
+    code_candidates: int = 1,
+    dry_run: bool = False,
 ) -> Generator[AnsciSceneBlock, None, None]:
     """
     Create animation scene blocks from chat history and outline using Anthropic SDK
@@ -176,97 +176,405 @@ def create_ansci_animation(
 
     Args:
         history: Chat history containing paper content and user messages
-        outline: Structured outline for the animation
+        outline: Structured outline for the animation, or an OutlineStream whose
+            blocks are picked up as the model writes them
+        max_concurrency: Number of outline blocks generated concurrently
+            (1 = strictly sequential). Scenes are always yielded in outline order.
+        single_call: Generate each scene's transcript, description and code in one
+            structured tool call, falling back to three separate calls on failure
+        paper_context: Send the paper document from history with every scene
+            call. It is marked cacheable, so after the first call it is read
+            from the provider's prompt cache instead of being reprocessed.
+        paper_index: Local retrieval index over the paper; when given, the top
+            retrieval_k passages for each outline block are added to its prompts
+        retrieval_k: Number of passages retrieved per outline block
+        scene_cache: Cache of validated scenes keyed by outline block, its
+            neighbours, prompt version and model, so only edited blocks are
+            regenerated (None disables it)
+        refresh_cache: Regenerate every scene even if it is cached
+        deterministic: Sample every scene call at temperature 0 so reruns of
+            the same outline give the same scenes
+        similar_scenes: Index of validated scenes from earlier runs; a block
+            that nearly duplicates an indexed one reuses its scene instead of
+            being generated, and new validated scenes are added to it
+        code_candidates: Request this many Manim code candidates per scene at
+            once and keep the first that validates, cancelling the rest
+            (1 = one draft followed by serial repairs; ignored when
+            deterministic, since every candidate would be identical)
+        dry_run: Also require a speculative candidate to pass
+            `manim --dry_run` before it wins
 
     Yields:
         AnsciSceneBlock: Individual scene blocks for the animation
     """
-    print(f"🎬 Creating animation from outline: '{outline.title}'")
-    print(f"📋 Processing {len(outline.blocks)} outline blocks")
+    if isinstance(outline, OutlineStream):
+        outline_title = outline.wait_title()
+        outline_blocks = outline.iter_blocks()
+        total_scenes = None
+        print(f"🎬 Creating animation from streaming outline: '{outline_title}'")
+    else:
+        outline_title = outline.title
+        outline_blocks = outline.blocks
+        total_scenes = len(outline.blocks)
+        print(f"🎬 Creating animation from outline: '{outline_title}'")
+        print(f"📋 Processing {total_scenes} outline blocks")
     print(f"💬 Using context from {len(history)} history messages")
 
     # Extract context from history for better generation
     user_context = _extract_context_from_history(history)
 
-    for i, outline_block in enumerate(outline.blocks):
-        print(f"🎬 Generating Scene {i+1}/{len(outline.blocks)}...")
+    scene_options = {
+        "single_call": single_call,
+        "paper_context": paper_context,
+        "paper_index": paper_index,
+        "retrieval_k": retrieval_k,
+        "scene_cache": scene_cache,
+        "refresh_cache": refresh_cache,
+        "deterministic": deterministic,
+        "similar_scenes": similar_scenes,
+        "code_candidates": code_candidates,
+        "dry_run": dry_run,
+    }
 
-        # Generate scene components from outline with context
-        transcript = _generate_transcript_from_outline(
-            outline_block.text, i, user_context
-        )
-        description = _generate_scene_description(outline_block.text, i, user_context)
+    # Neighbouring titles are part of each scene's cache key, so with the cache
+    # on a streamed block is scheduled once the block after it has arrived
+    if scene_cache is not None:
+        outline_blocks = _with_neighbours(outline_blocks)
+    else:
+        outline_blocks = ((block, None) for block in outline_blocks)
+
+    if max_concurrency <= 1:
+        for i, (outline_block, neighbours) in enumerate(outline_blocks):
+            yield _generate_scene_block(
+                history,
+                outline_block,
+                i,
+                outline_title,
+                total_scenes,
+                user_context,
+                neighbours=neighbours,
+                **scene_options,
+            )
+        return
+
+    print(f"⚡ Generating up to {max_concurrency} scenes concurrently")
+
+    # Block jobs wait on their transcript job, so transcripts get their own pool
+    # (sharing one bounded pool could deadlock once every worker is waiting)
+    with ThreadPoolExecutor(
+        max_workers=max_concurrency, thread_name_prefix="ansci-scene"
+    ) as scene_executor, ThreadPoolExecutor(
+        max_workers=max_concurrency, thread_name_prefix="ansci-transcript"
+    ) as transcript_executor:
+        futures = []
+        next_scene = 0
+        try:
+            for i, (outline_block, neighbours) in enumerate(outline_blocks):
+                futures.append(
+                    scene_executor.submit(
+                        _generate_scene_block,
+                        history,
+                        outline_block,
+                        i,
+                        outline_title,
+                        total_scenes,
+                        user_context,
+                        transcript_executor,
+                        neighbours=neighbours,
+                        **scene_options,
+                    )
+                )
 
-        # Generate Manim code using Anthropic with full context
-        manim_code = _generate_manim_code_from_content(
-            content=outline_block.text,
-            scene_name=f"Scene{i+1}",
-            description=description,
-            context={
-                "history": history,
-                "outline_title": outline.title,
-                "scene_index": i,
-                "total_scenes": len(outline.blocks),
-                "user_context": user_context,
-            },
+                # Hand back finished scenes while a streaming outline is still
+                # being written
+                while next_scene < len(futures) and futures[next_scene].done():
+                    yield futures[next_scene].result()
+                    next_scene += 1
+
+            # Yield in outline order; later scenes keep generating meanwhile
+            for future in futures[next_scene:]:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _with_neighbours(blocks):
+    """Pair each outline block with its previous and next block titles"""
+    previous = None
+    iterator = iter(blocks)
+    current = next(iterator, None)
+    while current is not None:
+        following = next(iterator, None)
+        yield current, (
+            previous.block_title if previous else None,
+            following.block_title if following else None,
         )
+        previous, current = current, following
+
+
+def _scene_cache_key(
+    outline_block: AnsciOutlineBlock,
+    outline_title: str,
+    neighbours: tuple | None,
+    user_context: dict,
+    passages: str,
+    paper: list[MessageParam] | None,
+    single_call: bool,
+    deterministic: bool,
+) -> str:
+    """Cache key covering everything that goes into a scene's prompts"""
+    return make_key(
+        "scene",
+        PROMPT_TEMPLATE_VERSION,
+        scene_routes(),
+        outline_title,
+        outline_block.block_title,
+        outline_block.text,
+        list(neighbours or ()),
+        user_context,
+        passages,
+        paper_blocks(paper),
+        single_call,
+        deterministic,
+    )
+
+
+def _rename_scene_class(code: str, old_name: str, new_name: str) -> str:
+    """Point a cached scene's class at its position in the current outline"""
+    if old_name == new_name:
+        return code
+    return re.sub(rf"\b{re.escape(old_name)}\b", new_name, code)
+
+
+def _temperature(default: float, deterministic: bool) -> float:
+    return DETERMINISTIC_TEMPERATURE if deterministic else default
 
-        # 🔍 IMMEDIATE VALIDATION: Verify the generated Manim code
-        print(f"🔍 Validating Scene {i+1} Manim code...")
-        validation_result = validate_generated_manim_code(manim_code)
 
-        # Handle validation failures with retry logic
-        max_retries = 2
-        retry_count = 0
+def _generate_scene_block(
+    history: list[MessageParam], outline_block: AnsciOutlineBlock, i: int, *args, **kwargs
+) -> AnsciSceneBlock:
+    """Build scene block i and report the token and prompt cache use of its calls"""
+    with track_usage() as usage:
+        scene_block = _build_scene_block(history, outline_block, i, *args, **kwargs)
+    if usage["calls"]:
+        print(f"📊 Scene {i+1} usage: {format_usage(usage)}")
+    return scene_block
+
+
+def _build_scene_block(
+    history: list[MessageParam],
+    outline_block: AnsciOutlineBlock,
+    i: int,
+    outline_title: str,
+    total_scenes: int | None,
+    user_context: dict,
+    transcript_executor: Executor | None = None,
+    single_call: bool = False,
+    paper_context: bool = False,
+    paper_index: PaperIndex | None = None,
+    retrieval_k: int = DEFAULT_TOP_K,
+    scene_cache: DiskCache | None = None,
+    refresh_cache: bool = False,
+    deterministic: bool = False,
+    similar_scenes: SceneIndex | None = None,
+    code_candidates: int = 1,
+    dry_run: bool = False,
+    neighbours: tuple | None = None,
+) -> AnsciSceneBlock:
+    """
+    Generate, validate and repair the scene block for outline block i
+    (total_scenes is None while a streaming outline is still being written)
+
+    With single_call the whole block comes from one structured tool call. Otherwise
+    (or if that fails) transcript, description and code use separate calls; with a
+    transcript_executor the transcript call runs in parallel with the
+    description -> code chain, which does not depend on it. With paper_context
+    every call is prefixed with the (prompt-cached) paper document; with a
+    paper_index the prompts carry the passages retrieved for this block instead.
+
+    Scenes that pass validation and came entirely from the model (no fallback
+    transcript, description or template code) are stored in scene_cache under
+    a key of the block, its neighbours (previous, next titles) and every prompt
+    input, and reused as-is on later runs. On a miss, a near-duplicate block in
+    similar_scenes (e.g. the same concept in another paper) supplies the scene.
+    """
+    scene_name = f"Scene{i+1}"
+    print(f"🎬 Generating Scene {i+1}/{total_scenes or '?'}...")
+
+    paper = history if paper_context else None
+    passages = ""
+    if paper_index is not None:
+        passages = format_passages(
+            paper_index.search(
+                f"{outline_block.block_title} {outline_block.text}", retrieval_k
+            )
+        )
 
-        while not validation_result.is_valid and retry_count < max_retries:
-            retry_count += 1
+    cache_key = None
+    if scene_cache is not None:
+        cache_key = _scene_cache_key(
+            outline_block,
+            outline_title,
+            neighbours,
+            user_context,
+            passages,
+            paper,
+            single_call,
+            deterministic,
+        )
+        cached = None if refresh_cache else scene_cache.get_json(cache_key)
+        if cached is not None:
+            scene_block = AnsciSceneBlock(**cached["block"])
+            scene_block.manim_code = _rename_scene_class(
+                scene_block.manim_code, cached["scene_name"], scene_name
+            )
+            print(f"💾 Scene {i+1} cache hit - skipping generation")
+            return scene_block
+
+    if similar_scenes is not None and not refresh_cache:
+        match = similar_scenes.lookup(outline_block)
+        if match is not None:
+            scene_block, source_name, score = match
+            scene_block.manim_code = _rename_scene_class(
+                scene_block.manim_code, source_name, scene_name
+            )
             print(
-                f"❌ Scene {i+1} validation failed (attempt {retry_count}/{max_retries}):"
+                f"♻️  Scene {i+1} reuses a similar earlier scene "
+                f"({score:.0%} match) - skipping generation"
             )
-            for error in validation_result.errors:
-                print(f"   - {error}")
-
-            if retry_count < max_retries:
-                print(f"🔄 Regenerating Scene {i+1} with improved prompts...")
-
-                # Regenerate with more specific error-aware prompts
-                manim_code = _generate_manim_code_with_validation_fixes(
-                    content=outline_block.text,
-                    scene_name=f"Scene{i+1}",
-                    description=description,
-                    context={
-                        "history": history,
-                        "outline_title": outline.title,
-                        "scene_index": i,
-                        "total_scenes": len(outline.blocks),
-                        "user_context": user_context,
-                    },
-                    previous_errors=validation_result.errors,
-                )
+            return scene_block
+
+    scene_context = {
+        "history": history,
+        "paper": paper,
+        "passages": passages,
+        "outline_title": outline_title,
+        "scene_index": i,
+        "total_scenes": total_scenes,
+        "user_context": user_context,
+        "deterministic": deterministic,
+    }
 
-                # Re-validate the regenerated code
-                validation_result = validate_generated_manim_code(manim_code)
+    structured_block = None
+    if single_call:
+        structured_block = _generate_scene_block_with_tool(
+            outline_block.text, f"Scene{i+1}", scene_context
+        )
+        if structured_block is None:
+            print(f"🔄 Falling back to separate calls for Scene {i+1}...")
+
+    transcript_future = None
+    if structured_block is not None:
+        transcript = structured_block.transcript
+        description = structured_block.description
+        manim_code = structured_block.manim_code
+        transcript_generated = description_generated = code_generated = True
+    else:
+        # Generate scene components from outline with context
+        if transcript_executor is not None:
+            # Run in a copy of this context so track_usage() counts the call
+            transcript_future = transcript_executor.submit(
+                contextvars.copy_context().run,
+                _generate_transcript_from_outline,
+                outline_block.text,
+                i,
+                user_context,
+                paper,
+                passages,
+                deterministic,
+            )
+        else:
+            transcript, transcript_generated = _generate_transcript_from_outline(
+                outline_block.text, i, user_context, paper, passages, deterministic
+            )
+        description, description_generated = _generate_scene_description(
+            outline_block.text, i, user_context, paper, passages, deterministic
+        )
 
-        # Final validation check
-        if validation_result.is_valid:
-            print(f"✅ Scene {i+1} validation passed!")
-            if validation_result.warnings:
-                print(f"⚠️  Warnings for Scene {i+1}:")
-                for warning in validation_result.warnings:
-                    print(f"   - {warning}")
+        # Generate Manim code using Anthropic with full context
+        if code_candidates > 1 and anthropic_client() and not deterministic:
+            manim_code, code_generated = _generate_code_speculatively(
+                outline_block.text,
+                scene_name,
+                description,
+                scene_context,
+                code_candidates,
+                dry_run,
+            )
         else:
-            print(f"❌ Scene {i+1} validation failed after {max_retries} attempts:")
-            for error in validation_result.errors:
-                print(f"   - {error}")
-            print(f"⚠️  Proceeding with Scene {i+1} despite validation errors...")
+            manim_code, code_generated = _generate_manim_code_from_content(
+                content=outline_block.text,
+                scene_name=scene_name,
+                description=description,
+                context=scene_context,
+            )
+
+    # 🔍 IMMEDIATE VALIDATION: Verify the generated Manim code
+    print(f"🔍 Validating Scene {i+1} Manim code...")
+    validation_result = validate_generated_manim_code(manim_code)
+
+    # Handle validation failures with retry logic
+    max_retries = 2
+    retry_count = 0
+
+    while not validation_result.is_valid and retry_count < max_retries:
+        retry_count += 1
+        print(
+            f"❌ Scene {i+1} validation failed (attempt {retry_count}/{max_retries}):"
+        )
+        for error in validation_result.errors:
+            print(f"   - {error}")
+
+        if retry_count < max_retries:
+            print(f"🔄 Regenerating Scene {i+1} with improved prompts...")
+
+            # Regenerate with more specific error-aware prompts
+            manim_code, code_generated = _generate_manim_code_with_validation_fixes(
+                content=outline_block.text,
+                scene_name=f"Scene{i+1}",
+                description=description,
+                context=scene_context,
+                previous_errors=validation_result.errors,
+            )
 
-        scene_block = AnsciSceneBlock(
-            transcript=transcript, description=description, manim_code=manim_code
+            # Re-validate the regenerated code
+            validation_result = validate_generated_manim_code(manim_code)
+
+    # Final validation check
+    if validation_result.is_valid:
+        print(f"✅ Scene {i+1} validation passed!")
+        if validation_result.warnings:
+            print(f"⚠️  Warnings for Scene {i+1}:")
+            for warning in validation_result.warnings:
+                print(f"   - {warning}")
+    else:
+        print(f"❌ Scene {i+1} validation failed after {max_retries} attempts:")
+        for error in validation_result.errors:
+            print(f"   - {error}")
+        print(f"⚠️  Proceeding with Scene {i+1} despite validation errors...")
+
+    if transcript_future is not None:
+        transcript, transcript_generated = transcript_future.result()
+
+    scene_block = AnsciSceneBlock(
+        transcript=transcript, description=description, manim_code=manim_code
+    )
+
+    # Only validated, fully generated scenes are cached, so failures and
+    # fallbacks are retried next run
+    generated = transcript_generated and description_generated and code_generated
+    if not generated:
+        print(f"⚠️  Scene {i+1} uses fallback content - not caching or indexing it")
+    if cache_key is not None and validation_result.is_valid and generated:
+        scene_cache.put_json(
+            cache_key, {"scene_name": scene_name, "block": scene_block.model_dump()}
         )
+    if similar_scenes is not None and validation_result.is_valid and generated:
+        similar_scenes.add(outline_block, scene_name, scene_block)
 
-        print(f"✅ Generated Scene {i+1}: {description[:50]}...")
-        yield scene_block
+    print(f"✅ Generated Scene {i+1}: {description[:50]}...")
+    return scene_block
 
 
 def _extract_context_from_history(history: list[MessageParam]) -> dict:
@@ -287,6 +595,9 @@ def _extract_context_from_history(history: list[MessageParam]) -> dict:
             text_content = ""
             if isinstance(content, list):
                 for item in content:
+                    # The paper itself (as extracted text) is not user context
+                    if is_paper_block(item):
+                        continue
                     if isinstance(item, dict) and item.get("type") == "text":
                         text_content += item.get("text", "") + " "
             elif isinstance(content, str):
@@ -320,6 +631,8 @@ def _extract_context_from_history(history: list[MessageParam]) -> dict:
             content_str = content
         elif isinstance(content, list):
             for item in content:
+                if is_paper_block(item):
+                    continue
                 if isinstance(item, dict) and item.get("type") == "text":
                     content_str += item.get("text", "") + " "
                 elif isinstance(item, str):
@@ -335,7 +648,10 @@ def _extract_context_from_history(history: list[MessageParam]) -> dict:
 
 
 def create_complete_animation(
-    outline: AnsciOutline, history: list[MessageParam]
+    outline: AnsciOutline,
+    history: list[MessageParam],
+    max_concurrency: int = 1,
+    single_call: bool = False,
 ) -> AnsciAnimation:
     """
     Create a complete animation from an outline with comprehensive validation
@@ -343,6 +659,8 @@ def create_complete_animation(
     Args:
         outline: Structured outline for the animation
         history: Optional chat history for context
+        max_concurrency: Number of outline blocks generated concurrently
+        single_call: Generate each scene with one structured tool call
 
     Returns:
         AnsciAnimation: Complete animation ready for rendering
@@ -350,7 +668,14 @@ def create_complete_animation(
     print("🎬 Creating complete animation with validation...")
 
     # Generate all scene blocks with validation
-    scene_blocks = list(create_ansci_animation(history=history, outline=outline))
+    scene_blocks = list(
+        create_ansci_animation(
+            history=history,
+            outline=outline,
+            max_concurrency=max_concurrency,
+            single_call=single_call,
+        )
+    )
 
     # Final validation summary
     validation_results = []
@@ -377,12 +702,22 @@ def create_complete_animation(
 
 # Helper functions for content generation
 def _generate_transcript_from_outline(
-    content: str, scene_index: int, context: dict
-) -> str:
-    """Generate narration transcript from outline content with context awareness"""
+    content: str,
+    scene_index: int,
+    context: dict,
+    paper: list[MessageParam] | None = None,
+    passages: str = "",
+    deterministic: bool = False,
+) -> tuple[str, bool]:
+    """
+    Generate narration transcript from outline content with context awareness
+
+    Returns:
+        (transcript, True if it came from the model rather than the fallback)
+    """
 
     # If we have Anthropic API, use it for intelligent transcript generation
-    if ANTHROPIC_CLIENT and context:
+    if anthropic_client() and context:
         try:
             prompt = f"""
 Generate a clear, engaging narration transcript for an educational animation. 
@@ -392,6 +727,7 @@ SCENE INDEX: {scene_index + 1}
 USER CONTEXT: {context.get('user_preferences', [])}
 KEY TOPICS: {context.get('key_topics', [])}
 FOCUS AREAS: {context.get('focus_areas', [])}
+{passages}
 
 Requirements:
 - 30-60 seconds of narration (about 75-150 words)
@@ -404,45 +740,44 @@ Requirements:
 Generate ONLY the transcript text, no additional formatting.
 """
 
-            response = ANTHROPIC_CLIENT.messages.create(
-                model="claude-sonnet-4-20250514",  # Sonnet 4 with 400k input context
-                max_tokens=32000,  # Maximum output tokens for Sonnet 4
-                temperature=1.0,
-                stream=True,  # Enable streaming for long requests
-                messages=[{"role": "user", "content": prompt}],
+            transcript_route = route("transcript")
+            response = stream_message(
+                anthropic_client(),
+                f"transcript Scene{scene_index + 1}",
+                task="transcript",
+                model=transcript_route.model,
+                max_tokens=transcript_route.max_tokens,
+                temperature=_temperature(1.0, deterministic),
+                messages=with_paper_prefix(paper, prompt),
             )
 
-            # Collect streamed response
-            full_response = ""
-            for chunk in response:
-                if (
-                    chunk.type == "content_block_delta"
-                    and chunk.delta.type == "text_delta"
-                ):
-                    full_response += chunk.delta.text
-
-            return full_response.strip()
+            return (response.text.strip(), True)
         except Exception as e:
             print(f"⚠️  Anthropic transcript generation failed: {e}")
 
-    # Fallback to predefined transcripts
-    transcripts = [
-        "Traditional neural networks processed text sequentially, one word at a time. This approach was slow and couldn't take advantage of parallel computing.",
-        "The attention mechanism changed everything. Instead of processing words one by one, attention allows the model to look at all words simultaneously.",
-        "Self-attention is the core innovation. Every word in a sentence looks at every other word to understand its meaning in context.",
-        "Multi-head attention uses multiple attention mechanisms in parallel, capturing various types of linguistic patterns simultaneously.",
-        "The Transformer architecture combines these attention mechanisms into a complete system with encoder and decoder stacks.",
-        "This breakthrough enabled the AI revolution we see today. From BERT to GPT to ChatGPT, virtually all modern language AI uses Transformers.",
-    ]
+    # Fallback: narrate the outline block itself (retries are exhausted by
+    # now, and canned text about some other paper is worse than the outline)
+    print(f"⚠️  Narrating Scene{scene_index + 1} from its outline text")
+    return (content, False)
 
-    return transcripts[scene_index] if scene_index < len(transcripts) else content
 
+def _generate_scene_description(
+    content: str,
+    scene_index: int,
+    context: dict,
+    paper: list[MessageParam] | None = None,
+    passages: str = "",
+    deterministic: bool = False,
+) -> tuple[str, bool]:
+    """
+    Generate visual description from content with context awareness
 
-def _generate_scene_description(content: str, scene_index: int, context: dict) -> str:
-    """Generate visual description from content with context awareness"""
+    Returns:
+        (description, True if it came from the model rather than the fallback)
+    """
 
     # If we have Anthropic API, use it for intelligent description generation
-    if ANTHROPIC_CLIENT and context:
+    if anthropic_client() and context:
         try:
             prompt = f"""
 Generate a clear visual description for an educational animation scene.
@@ -451,6 +786,7 @@ CONTENT: {content}
 SCENE INDEX: {scene_index + 1}
 USER CONTEXT: {context.get('user_preferences', [])}
 KEY TOPICS: {context.get('key_topics', [])}
+{passages}
 
 Requirements:
 - Describe the visual elements and animations
@@ -463,180 +799,268 @@ Requirements:
 Generate ONLY the description text, no additional formatting.
 """
 
-            response = ANTHROPIC_CLIENT.messages.create(
-                model="claude-sonnet-4-20250514",  # Use Sonnet 4 for high quality descriptions
-                max_tokens=8192,  # Maximum tokens for Sonnet 4
-                temperature=1.0,
-                stream=True,  # Enable streaming for long requests
-                messages=[{"role": "user", "content": prompt}],
+            description_route = route("description")
+            response = stream_message(
+                anthropic_client(),
+                f"description Scene{scene_index + 1}",
+                task="description",
+                model=description_route.model,
+                max_tokens=description_route.max_tokens,
+                temperature=_temperature(1.0, deterministic),
+                messages=with_paper_prefix(paper, prompt),
             )
 
-            # Collect streamed response
-            full_response = ""
-            for chunk in response:
-                if (
-                    chunk.type == "content_block_delta"
-                    and chunk.delta.type == "text_delta"
-                ):
-                    full_response += chunk.delta.text
-
-            return full_response.strip()
+            return (response.text.strip(), True)
         except Exception as e:
             print(f"⚠️  Anthropic description generation failed: {e}")
 
-    # Fallback descriptions
-    descriptions = [
-        "Visual showing sequential processing vs parallel processing demonstration",
-        "Animation of attention weights as colored connections between words",
-        "Diagram showing self-attention mechanism with Q, K, V matrices",
-        "Multiple attention heads working in parallel with different patterns",
-        "Complete Transformer architecture with encoder-decoder structure",
-        "Timeline showing impact from 2017 Transformer paper to modern AI",
-    ]
-
-    return (
-        descriptions[scene_index]
-        if scene_index < len(descriptions)
-        else f"Visual representation of: {content[:100]}..."
-    )
+    # Fallback description derived from the outline block
+    return (f"Visual representation of: {content[:100]}...", False)
 
 
 def _generate_manim_code_from_content(
     content: str, scene_name: str, description: str, context: dict
-) -> str:
-    """Generate Manim code from content and description using Anthropic SDK"""
+) -> tuple[str, bool]:
+    """
+    Generate Manim code from content and description using Anthropic SDK
+
+    Returns:
+        (code, True if it came from the model rather than the template)
+    """
 
     # Try to use Anthropic SDK for intelligent generation
-    if ANTHROPIC_CLIENT:
+    if anthropic_client():
         try:
-            return _generate_manim_code_with_anthropic(
-                content, scene_name, description, context
+            return (
+                _generate_manim_code_with_anthropic(
+                    content, scene_name, description, context
+                ),
+                True,
             )
         except Exception as e:
             print(f"⚠️  Anthropic generation failed: {e}")
             print("🔄 Falling back to template-based generation...")
 
     # Fallback to template-based generation
-    return _generate_manim_code_template(content, scene_name, description)
+    return (_generate_manim_code_template(content, scene_name, description), False)
+
+
+def _generate_code_speculatively(
+    content: str,
+    scene_name: str,
+    description: str,
+    context: dict,
+    candidates: int,
+    dry_run: bool = False,
+) -> tuple[str, bool]:
+    """
+    Request several Manim code candidates at once and keep the first valid one
+
+    Each candidate is validated as soon as its stream completes; the first to
+    pass (and, with dry_run, to survive `manim --dry_run`) wins and the other
+    streams are cancelled. If none passes, the first candidate to finish is
+    returned so the usual repair loop can take over.
+
+    Returns:
+        (code, True if it came from the model rather than the template)
+    """
+    print(f"🎲 Requesting {candidates} code candidates for {scene_name}...")
+    cancel = threading.Event()
+    fallback = None
+
+    # Not a with-block: returning must not wait for cancelled streams to wind
+    # down (they stop at their next chunk)
+    executor = ThreadPoolExecutor(
+        max_workers=candidates, thread_name_prefix="ansci-candidate"
+    )
+    try:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _generate_manim_code_with_anthropic,
+                content,
+                scene_name,
+                description,
+                context,
+                cancel,
+            )
+            for _ in range(candidates)
+        ]
+        for finished, future in enumerate(as_completed(futures), start=1):
+            try:
+                code = future.result()
+            except Exception as e:
+                print(f"⚠️  Code candidate for {scene_name} failed: {e}")
+                continue
+            if code is None:
+                continue
+
+            if fallback is None:
+                fallback = code
+            result = validate_generated_manim_code(code)
+            if result.is_valid and dry_run:
+                result = dry_run_manim_code(code, scene_name)
+            if result.is_valid:
+                cancel.set()
+                print(
+                    f"🏁 {scene_name}: candidate {finished}/{candidates} to finish "
+                    "passed validation - cancelling the rest"
+                )
+                return (code, True)
+            print(
+                f"❌ {scene_name}: candidate {finished}/{candidates} failed "
+                f"validation ({'; '.join(result.errors)[:100]})"
+            )
+    finally:
+        cancel.set()
+        executor.shutdown(wait=False)
+
+    if fallback is None:
+        print("🔄 Falling back to template-based generation...")
+        return (_generate_manim_code_template(content, scene_name, description), False)
+    return (fallback, True)
 
 
 def _generate_manim_code_with_anthropic(
-    content: str, scene_name: str, description: str, context: dict
-) -> str:
-    """Generate Manim code using Anthropic SDK for intelligent content creation"""
+    content: str,
+    scene_name: str,
+    description: str,
+    context: dict,
+    cancel: threading.Event | None = None,
+) -> str | None:
+    """
+    Generate Manim code using Anthropic SDK for intelligent content creation
+    (None if the call was cancelled through the cancel event)
+    """
 
     # Build context-aware prompt
-    context_info = ""
-    if context:
-        context_info = f"""
-ANIMATION CONTEXT:
-- Overall Title: {context.get('outline_title', 'N/A')}
-- Scene {context.get('scene_index', 0) + 1} of {context.get('total_scenes', 1)}
-- User Preferences: {context.get('user_context', {}).get('user_preferences', [])}
-- Key Topics: {context.get('user_context', {}).get('key_topics', [])}
-- Focus Areas: {context.get('user_context', {}).get('focus_areas', [])}
-"""
+    context_info = _build_animation_context_info(context)
 
     prompt = f"""
-You are an expert Manim animator creating educational content. Generate a complete, working Manim scene class that visualizes the given content.
-
 CONTENT TO ANIMATE: {content}
 SCENE NAME: {scene_name}
 DESCRIPTION: {description}
 {context_info}
+Generate ONLY the Python code for the complete Manim scene. Make it educational, visually appealing, and focused on the content provided.
+"""
 
-REQUIREMENTS:
-1. Create a complete Scene class named "{scene_name}" that inherits from Scene
-2. Include a construct() method with the animation logic
-3. Use safe positioning with LayoutManager.safe_position() for all objects
-4. Include quality validation with @validate_scene decorator
-5. Use AnimationPresets for consistent timing and styling
-6. Make the animation educational and visually engaging
-7. Include proper imports and quality assurance components
-8. The animation should be 45-60 seconds long with detailed explanations and multiple scenes
-9. Use multiple visual elements, step-by-step reveals, and rich transitions for high production value
-10. Include detailed diagrams, equations, graphs, and interactive elements
-11. Use vibrant colors, professional typography, and smooth transitions with variety
-12. Focus on making complex concepts easy to understand with rich, detailed visuals
-13. Consider the context and user preferences provided
-14. If this is part of a series, ensure it builds appropriately on previous concepts
-15. IMPORTANT: Only use basic Manim imports - do NOT import external libraries like librosa, scipy, etc.
-16. Use only: from manim import *, numpy as np, functools.wraps - no other imports
-17. Keep animations simple and avoid complex mathematical computations
-18. Include multiple visual elements: detailed graphs, step-by-step equations, comprehensive diagrams, animated text
-19. Add strategic wait() periods (2-4 seconds) to let viewers absorb information
-20. Use Write(), Create(), Transform(), FadeIn(), FadeOut(), ReplacementTransform() for engaging transitions
-21. Create professional-quality educational content with detailed narration timing
-22. Include at least 5-8 distinct visual elements or animation sequences
-23. Use multiple colors, highlight important parts, and create visual hierarchy
-24. Add explanatory text boxes, labels, and annotations for clarity
-25. Make each animation comprehensive and self-contained for maximum educational value
+    code_route = route("code")
+    response = stream_message(
+        anthropic_client(),
+        f"code {scene_name}",
+        task="code",
+        model=code_route.model,
+        max_tokens=code_route.max_tokens,
+        temperature=_temperature(0.3, context.get("deterministic", False)),
+        system=cached_system(MANIM_SYSTEM_PROMPT),
+        messages=with_paper_prefix(context.get("paper"), prompt),
+        cancel=cancel,
+    )
+    if response.cancelled:
+        return None
 
-TEMPLATE STRUCTURE:
-```python
-from manim import *
-import numpy as np
-from functools import wraps
-
-# Quality Assurance Components
-class LayoutManager:
-    SAFE_MARGIN = 0.5
-    SCREEN_WIDTH = 14.22
-    SCREEN_HEIGHT = 8.0
-    LEFT_BOUND = -SCREEN_WIDTH/2 + SAFE_MARGIN
-    RIGHT_BOUND = SCREEN_WIDTH/2 - SAFE_MARGIN
-    TOP_BOUND = SCREEN_HEIGHT/2 - SAFE_MARGIN
-    BOTTOM_BOUND = -SCREEN_HEIGHT/2 + SAFE_MARGIN
-    
-    @classmethod
-    def safe_position(cls, mobject, target_position):
-        x, y, z = target_position
-        # [implement safe positioning logic]
-        return np.array([x, y, z])
-
-def validate_scene(func):
-    @wraps(func)
-    def wrapper(self, *args, **kwargs):
-        result = func(self, *args, **kwargs)
-        print("✅ Quality check: Scene validated")
-        return result
-    return wrapper
-
-class AnimationPresets:
-    FAST = 0.5
-    NORMAL = 1.0
-    SLOW = 1.5
-    TITLE_SIZE = 28
-    SUBTITLE_SIZE = 22
-    BODY_SIZE = 14
+    generated_code = _extract_code_block(response.text)
 
-class {scene_name}(Scene):
-    @validate_scene
-    def construct(self):
-        # Your animation logic here
-        pass
-```
+    print(f"✅ Generated Manim code using Anthropic SDK for {scene_name}")
+    return generated_code
 
-Generate ONLY the Python code for the complete Manim scene. Make it educational, visually appealing, and focused on the content provided.
+
+def _generate_scene_block_with_tool(
+    content: str, scene_name: str, context: dict
+) -> AnsciSceneBlock | None:
+    """
+    Generate transcript, description and Manim code in a single structured call
+    Uses the AnsciSceneBlock schema as a tool input_schema (like generate_outline),
+    so one request replaces the three separate transcript/description/code calls
+
+    Returns:
+        The generated scene block, or None if the call or parsing failed
+    """
+    if not anthropic_client():
+        return None
+
+    user_context = context.get("user_context", {}) if context else {}
+    prompt = f"""
+Create one complete scene of an educational animation: its narration transcript, a visual description, and the Manim code that animates it.
+
+CONTENT TO ANIMATE: {content}
+SCENE NAME: {scene_name}
+{_build_animation_context_info(context)}
+
+TRANSCRIPT REQUIREMENTS:
+- 30-60 seconds of narration (about 75-150 words)
+- Educational but accessible tone, engaging and conversational
+- Connect to the user's interests and questions: {user_context.get('user_preferences', [])}
+- Build on previous concepts if not the first scene
+- Plain narration text only, no formatting
+
+DESCRIPTION REQUIREMENTS:
+- 20-40 words describing what viewers will see
+- Specify visual elements, colors, layouts and transitions
+
+The manim_code field must follow the MANIM CODE REQUIREMENTS and contain ONLY Python code (no markdown fences). Narration, description and animation must describe the same scene.
 """
 
-    response = ANTHROPIC_CLIENT.messages.create(
-        model="claude-sonnet-4-20250514",  # Use Sonnet 4 for highest quality Manim code generation
-        max_tokens=8192,  # Maximum tokens for Sonnet 4 - allows for very detailed animations
-        temperature=0.3,
-        stream=True,  # Enable streaming for long requests
-        messages=[{"role": "user", "content": prompt}],
-    )
+    try:
+        block_route = route("scene_block")
+        response = stream_message(
+            anthropic_client(),
+            f"scene block {scene_name}",
+            task="scene_block",
+            model=block_route.model,
+            max_tokens=block_route.max_tokens,
+            temperature=_temperature(0.3, context.get("deterministic", False)),
+            system=cached_system(MANIM_SYSTEM_PROMPT),
+            messages=with_paper_prefix(context.get("paper"), prompt),
+            tools=[
+                {
+                    "name": "create_scene_block",
+                    "description": "Create a complete animated scene block",
+                    "input_schema": AnsciSceneBlock.model_json_schema(),
+                }
+            ],
+            tool_choice={"type": "tool", "name": "create_scene_block"},
+        )
+
+        if not response.tool_input_json:
+            print(f"⚠️  No structured scene returned for {scene_name}")
+            return None
+
+        scene_block = AnsciSceneBlock(**json.loads(response.tool_input_json))
+        scene_block.manim_code = _extract_code_block(scene_block.manim_code)
+
+        print(f"✅ Generated {scene_name} with a single structured call")
+        return scene_block
 
-    # Collect streamed response
-    full_response = ""
-    for chunk in response:
-        if chunk.type == "content_block_delta" and chunk.delta.type == "text_delta":
-            full_response += chunk.delta.text
+    except Exception as e:
+        print(f"⚠️  Structured scene generation failed for {scene_name}: {e}")
+        return None
 
-    generated_code = full_response
 
-    # Extract code from response if it's wrapped in markdown
+def _build_animation_context_info(context: dict) -> str:
+    """Describe where a scene sits in the animation, for code generation prompts"""
+    if not context:
+        return ""
+
+    scene_position = f"Scene {context.get('scene_index', 0) + 1}"
+    if context.get("total_scenes"):
+        scene_position += f" of {context['total_scenes']}"
+
+    return f"""
+ANIMATION CONTEXT:
+- Overall Title: {context.get('outline_title', 'N/A')}
+- {scene_position}
+- User Preferences: {context.get('user_context', {}).get('user_preferences', [])}
+- Key Topics: {context.get('user_context', {}).get('key_topics', [])}
+- Focus Areas: {context.get('user_context', {}).get('focus_areas', [])}
+{context.get('passages', '')}
+"""
+
+
+def _extract_code_block(response_text: str) -> str:
+    """Extract code from a model response if it's wrapped in markdown"""
+    generated_code = response_text
+
     if "```python" in generated_code:
         start = generated_code.find("```python") + 9
         end = generated_code.find("```", start)
@@ -646,7 +1070,6 @@ Generate ONLY the Python code for the complete Manim scene. Make it educational,
         end = generated_code.find("```", start)
         generated_code = generated_code[start:end].strip()
 
-    print(f"✅ Generated Manim code using Anthropic SDK for {scene_name}")
     return generated_code
 
 
@@ -657,52 +1080,7 @@ def _generate_manim_code_template(
 
     # Base template for Manim scenes with integrated quality assurance
     base_template = f'''
-from manim import *
-import numpy as np
-from functools import wraps
-
-# Quality Assurance Components (embedded for standalone scenes)
-class LayoutManager:
-    """Safe positioning for animations"""
-    
-    SAFE_MARGIN = 0.5
-    SCREEN_WIDTH = 14.22
-    SCREEN_HEIGHT = 8.0
-    LEFT_BOUND = -SCREEN_WIDTH/2 + SAFE_MARGIN
-    RIGHT_BOUND = SCREEN_WIDTH/2 - SAFE_MARGIN
-    TOP_BOUND = SCREEN_HEIGHT/2 - SAFE_MARGIN
-    BOTTOM_BOUND = -SCREEN_HEIGHT/2 + SAFE_MARGIN
-    
-    @classmethod
-    def safe_position(cls, mobject, target_position):
-        x, y, z = target_position
-        try:
-            obj_width = mobject.get_width() if hasattr(mobject, 'get_width') else 1.0
-            obj_height = mobject.get_height() if hasattr(mobject, 'get_height') else 0.5
-        except:
-            obj_width, obj_height = 1.0, 0.5
-        
-        half_width = obj_width / 2
-        if x - half_width < cls.LEFT_BOUND:
-            x = cls.LEFT_BOUND + half_width
-        elif x + half_width > cls.RIGHT_BOUND:
-            x = cls.RIGHT_BOUND - half_width
-        
-        half_height = obj_height / 2
-        if y + half_height > cls.TOP_BOUND:
-            y = cls.TOP_BOUND - half_height
-        elif y - half_height < cls.BOTTOM_BOUND:
-            y = cls.BOTTOM_BOUND + half_height
-        
-        return np.array([x, y, z])
-
-def validate_scene(func):
-    @wraps(func)
-    def wrapper(self, *args, **kwargs):
-        result = func(self, *args, **kwargs)
-        print("✅ Quality check: Scene validated")
-        return result
-    return wrapper
+{SCENE_HEADER}
 
 class {scene_name}(Scene):
     """Auto-generated scene: {description}"""
@@ -732,15 +1110,6 @@ class {scene_name}(Scene):
         """Main content of the scene"""
         {_get_scene_specific_content(scene_name, content)}
 
-# Animation timing and styling presets
-class AnimationPresets:
-    FAST = 0.5
-    NORMAL = 1.0 
-    SLOW = 1.5
-    TITLE_SIZE = 28
-    SUBTITLE_SIZE = 22
-    BODY_SIZE = 14
-
 if __name__ == "__main__":
     scene = {scene_name}()
     print(f"Generated {{scene.__class__.__name__}} with quality assurance")
@@ -880,8 +1249,13 @@ def _generate_manim_code_with_validation_fixes(
     description: str,
     context: dict,
     previous_errors: List[str],
-) -> str:
-    """Generate Manim code with specific fixes for validation errors"""
+) -> tuple[str, bool]:
+    """
+    Generate Manim code with specific fixes for validation errors
+
+    Returns:
+        (code, True if it came from the model rather than the template)
+    """
 
     # Build error-specific instructions
     error_instructions = ""
@@ -918,21 +1292,25 @@ def _generate_manim_code_with_validation_fixes(
                 "- Avoid external libraries like librosa, scipy, etc.\n"
             )
             error_instructions += (
-                "- Include: import numpy as np, from functools import wraps\n"
+                f"- Include: from {RUNTIME_MODULE} import * for LayoutManager, "
+                "AnimationPresets and validate_scene\n"
             )
 
     # Try to use Anthropic SDK for intelligent generation with error fixes
-    if ANTHROPIC_CLIENT:
+    if anthropic_client():
         try:
-            return _generate_manim_code_with_anthropic_and_fixes(
-                content, scene_name, description, context, error_instructions
+            return (
+                _generate_manim_code_with_anthropic_and_fixes(
+                    content, scene_name, description, context, error_instructions
+                ),
+                True,
             )
         except Exception as e:
             print(f"⚠️  Anthropic generation with fixes failed: {e}")
             print("🔄 Falling back to template-based generation...")
 
     # Fallback to template-based generation
-    return _generate_manim_code_template(content, scene_name, description)
+    return (_generate_manim_code_template(content, scene_name, description), False)
 
 
 def _generate_manim_code_with_anthropic_and_fixes(
@@ -945,126 +1323,32 @@ def _generate_manim_code_with_anthropic_and_fixes(
     """Generate Manim code using Anthropic SDK with specific error fixes"""
 
     # Build context-aware prompt with error fixes
-    context_info = ""
-    if context:
-        context_info = f"""
-ANIMATION CONTEXT:
-- Overall Title: {context.get('outline_title', 'N/A')}
-- Scene {context.get('scene_index', 0) + 1} of {context.get('total_scenes', 1)}
-- User Preferences: {context.get('user_context', {}).get('user_preferences', [])}
-- Key Topics: {context.get('user_context', {}).get('key_topics', [])}
-- Focus Areas: {context.get('user_context', {}).get('focus_areas', [])}
-"""
+    context_info = _build_animation_context_info(context)
 
     prompt = f"""
-You are an expert Manim animator creating educational content. Generate a complete, working Manim scene class that visualizes the given content.
-
 CONTENT TO ANIMATE: {content}
 SCENE NAME: {scene_name}
 DESCRIPTION: {description}
 {context_info}
 {error_instructions}
-
-CRITICAL REQUIREMENTS (MUST FOLLOW EXACTLY):
-1. Create a complete Scene class named "{scene_name}" that inherits from Scene
-2. Include a construct(self) method with the animation logic
-3. Use safe positioning with LayoutManager.safe_position() for all objects
-4. Include quality validation with @validate_scene decorator
-5. Use AnimationPresets for consistent timing and styling
-6. Make the animation educational and visually engaging
-7. Include proper imports and quality assurance components
-8. The animation should be 45-60 seconds long with detailed explanations and multiple scenes
-9. Use multiple visual elements, step-by-step reveals, and rich transitions for high production value
-10. Include detailed diagrams, equations, graphs, and interactive elements
-11. Use vibrant colors, professional typography, and smooth transitions with variety
-12. Focus on making complex concepts easy to understand with rich, detailed visuals
-13. Consider the context and user preferences provided
-14. If this is part of a series, ensure it builds appropriately on previous concepts
-15. IMPORTANT: Only use basic Manim imports - do NOT import external libraries like librosa, scipy, etc.
-16. Use only: from manim import *, numpy as np, functools.wraps - no other imports
-17. Keep animations simple and avoid complex mathematical computations
-18. Include multiple visual elements: detailed graphs, step-by-step equations, comprehensive diagrams, animated text
-19. Add strategic wait() periods (2-4 seconds) to let viewers absorb information
-20. Use Write(), Create(), Transform(), FadeIn(), FadeOut(), ReplacementTransform() for engaging transitions
-21. Create professional-quality educational content with detailed narration timing
-22. Include at least 5-8 distinct visual elements or animation sequences
-23. Use multiple colors, highlight important parts, and create visual hierarchy
-24. Add explanatory text boxes, labels, and annotations for clarity
-25. Make each animation comprehensive and self-contained for maximum educational value
-
-TEMPLATE STRUCTURE:
-```python
-from manim import *
-import numpy as np
-from functools import wraps
-
-# Quality Assurance Components
-class LayoutManager:
-    SAFE_MARGIN = 0.5
-    SCREEN_WIDTH = 14.22
-    SCREEN_HEIGHT = 8.0
-    LEFT_BOUND = -SCREEN_WIDTH/2 + SAFE_MARGIN
-    RIGHT_BOUND = SCREEN_WIDTH/2 - SAFE_MARGIN
-    TOP_BOUND = SCREEN_HEIGHT/2 - SAFE_MARGIN
-    BOTTOM_BOUND = -SCREEN_HEIGHT/2 + SAFE_MARGIN
-    
-    @classmethod
-    def safe_position(cls, mobject, target_position):
-        x, y, z = target_position
-        # [implement safe positioning logic]
-        return np.array([x, y, z])
-
-def validate_scene(func):
-    @wraps(func)
-    def wrapper(self, *args, **kwargs):
-        result = func(self, *args, **kwargs)
-        print("✅ Quality check: Scene validated")
-        return result
-    return wrapper
-
-class AnimationPresets:
-    FAST = 0.5
-    NORMAL = 1.0
-    SLOW = 1.5
-    TITLE_SIZE = 28
-    SUBTITLE_SIZE = 22
-    BODY_SIZE = 14
-
-class {scene_name}(Scene):
-    @validate_scene
-    def construct(self):
-        # Your animation logic here
-        pass
-```
-
-Generate ONLY the Python code for the complete Manim scene. Make it educational, visually appealing, and focused on the content provided. Ensure it passes all validation checks.
+Follow the MANIM CODE REQUIREMENTS exactly. Generate ONLY the Python code for the complete Manim scene. Make it educational, visually appealing, and focused on the content provided. Ensure it passes all validation checks.
 """
 
-    response = ANTHROPIC_CLIENT.messages.create(
-        model="claude-sonnet-4-20250514",  # Use Sonnet 4 for highest quality Manim code generation
-        max_tokens=8192,  # Maximum tokens for Sonnet 4 - allows for very detailed animations
-        temperature=0.2,  # Lower temperature for more consistent, error-free code
-        stream=True,  # Enable streaming for long requests
-        messages=[{"role": "user", "content": prompt}],
+    # Code that failed validation escalates to the (stronger) repair model
+    repair_route = route("repair")
+    response = stream_message(
+        anthropic_client(),
+        f"code fix {scene_name}",
+        task="repair",
+        model=repair_route.model,
+        max_tokens=repair_route.max_tokens,
+        # Lower temperature for more consistent, error-free code
+        temperature=_temperature(0.2, context.get("deterministic", False)),
+        system=cached_system(MANIM_SYSTEM_PROMPT),
+        messages=with_paper_prefix(context.get("paper"), prompt),
     )
 
-    # Collect streamed response
-    full_response = ""
-    for chunk in response:
-        if chunk.type == "content_block_delta" and chunk.delta.type == "text_delta":
-            full_response += chunk.delta.text
-
-    generated_code = full_response
-
-    # Extract code from response if it's wrapped in markdown
-    if "```python" in generated_code:
-        start = generated_code.find("```python") + 9
-        end = generated_code.find("```", start)
-        generated_code = generated_code[start:end].strip()
-    elif "```" in generated_code:
-        start = generated_code.find("```") + 3
-        end = generated_code.find("```", start)
-        generated_code = generated_code[start:end].strip()
+    generated_code = _extract_code_block(response.text)
 
     print(f"✅ Regenerated Manim code with validation fixes for {scene_name}")
     return generated_code
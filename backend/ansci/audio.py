@@ -8,35 +8,50 @@ import os
 import json
 import subprocess
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
-from lmnt.api import Speech
 
 from .animate import create_audiovisual_scene_block
 from .models import AnsciSceneBlock, AnsciAnimation
-
-# Load API key directly from environment
-lmnt_api_key = os.environ.get("LMNT_API_KEY")
-if not lmnt_api_key:
-    # Try loading from .env file manually
-    env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                if line.startswith("LMNT_API_KEY="):
-                    lmnt_api_key = line.split("=", 1)[1].strip()
-                    break
-
-# Initialize LMNT client
-assert lmnt_api_key is not None, "LMNT_API_KEY is not set"
+from .cache import AudioCache
+from .resilience import call_async, lmnt_endpoint
+from .clients import run_lmnt
+
+# Maximum number of concurrent LMNT syntheses / ffmpeg jobs in batch mode
+DEFAULT_TTS_CONCURRENCY = 4
+
+# Default LMNT narration voice
+DEFAULT_VOICE = "leah"
+
+# Output settings for processed narration, optimized for Manim compatibility
+NARRATION_OUTPUT_ARGS = [
+    "-c:a",
+    "mp3",  # MP3 codec
+    "-b:a",
+    "128k",  # Consistent bitrate
+    "-ac",
+    "2",  # Force stereo (prevent Manim from doing mono->stereo conversion)
+    "-ar",
+    "48000",  # Use Manim's preferred sample rate
+    "-avoid_negative_ts",
+    "make_zero",  # Avoid timing issues
+]
 
 
 class AudioNarrationService:
     """Service for generating synchronized audio narrations using LMNT TTS"""
 
-    def __init__(self, output_dir: str | None = None):
+    def __init__(
+        self,
+        output_dir: str | None = None,
+        voice: str = DEFAULT_VOICE,
+        tts_cache: Optional[AudioCache] = None,
+    ):
         self.output_dir = Path(output_dir) if output_dir else Path("audio_output")
         self.output_dir.mkdir(exist_ok=True)
+        self.voice = voice
+        self.tts_cache = tts_cache
 
     def generate_narration_for_scene(
         self,
@@ -86,6 +101,103 @@ class AudioNarrationService:
             print(f"❌ Error generating narration for {scene_name}: {e}")
             return None
 
+    def generate_narrations_batch(
+        self,
+        scene_blocks: List[AnsciSceneBlock],
+        scene_names: List[str],
+        target_durations: List[float | None] | None = None,
+        max_concurrency: int = DEFAULT_TTS_CONCURRENCY,
+    ) -> List[Optional[str]]:
+        """
+        Generate audio narrations for many scenes concurrently
+        All transcripts are synthesized on one event loop over a single shared
+        LMNT session, then the ffmpeg post-processing runs in parallel, so the
+        total time approaches the slowest scene rather than the sum
+
+        Args:
+            scene_blocks: Scene blocks containing transcripts
+            scene_names: Name for each scene's audio file
+            target_durations: Optional target duration per scene in seconds
+            max_concurrency: Maximum in-flight syntheses and ffmpeg jobs
+
+        Returns:
+            Path to each generated audio file (None where generation failed),
+            in the same order as scene_blocks
+        """
+        if not scene_blocks:
+            return []
+
+        if target_durations is None:
+            target_durations = [None] * len(scene_blocks)
+        max_concurrency = max(1, max_concurrency)
+
+        transcripts = [
+            self._adjust_transcript_for_animation_duration(
+                scene_block.transcript, scene_block.description, target_duration
+            )
+            for scene_block, target_duration in zip(scene_blocks, target_durations)
+        ]
+
+        # Serve unchanged narrations from the cache - no network call, no ffmpeg
+        cached_paths: List[Optional[str]] = [
+            self._fetch_cached_narration(transcript, scene_name, target_duration)
+            for transcript, scene_name, target_duration in zip(
+                transcripts, scene_names, target_durations
+            )
+        ]
+        pending = [i for i, path in enumerate(cached_paths) if path is None]
+
+        audio_data: List[Optional[bytes]] = [None] * len(transcripts)
+        if pending:
+            print(
+                f"🎙️  Synthesizing {len(pending)} narrations concurrently "
+                f"(max {max_concurrency} in flight)..."
+            )
+
+            try:
+                synthesized = run_lmnt(
+                    lambda speech: self._lmnt_synthesize_batch(
+                        speech,
+                        [transcripts[i] for i in pending],
+                        max_concurrency,
+                        self.voice,
+                    )
+                )
+            except Exception as e:
+                print(f"❌ Error calling LMNT TTS: {e}")
+                synthesized = [None] * len(pending)
+
+            for i, data in zip(pending, synthesized):
+                audio_data[i] = data
+
+        def finish(index: int) -> Optional[str]:
+            scene_name = scene_names[index]
+            if cached_paths[index]:
+                return cached_paths[index]
+
+            try:
+                audio_path = self._save_lmnt_audio(
+                    audio_data[index],
+                    transcripts[index],
+                    scene_name,
+                    target_durations[index],
+                )
+            except Exception as e:
+                print(f"❌ Error generating narration for {scene_name}: {e}")
+                return None
+
+            if audio_path:
+                print(f"✅ Audio generated for {scene_name}: {audio_path}")
+            else:
+                print(f"❌ Failed to generate audio for {scene_name}")
+            return audio_path
+
+        # ffmpeg post-processing is subprocess-bound, so threads run it in parallel
+        with ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="ansci-audio"
+        ) as executor:
+            return list(executor.map(finish, range(len(transcripts))))
+
     def generate_narrations_for_animation(
         self, animation: AnsciAnimation, video_paths: List[str]
     ) -> List[str]:
@@ -378,52 +490,135 @@ class AudioNarrationService:
             f"   🎤 Using LMNT TTS for high-quality narration (echo prevention enabled)"
         )
 
+        cached_path = self._fetch_cached_narration(text, scene_name, target_duration)
+        if cached_path:
+            return cached_path
+
         try:
             # Generate audio using LMNT async API
-            audio_data = asyncio.run(self._lmnt_synthesize(text))
+            audio_data = run_lmnt(
+                lambda speech: self._lmnt_synthesize(speech, text, self.voice)
+            )
+            return self._save_lmnt_audio(
+                audio_data, text, scene_name, target_duration
+            )
 
-            if audio_data:
-                # Save raw LMNT audio first
-                raw_audio_path = self.output_dir / f"{scene_name}_raw_lmnt.mp3"
-                with open(raw_audio_path, "wb") as f:
-                    f.write(audio_data)
+        except Exception as e:
+            print(f"❌ Error calling LMNT TTS: {e}")
+            # Try fallback TTS
+            return self._fallback_system_tts(text, scene_name, target_duration)
 
-                print(f"✅ LMNT TTS raw audio generated: {raw_audio_path}")
+    def _save_lmnt_audio(
+        self,
+        audio_data: Optional[bytes],
+        text: str,
+        scene_name: str,
+        target_duration: float | None = None,
+    ) -> Optional[str]:
+        """Write synthesized LMNT audio to disk and post-process it (or fall back)"""
+        if not audio_data:
+            print("❌ LMNT TTS failed to generate audio")
+            return self._fallback_system_tts(text, scene_name, target_duration)
 
-                # Process audio to prevent echo and improve quality
-                final_audio_path = self._process_audio_for_quality(
-                    raw_audio_path, scene_name, target_duration
-                )
+        # Save raw LMNT audio first
+        raw_audio_path = self.output_dir / f"{scene_name}_raw_lmnt.mp3"
+        with open(raw_audio_path, "wb") as f:
+            f.write(audio_data)
 
-                # Clean up raw file
-                if raw_audio_path.exists():
-                    raw_audio_path.unlink()
+        print(f"✅ LMNT TTS raw audio generated: {raw_audio_path}")
 
-                return final_audio_path
-            else:
-                print("❌ LMNT TTS failed to generate audio")
-                return self._fallback_system_tts(text, scene_name, target_duration)
+        # Process audio to prevent echo and improve quality
+        final_audio_path = self._process_audio_for_quality(
+            raw_audio_path,
+            scene_name,
+            target_duration,
+            cache_key=self._narration_cache_key(text, target_duration),
+        )
 
-        except Exception as e:
-            print(f"❌ Error calling LMNT TTS: {e}")
-            # Try fallback TTS
-            return self._fallback_system_tts(text, scene_name, target_duration)
+        # Clean up raw file
+        if raw_audio_path.exists():
+            raw_audio_path.unlink()
+
+        return final_audio_path
+
+    def _narration_cache_key(
+        self, text: str, target_duration: float | None = None
+    ) -> Optional[str]:
+        """Cache key for processed narration (None when caching is disabled)"""
+        if self.tts_cache is None:
+            return None
 
-    async def _lmnt_synthesize(self, text: str, voice: str = "leah") -> Optional[bytes]:
+        # The filter chain does not depend on the measured raw duration
+        filter_chain = self._build_quality_audio_filter(0.0, target_duration)
+        return self.tts_cache.key_for(
+            text, self.voice, filter_chain, NARRATION_OUTPUT_ARGS, target_duration
+        )
+
+    def _fetch_cached_narration(
+        self, text: str, scene_name: str, target_duration: float | None = None
+    ) -> Optional[str]:
+        """Copy cached narration for this transcript into output_dir, if present"""
+        cache_key = self._narration_cache_key(text, target_duration)
+        final_path = self.output_dir / f"{scene_name}_narration.mp3"
+
+        if cache_key is None or not self.tts_cache.fetch(cache_key, final_path):
+            # Never write through a stale output - it may be a hard link into the cache
+            final_path.unlink(missing_ok=True)
+            return None
+
+        print(f"💾 TTS cache hit for {scene_name} - skipping LMNT and ffmpeg")
+        return str(final_path)
+
+    async def _lmnt_synthesize(
+        self, speech, text: str, voice: str = DEFAULT_VOICE
+    ) -> Optional[bytes]:
         """Async helper to synthesize speech using LMNT with optimized settings"""
         try:
             print(f"   🗣️  Synthesizing with voice '{voice}' (optimized for clarity)")
-            async with Speech() as speech:
-                # Use LMNT with basic settings (sample_rate will be handled in post-processing)
-                synthesis = await speech.synthesize(text, voice)
-                print(
-                    f"   ✅ LMNT synthesis complete ({len(synthesis['audio'])} bytes)"
-                )
-                return synthesis["audio"]
+            # Use LMNT with basic settings (sample_rate will be handled in post-processing)
+            synthesis = await call_async(
+                lmnt_endpoint(),
+                lambda: speech.synthesize(text, voice),
+                label="LMNT synthesis",
+            )
+            print(f"   ✅ LMNT synthesis complete ({len(synthesis['audio'])} bytes)")
+            return synthesis["audio"]
         except Exception as e:
             print(f"❌ LMNT synthesis error: {e}")
             return None
 
+    async def _lmnt_synthesize_batch(
+        self,
+        speech,
+        texts: List[str],
+        max_concurrency: int,
+        voice: str = DEFAULT_VOICE,
+    ) -> List[Optional[bytes]]:
+        """Async helper to synthesize many transcripts over the shared LMNT session"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def synthesize_one(index: int, text: str) -> Optional[bytes]:
+            async with semaphore:
+                try:
+                    synthesis = await call_async(
+                        lmnt_endpoint(),
+                        lambda: speech.synthesize(text, voice),
+                        label=f"LMNT synthesis {index+1}/{len(texts)}",
+                    )
+                    print(
+                        f"   ✅ LMNT synthesis {index+1}/{len(texts)} complete "
+                        f"({len(synthesis['audio'])} bytes)"
+                    )
+                    return synthesis["audio"]
+                except Exception as e:
+                    print(f"❌ LMNT synthesis error ({index+1}/{len(texts)}): {e}")
+                    return None
+
+        print(f"   🗣️  Synthesizing with voice '{voice}' (shared session)")
+        return await asyncio.gather(
+            *(synthesize_one(i, text) for i, text in enumerate(texts))
+        )
+
     def _adjust_audio_duration_to_animation(
         self, audio_path: Path, scene_name: str, target_duration: float | None = None
     ) -> Optional[str]:
@@ -625,6 +820,7 @@ class AudioNarrationService:
         raw_audio_path: Path,
         scene_name: str,
         target_duration: float | None = None,
+        cache_key: str | None = None,
     ) -> Optional[str]:
         """
         Process raw audio to prevent echo and improve quality
@@ -633,6 +829,7 @@ class AudioNarrationService:
         - Standardize sample rate
         - Apply gentle noise reduction
         - Handle duration adjustment cleanly
+        Only output of the full filter chain is stored under cache_key
         """
         final_path = self.output_dir / f"{scene_name}_narration.mp3"
 
@@ -653,16 +850,7 @@ class AudioNarrationService:
                 "-af",
                 self._build_quality_audio_filter(current_duration, target_duration),
                 # Output settings optimized for Manim compatibility
-                "-c:a",
-                "mp3",  # MP3 codec
-                "-b:a",
-                "128k",  # Consistent bitrate
-                "-ac",
-                "2",  # Force stereo (prevent Manim from doing mono->stereo conversion)
-                "-ar",
-                "48000",  # Use Manim's preferred sample rate
-                "-avoid_negative_ts",
-                "make_zero",  # Avoid timing issues
+                *NARRATION_OUTPUT_ARGS,
             ]
 
             # Add duration constraint if needed
@@ -689,6 +877,9 @@ class AudioNarrationService:
                     f"   ⚠️  Duration mismatch: expected {target_duration:.1f}s, got {final_duration:.1f}s"
                 )
 
+            if cache_key is not None and self.tts_cache is not None:
+                self.tts_cache.store(cache_key, final_path)
+
             return str(final_path)
 
         except subprocess.CalledProcessError as e:
@@ -812,7 +1003,10 @@ class AudioNarrationService:
 
 
 def create_audiovisual_animation_with_embedded_audio(
-    animation: AnsciAnimation, output_dir: str
+    animation: AnsciAnimation,
+    output_dir: str,
+    max_concurrency: int = DEFAULT_TTS_CONCURRENCY,
+    tts_cache: Optional[AudioCache] = None,
 ) -> AnsciAnimation:
     """
     Create audiovisual animation by embedding audio directly in Manim code
@@ -821,26 +1015,28 @@ def create_audiovisual_animation_with_embedded_audio(
     Args:
         animation: Original animation to add audio to
         output_dir: Directory for audio files
+        max_concurrency: Maximum concurrent TTS syntheses / audio processing jobs
+        tts_cache: Optional cache of processed narrations; hits skip LMNT
 
     Returns:
         New animation with embedded audio in Manim code
     """
 
-    service = AudioNarrationService(output_dir)
+    service = AudioNarrationService(output_dir, tts_cache=tts_cache)
     audiovisual_blocks = []
+    scene_names = [f"Scene{i+1}" for i in range(len(animation.blocks))]
 
-    for i, scene_block in enumerate(animation.blocks):
-        scene_name = f"Scene{i+1}"
+    print(f"🎙️  Processing {len(scene_names)} scenes for embedded audio...")
 
-        print(f"🎙️  Processing {scene_name} for embedded audio...")
-
-        # Generate audio file
-        audio_path = service.generate_narration_for_scene(
-            scene_block,
-            scene_name,
-            target_duration=None,  # Let audio be natural length - no forced duration matching
-        )
+    # Generate all audio files at once
+    # Let audio be natural length - no forced duration matching
+    audio_paths = service.generate_narrations_batch(
+        animation.blocks, scene_names, max_concurrency=max_concurrency
+    )
 
+    for scene_block, scene_name, audio_path in zip(
+        animation.blocks, scene_names, audio_paths
+    ):
         if audio_path:
             # Create scene block with embedded audio
             audiovisual_block = create_audiovisual_scene_block(
@@ -853,6 +1049,10 @@ def create_audiovisual_animation_with_embedded_audio(
             audiovisual_blocks.append(scene_block)
             print(f"⚠️  {scene_name} using original block (no audio)")
 
+    if tts_cache is not None:
+        stats = tts_cache.stats
+        print(f"💾 TTS cache: {stats['hits']} hits, {stats['misses']} misses")
+
     return AnsciAnimation(blocks=audiovisual_blocks)
 
 
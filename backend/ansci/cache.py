@@ -0,0 +1,316 @@
+"""
+Caching Module
+Content-addressed on-disk caches for expensive pipeline artifacts
+Entries are keyed by SHA-256 digests, evicted least-recently-used beyond a size cap
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+# Default cache root - override with ANSCI_CACHE_DIR
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "ansci"
+
+# Default size caps - override with ANSCI_RENDER_CACHE_MB / ANSCI_TTS_CACHE_MB
+DEFAULT_RENDER_CACHE_MB = 5 * 1024
+DEFAULT_TTS_CACHE_MB = 1024
+
+
+def default_cache_dir() -> Path:
+    """Root directory for all AnSci caches"""
+    return Path(os.environ.get("ANSCI_CACHE_DIR", DEFAULT_CACHE_DIR))
+
+
+def make_key(*parts: Any) -> str:
+    """Build a stable SHA-256 key from JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str | Path) -> str:
+    """SHA-256 digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Content-addressed file cache with LRU eviction
+
+    Entries live under <root>/<namespace>/<key[:2]>/<key><suffix>. Recency is
+    tracked through file modification times (touched on every hit), so several
+    processes can share one cache directory without a separate index.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        root: str | Path | None = None,
+        max_bytes: int | None = None,
+    ):
+        self.directory = Path(root or default_cache_dir()) / namespace
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def path_for(self, key: str, suffix: str = "") -> Path:
+        """Location of an entry (whether or not it exists)"""
+        return self.directory / key[:2] / f"{key}{suffix}"
+
+    def get_file(self, key: str, suffix: str = "") -> Optional[Path]:
+        """Return the cached file for a key, or None on a miss"""
+        path = self.path_for(key, suffix)
+        if not path.exists():
+            self._count("misses")
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return path
+
+    def put_file(self, key: str, source: str | Path, suffix: str = "") -> Path:
+        """Copy a file into the cache atomically and return its cached path"""
+        path = self.path_for(key, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            Path(temp_path).unlink(missing_ok=True)
+
+        self._count("stores")
+        self.evict()
+        return path
+
+    def copy_out(self, key: str, output_path: Path, suffix: str = "") -> bool:
+        """Link or copy a cached file to output_path; False on a miss"""
+        cached = self.get_file(key, suffix)
+        if cached is None:
+            return False
+
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.unlink(missing_ok=True)
+        try:
+            os.link(cached, output_path)
+        except OSError:
+            # Different filesystem (or no hard link support) - fall back to a copy
+            shutil.copy2(cached, output_path)
+        return True
+
+    def get_json(self, key: str) -> Optional[Any]:
+        """Return a cached JSON value, or None on a miss"""
+        path = self.get_file(key, ".json")
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # Corrupt entry - drop it and report a miss
+            path.unlink(missing_ok=True)
+            with self._lock:
+                self.stats["hits"] -= 1
+                self.stats["misses"] += 1
+            return None
+
+    def put_json(self, key: str, value: Any) -> Path:
+        """Store a JSON-serializable value atomically"""
+        path = self.path_for(key, ".json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        finally:
+            Path(temp_path).unlink(missing_ok=True)
+
+        self._count("stores")
+        self.evict()
+        return path
+
+    def delete(self, key: str, suffix: str = "") -> None:
+        """Remove an entry if present"""
+        self.path_for(key, suffix).unlink(missing_ok=True)
+
+    def size_bytes(self) -> int:
+        """Total size of all entries"""
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def evict(self) -> int:
+        """Delete least-recently-used entries until the cache fits its size cap"""
+        if self.max_bytes is None:
+            return 0
+
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+
+        evicted = 0
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+
+        if evicted:
+            with self._lock:
+                self.stats["evictions"] += evicted
+        return evicted
+
+    def clear(self) -> None:
+        """Remove every entry in this namespace"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _entries(self):
+        return (
+            entry
+            for entry in self.directory.glob("*/*")
+            if entry.is_file() and entry.suffix != ".tmp"
+        )
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+
+# Matches the narration embedded by create_audiovisual_scene_block
+_ADD_SOUND_PATTERN = re.compile(r"""self\.add_sound\(\s*(["'])(.+?)\1""")
+
+
+# Helpers generated scenes import (LayoutManager, AnimationPresets), so their
+# source is part of every render
+RUNTIME_FILE = Path(__file__).resolve().parent / "runtime.py"
+
+
+def _manim_version() -> str:
+    try:
+        from importlib.metadata import version
+
+        return version("manim")
+    except Exception:
+        return "unknown"
+
+
+class RenderCache(DiskCache):
+    """
+    Cache of rendered scene videos
+
+    Keyed by the normalized scene code, quality flag, installed Manim version,
+    the ansci.runtime helpers' source and the digests of any embedded audio
+    files, so a hit is byte-for-byte the
+    video Manim would have produced. The scene class name does not appear in
+    the video, so it is canonicalized: the same scene rendered as Scene2 in one
+    run and Scene5 in another shares one entry.
+    """
+
+    def __init__(self, root: str | Path | None = None, max_bytes: int | None = None):
+        if max_bytes is None:
+            max_mb = int(
+                os.environ.get("ANSCI_RENDER_CACHE_MB", DEFAULT_RENDER_CACHE_MB)
+            )
+            max_bytes = max_mb * 1024 * 1024
+        super().__init__("renders", root=root, max_bytes=max_bytes)
+        self.manim_version = _manim_version()
+        self.runtime_digest = (
+            file_digest(RUNTIME_FILE) if RUNTIME_FILE.exists() else "missing"
+        )
+
+    def key_for(self, manim_code: str, scene_name: str, quality: str) -> str:
+        """Content key for a scene render"""
+        audio_digests = []
+
+        def replace_audio_path(match: re.Match) -> str:
+            # Absolute audio paths differ between output dirs; the content does not
+            audio_path = Path(match.group(2))
+            digest = file_digest(audio_path) if audio_path.exists() else "missing"
+            audio_digests.append(digest)
+            return f"self.add_sound({match.group(1)}<audio:{digest}>{match.group(1)}"
+
+        normalized = _ADD_SOUND_PATTERN.sub(replace_audio_path, manim_code)
+        normalized = "\n".join(
+            line.rstrip() for line in normalized.replace("\r\n", "\n").split("\n")
+        ).strip()
+        normalized = re.sub(rf"\b{re.escape(scene_name)}\b", "<scene>", normalized)
+
+        quality_flag = "-qh" if quality == "high" else "-ql"
+        return make_key(
+            "render", normalized, quality_flag, self.manim_version, self.runtime_digest
+        )
+
+    def fetch(self, key: str, output_path: Path) -> bool:
+        """Link or copy a cached video to output_path; False on a miss"""
+        return self.copy_out(key, output_path, ".mp4")
+
+    def store(self, key: str, video_path: Path) -> None:
+        """Add a rendered video to the cache"""
+        try:
+            self.put_file(key, video_path, ".mp4")
+        except OSError as e:
+            print(f"⚠️  Could not store render in cache: {e}")
+
+
+class AudioCache(DiskCache):
+    """
+    Cache of processed narration audio
+
+    Keyed by the final (enhanced) transcript, the TTS voice, the ffmpeg filter
+    chain and the output format, so a hit is the exact file the LMNT +
+    post-processing pipeline would have produced.
+    """
+
+    def __init__(self, root: str | Path | None = None, max_bytes: int | None = None):
+        if max_bytes is None:
+            max_mb = int(os.environ.get("ANSCI_TTS_CACHE_MB", DEFAULT_TTS_CACHE_MB))
+            max_bytes = max_mb * 1024 * 1024
+        super().__init__("tts", root=root, max_bytes=max_bytes)
+
+    def key_for(
+        self,
+        transcript: str,
+        voice: str,
+        filter_chain: str,
+        output_format: list[str],
+        target_duration: float | None = None,
+    ) -> str:
+        """Content key for a processed narration"""
+        return make_key(
+            "tts", transcript, voice, filter_chain, output_format, target_duration
+        )
+
+    def fetch(self, key: str, output_path: Path) -> bool:
+        """Link or copy cached narration to output_path; False on a miss"""
+        return self.copy_out(key, output_path, ".mp3")
+
+    def store(self, key: str, audio_path: Path) -> None:
+        """Add processed narration to the cache"""
+        try:
+            self.put_file(key, audio_path, ".mp3")
+        except OSError as e:
+            print(f"⚠️  Could not store narration in cache: {e}")
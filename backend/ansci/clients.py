@@ -0,0 +1,193 @@
+"""
+API Clients Module
+Process-wide Anthropic and LMNT clients, created on first use
+Importing the package needs no API keys and opens no connections. The first
+call builds the client over one shared, tuned connection pool that every
+thread reuses, so connection setup stays off the per-call latency path.
+"""
+
+import os
+import atexit
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Connection pool shared by every Anthropic call in the process. Size it to the
+# calls in flight at once: generation workers x (code candidates + hedges + the
+# parallel transcript call) - override with ANSCI_HTTP_MAX_CONNECTIONS
+DEFAULT_MAX_CONNECTIONS = 32
+
+# Idle connections are kept open this long (seconds) for the next call
+KEEPALIVE_EXPIRY = 60.0
+
+# Anthropic's own defaults: long reads for big generations, quick connects
+REQUEST_TIMEOUT = 600.0
+CONNECT_TIMEOUT = 5.0
+
+# .env file read for API keys missing from the environment
+ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+
+_lock = threading.Lock()
+_env_file_values: Optional[Dict[str, str]] = None
+_anthropic_client = None
+_anthropic_client_created = False
+_lmnt_loop: Optional[asyncio.AbstractEventLoop] = None
+_lmnt_speech = None
+_lmnt_speech_lock: Optional[asyncio.Lock] = None
+
+
+def api_key(name: str) -> Optional[str]:
+    """
+    API key from the environment, or from backend/.env if it is not set there
+
+    Args:
+        name: Variable name, e.g. ANTHROPIC_API_KEY
+
+    Returns:
+        The key, or None if it is set in neither place
+    """
+    value = os.environ.get(name)
+    if value:
+        return value
+
+    global _env_file_values
+    with _lock:
+        if _env_file_values is None:
+            _env_file_values = _read_env_file(ENV_FILE)
+        return _env_file_values.get(name)
+
+
+def anthropic_client():
+    """
+    Shared Anthropic client (thread-safe, created on first call)
+
+    Retries are left to the resilience layer (see resilience.py), so the SDK's
+    own are turned off.
+
+    Returns:
+        anthropic.Anthropic, or None if ANTHROPIC_API_KEY is not set
+    """
+    global _anthropic_client, _anthropic_client_created
+    if _anthropic_client_created:
+        return _anthropic_client
+
+    key = api_key("ANTHROPIC_API_KEY")
+    with _lock:
+        if not _anthropic_client_created:
+            if key:
+                import anthropic
+
+                _anthropic_client = anthropic.Anthropic(
+                    api_key=key, max_retries=0, http_client=_http_client()
+                )
+            else:
+                print("⚠️  ANTHROPIC_API_KEY is not set - LLM calls are unavailable")
+            _anthropic_client_created = True
+    return _anthropic_client
+
+
+def run_lmnt(fn: Callable[[Any], Awaitable[T]]) -> T:
+    """
+    Run fn(speech) with the shared LMNT session and wait for its result
+
+    LMNT's session (and its connection pool) is tied to an event loop, so it
+    lives on one long-running loop thread and every caller's coroutine is
+    scheduled there, whatever thread or loop the caller is on.
+
+    Args:
+        fn: Coroutine function taking an lmnt Speech session
+
+    Returns:
+        fn's result
+
+    Raises:
+        RuntimeError: LMNT_API_KEY is not set
+    """
+    loop = _lmnt_event_loop()
+    return asyncio.run_coroutine_threadsafe(_with_lmnt_speech(fn), loop).result()
+
+
+def _http_client():
+    import httpx
+    from anthropic import DefaultHttpxClient
+
+    max_connections = int(
+        os.environ.get("ANSCI_HTTP_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)
+    )
+    try:
+        import h2  # noqa: F401 - HTTP/2 needs the optional h2 package
+
+        http2 = True
+    except ImportError:
+        http2 = False
+
+    return DefaultHttpxClient(
+        http2=http2,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def _lmnt_event_loop() -> asyncio.AbstractEventLoop:
+    global _lmnt_loop
+    with _lock:
+        if _lmnt_loop is None:
+            _lmnt_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_lmnt_loop.run_forever, name="ansci-lmnt", daemon=True
+            ).start()
+            atexit.register(_close_lmnt)
+        return _lmnt_loop
+
+
+async def _with_lmnt_speech(fn: Callable[[Any], Awaitable[T]]) -> T:
+    # Runs on the LMNT loop, so the session is only ever touched from there.
+    # Opening it awaits, so first callers queue on a lock instead of each
+    # opening (and leaking) a session of their own
+    global _lmnt_speech, _lmnt_speech_lock
+    if _lmnt_speech is None:
+        if _lmnt_speech_lock is None:
+            _lmnt_speech_lock = asyncio.Lock()
+        async with _lmnt_speech_lock:
+            if _lmnt_speech is None:
+                key = api_key("LMNT_API_KEY")
+                if not key:
+                    raise RuntimeError("LMNT_API_KEY is not set")
+                from lmnt.api import Speech
+
+                speech = Speech(key)
+                await speech.__aenter__()
+                _lmnt_speech = speech
+    return await fn(_lmnt_speech)
+
+
+def _close_lmnt() -> None:
+    async def close() -> None:
+        if _lmnt_speech is not None:
+            await _lmnt_speech.__aexit__(None, None, None)
+
+    try:
+        asyncio.run_coroutine_threadsafe(close(), _lmnt_loop).result(timeout=5)
+    except Exception:
+        pass
+    _lmnt_loop.call_soon_threadsafe(_lmnt_loop.stop)
+
+
+def _read_env_file(path: Path) -> Dict[str, str]:
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                name, separator, value = line.strip().partition("=")
+                if separator and not name.startswith("#"):
+                    values[name.strip()] = value.strip()
+    except OSError:
+        pass
+    return values
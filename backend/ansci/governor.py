@@ -0,0 +1,330 @@
+"""
+Concurrency Governor Module
+Cross-process admission control for API quotas shared by several AnSci
+processes on one host
+A SQLite ledger next to the caches holds one token bucket per endpoint quota
+and a queue of waiting calls. Every process admits its calls through the
+ledger, so together they stay under the account's rate limits, and waiting
+jobs are served in turn, so one busy job cannot starve the others. No external
+service is involved.
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .cache import default_cache_dir
+
+# Fraction of the account quota this host may use (when several hosts share an
+# account, give each its share, e.g. 0.5 for two hosts)
+DEFAULT_SHARE = 1.0
+
+# How often a waiting call re-checks the ledger (seconds)
+POLL_INTERVAL = 0.25
+
+# Waiting calls whose process stopped polling for this long are dropped
+STALE_WAITER_SECONDS = 10.0
+
+# SQLite busy timeout (seconds)
+LOCK_TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    endpoint TEXT NOT NULL,
+    job TEXT NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    job TEXT PRIMARY KEY,
+    last_served REAL NOT NULL DEFAULT 0,
+    granted INTEGER NOT NULL DEFAULT 0,
+    waited REAL NOT NULL DEFAULT 0,
+    max_wait REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+class Governor:
+    """
+    Token ledger shared by every process using the same database file
+
+    acquire() blocks until the endpoint has capacity and it is this call's
+    turn. Turns go round-robin over the jobs with waiting calls (the job that
+    was served longest ago goes first), and calls within a job go in arrival
+    order. settle() books usage that is only known after the call.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        job: Optional[str] = None,
+        share: Optional[float] = None,
+    ):
+        self.path = Path(path or default_cache_dir() / "governor.sqlite")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.job = job or os.environ.get(
+            "ANSCI_JOB_ID", f"{socket.gethostname()}:{os.getpid()}"
+        )
+        if share is None:
+            share = float(os.environ.get("ANSCI_GOVERNOR_SHARE", DEFAULT_SHARE))
+        self.share = share
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._stats_lock = threading.Lock()
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    def acquire(
+        self, endpoint: str, costs: Dict[str, float], limits: Dict[str, float]
+    ) -> float:
+        """
+        Wait for capacity and debit it from the endpoint's buckets
+
+        Args:
+            endpoint: Endpoint name (e.g. anthropic:<model>)
+            costs: Amount to debit per bucket (e.g. {"requests": 1})
+            limits: Per-minute quota per bucket; buckets with a limit of 0
+                are not governed
+
+        Returns:
+            Seconds spent waiting
+        """
+        limits = {
+            bucket: limit * self.share for bucket, limit in limits.items() if limit
+        }
+        start = time.monotonic()
+        with self._connect() as connection:
+            waiter = connection.execute(
+                "INSERT INTO waiters (endpoint, job, heartbeat) VALUES (?, ?, ?)",
+                (endpoint, self.job, time.time()),
+            ).lastrowid
+            try:
+                while True:
+                    delay = self._try_grant(
+                        connection, endpoint, waiter, costs, limits, start
+                    )
+                    if delay is None:
+                        break
+                    time.sleep(min(max(delay, 0.01), POLL_INTERVAL))
+            finally:
+                connection.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+
+        waited = time.monotonic() - start
+        with self._stats_lock:
+            stats = self.stats.setdefault(
+                endpoint, {"acquired": 0, "waited": 0.0, "max_wait": 0.0}
+            )
+            stats["acquired"] += 1
+            stats["waited"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+        return waited
+
+    def try_acquire(
+        self, endpoint: str, costs: Dict[str, float], limits: Dict[str, float]
+    ) -> bool:
+        """
+        Debit costs only if the endpoint has capacity now and no call is
+        waiting for it (so optional calls never jump the queue)
+
+        Args:
+            endpoint: Endpoint name (e.g. anthropic:<model>)
+            costs: Amount to debit per bucket
+            limits: Per-minute quota per bucket (0 = not governed)
+
+        Returns:
+            True if granted, False if the call would have to wait
+        """
+        limits = {
+            bucket: limit * self.share for bucket, limit in limits.items() if limit
+        }
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                waiting = connection.execute(
+                    "SELECT 1 FROM waiters WHERE endpoint = ? AND heartbeat >= ?",
+                    (endpoint, time.time() - STALE_WAITER_SECONDS),
+                ).fetchone()
+                balances = {
+                    bucket: self._refill(connection, f"{endpoint}/{bucket}", limit)
+                    for bucket, limit in limits.items()
+                }
+                granted = waiting is None and all(
+                    balances[bucket] >= min(costs.get(bucket, 0), limit)
+                    for bucket, limit in limits.items()
+                )
+                if granted:
+                    for bucket in limits:
+                        connection.execute(
+                            "UPDATE buckets SET tokens = ? WHERE name = ?",
+                            (
+                                balances[bucket] - costs.get(bucket, 0),
+                                f"{endpoint}/{bucket}",
+                            ),
+                        )
+                    connection.execute(
+                        "INSERT INTO jobs (job, granted) VALUES (?, 1) "
+                        "ON CONFLICT(job) DO UPDATE SET granted = granted + 1",
+                        (self.job,),
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        if granted:
+            with self._stats_lock:
+                stats = self.stats.setdefault(
+                    endpoint, {"acquired": 0, "waited": 0.0, "max_wait": 0.0}
+                )
+                stats["acquired"] += 1
+        return granted
+
+    def settle(
+        self, endpoint: str, amounts: Dict[str, float], limits: Dict[str, float]
+    ) -> None:
+        """Debit (or, if negative, credit back) amounts after a call"""
+        amounts = {
+            bucket: amount
+            for bucket, amount in amounts.items()
+            if amount and limits.get(bucket)
+        }
+        if not amounts:
+            return
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for bucket, amount in amounts.items():
+                    name = f"{endpoint}/{bucket}"
+                    limit = limits[bucket] * self.share
+                    tokens = self._refill(connection, name, limit)
+                    connection.execute(
+                        "UPDATE buckets SET tokens = ? WHERE name = ?",
+                        (min(limit, tokens - amount), name),
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+    def job_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Calls granted and time waited per job, across every process"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT job, granted, waited, max_wait FROM jobs ORDER BY job"
+            ).fetchall()
+        return {
+            job: {"granted": granted, "waited": waited, "max_wait": max_wait}
+            for job, granted, waited, max_wait in rows
+        }
+
+    def _try_grant(
+        self,
+        connection: sqlite3.Connection,
+        endpoint: str,
+        waiter: int,
+        costs: Dict[str, float],
+        limits: Dict[str, float],
+        start: float,
+    ) -> Optional[float]:
+        # One ledger transaction: returns None once granted, else a delay
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-inserted under the same id (keeping its place) if it was
+            # dropped as stale while this process was suspended
+            connection.execute(
+                "INSERT OR REPLACE INTO waiters (id, endpoint, job, heartbeat) "
+                "VALUES (?, ?, ?, ?)",
+                (waiter, endpoint, self.job, now),
+            )
+            connection.execute(
+                "DELETE FROM waiters WHERE heartbeat < ?", (now - STALE_WAITER_SECONDS,)
+            )
+            head = connection.execute(
+                """
+                SELECT w.id FROM waiters w LEFT JOIN jobs j ON j.job = w.job
+                WHERE w.endpoint = ?
+                ORDER BY COALESCE(j.last_served, 0), w.id LIMIT 1
+                """,
+                (endpoint,),
+            ).fetchone()
+            if head is None or head[0] != waiter:
+                connection.execute("COMMIT")
+                return POLL_INTERVAL
+
+            balances = {
+                bucket: self._refill(connection, f"{endpoint}/{bucket}", limit)
+                for bucket, limit in limits.items()
+            }
+            # Oversized calls only need a full bucket, or they would never run
+            shortfall = max(
+                (
+                    (min(costs.get(bucket, 0), limit) - balances[bucket])
+                    / (limit / 60.0)
+                    for bucket, limit in limits.items()
+                ),
+                default=0.0,
+            )
+            if shortfall > 0:
+                connection.execute("COMMIT")
+                return shortfall
+
+            for bucket, limit in limits.items():
+                connection.execute(
+                    "UPDATE buckets SET tokens = ? WHERE name = ?",
+                    (balances[bucket] - costs.get(bucket, 0), f"{endpoint}/{bucket}"),
+                )
+            waited = time.monotonic() - start
+            connection.execute(
+                """
+                INSERT INTO jobs (job, last_served, granted, waited, max_wait)
+                VALUES (?, ?, 1, ?, ?)
+                ON CONFLICT(job) DO UPDATE SET
+                    last_served = excluded.last_served,
+                    granted = granted + 1,
+                    waited = waited + excluded.waited,
+                    max_wait = MAX(max_wait, excluded.max_wait)
+                """,
+                (self.job, now, waited, waited),
+            )
+            connection.execute("COMMIT")
+            return None
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _refill(
+        self, connection: sqlite3.Connection, name: str, per_minute: float
+    ) -> float:
+        # Current balance of a bucket (created full), stored back refilled
+        now = time.time()
+        row = connection.execute(
+            "SELECT tokens, updated FROM buckets WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            tokens = per_minute
+        else:
+            tokens = min(per_minute, row[0] + (now - row[1]) * per_minute / 60.0)
+        connection.execute(
+            "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+            (name, tokens, now),
+        )
+        return tokens
+
+    def _connect(self) -> closing:
+        # Autocommit mode - transactions are explicit (BEGIN IMMEDIATE)
+        return closing(
+            sqlite3.connect(self.path, timeout=LOCK_TIMEOUT, isolation_level=None)
+        )
@@ -0,0 +1,512 @@
+"""
+PDF Ingestion Module
+Extracts text, section headings and equations from a paper locally
+Produces compact per-section text to send to the LLM instead of the full PDF
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import base64
+import hashlib
+import importlib.util
+from typing import TYPE_CHECKING, List
+from xml.sax.saxutils import quoteattr, unescape
+
+
+from .cache import DiskCache, make_key
+from .llm import (
+    CACHE_CONTROL,
+    PAPER_TEXT_TAG,
+    cacheable_document,
+    is_paper_block,
+    paper_blocks,
+)
+from .models import PaperSection, PaperText
+
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+
+# Optional dependency: pip install "ansci[ingest]" (imported where it is used)
+PYPDF_AVAILABLE = importlib.util.find_spec("pypdf") is not None
+
+# Bump whenever extraction output changes so cached ingests are rebuilt
+INGEST_VERSION = 1
+
+# Long sections are split into chunks of at most this many characters
+DEFAULT_MAX_CHUNK_CHARS = 6000
+
+# Window sizes for splitting long papers (map-reduce outlines)
+DEFAULT_WINDOW_PAGES = 20
+DEFAULT_WINDOW_CHARS = 80_000
+
+# Front matter (title, authors, abstract) before the first detected heading
+FRONT_MATTER_HEADING = "Front Matter"
+
+# Numbered headings like "3.2 Attention" or "4. Results"
+_NUMBERED_HEADING = re.compile(
+    r"^(\d{1,2}(?:\.\d{1,2}){0,3})\.?\s+([A-Z][^\n]{1,70})$"
+)
+
+# Common unnumbered headings
+_UNNUMBERED_HEADINGS = {
+    "abstract",
+    "introduction",
+    "background",
+    "related work",
+    "conclusion",
+    "conclusions",
+    "acknowledgments",
+    "acknowledgements",
+    "appendix",
+    "references",
+    "bibliography",
+}
+
+# Sections whose text is dropped - citations cost tokens and animate nothing
+_SKIPPED_SECTIONS = {"references", "bibliography"}
+
+# A section chunk as written by section_chunks
+_SECTION_CHUNK = re.compile(
+    r"<section heading=([\"'])(.*?)\1 pages=([\"'])(.*?)\3>\n(.*?)\n</section>",
+    re.DOTALL,
+)
+
+# Bookmarks are only trusted as a heading list when there are at least this many
+_MIN_OUTLINE_TITLES = 3
+
+# Display equations end with a number in parentheses, e.g. "... = softmax(...)V (1)"
+_EQUATION_NUMBER = re.compile(r"\(\d{1,3}\)\s*$")
+
+
+def ingest_pdf(pdf_bytes: bytes, cache: DiskCache | None = None) -> PaperText:
+    """
+    Extract the sections of a paper from its PDF bytes
+
+    Args:
+        pdf_bytes: Raw PDF file contents
+        cache: Optional cache of extracted papers, keyed by the PDF digest
+
+    Returns:
+        PaperText with the paper's sections in reading order
+
+    Raises:
+        ImportError: If pypdf is not installed
+    """
+    if not PYPDF_AVAILABLE:
+        raise ImportError("pypdf is required for text ingestion: pip install pypdf")
+
+    digest = hashlib.sha256(pdf_bytes).hexdigest()
+    cache_key = make_key("ingest", digest, INGEST_VERSION)
+    if cache is not None:
+        cached = cache.get_json(cache_key)
+        if cached is not None:
+            print("💾 Ingest cache hit - reusing extracted paper text")
+            return PaperText(**cached)
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    pages = _strip_running_headers(
+        [page.extract_text() or "" for page in reader.pages]
+    )
+    paper = PaperText(
+        digest=digest,
+        page_count=len(pages),
+        sections=_split_sections(pages, _outline_titles(reader)),
+    )
+
+    if cache is not None:
+        cache.put_json(cache_key, paper.model_dump())
+
+    total_chars = sum(len(section.text) for section in paper.sections)
+    print(
+        f"📑 Extracted {len(paper.sections)} sections "
+        f"({total_chars} characters) from {paper.page_count} pages"
+    )
+    return paper
+
+
+def section_chunks(
+    paper: PaperText, max_chars: int = DEFAULT_MAX_CHUNK_CHARS
+) -> List[str]:
+    """
+    Compact text chunks of the paper, one per section (long sections are split
+    on line boundaries)
+    """
+    chunks = []
+    for section in paper.sections:
+        parts = _split_text(section.text, max_chars)
+        for index, part in enumerate(parts):
+            heading = section.heading
+            if len(parts) > 1:
+                heading += f" (part {index + 1}/{len(parts)})"
+            chunks.append(
+                f"<section heading={quoteattr(heading)} "
+                f"pages={quoteattr(_page_range(section.pages))}>\n"
+                f"{part}\n</section>"
+            )
+    return chunks
+
+
+def format_paper_text(paper: PaperText) -> str:
+    """The whole paper as one tagged text block"""
+    return (
+        f"{PAPER_TEXT_TAG} pages={quoteattr(str(paper.page_count))}>\n"
+        + "\n".join(section_chunks(paper))
+        + "\n</paper>"
+    )
+
+
+def build_text_history(paper: PaperText, prompt: str) -> list[MessageParam]:
+    """
+    Message history carrying the extracted paper text instead of the PDF
+
+    The paper block is marked cacheable, like the document block it replaces.
+    """
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": format_paper_text(paper),
+                    "cache_control": CACHE_CONTROL,
+                },
+                {"type": "text", "text": prompt},
+            ],
+        }
+    ]
+
+
+def paper_from_history(
+    history: list[MessageParam], cache: DiskCache | None = None
+) -> PaperText | None:
+    """
+    Recover the paper's sections from history: parsed back from extracted paper
+    text, or extracted from the PDF document block (needs pypdf). Returns None
+    if history carries no usable paper.
+    """
+    blocks = paper_blocks(history)
+    if len(blocks) != 1:
+        return None
+    block = blocks[0]
+
+    if block["type"] == "text":
+        sections = []
+        for match in _SECTION_CHUNK.finditer(block["text"]):
+            sections.append(
+                PaperSection(
+                    heading=unescape(match.group(2), {"&quot;": '"', "&apos;": "'"}),
+                    pages=_parse_pages(match.group(4)),
+                    text=match.group(5),
+                )
+            )
+        if not sections:
+            return None
+        return PaperText(
+            digest=hashlib.sha256(block["text"].encode("utf-8")).hexdigest(),
+            page_count=max((max(s.pages, default=0) for s in sections), default=0),
+            sections=sections,
+        )
+
+    source = block.get("source", {})
+    if not PYPDF_AVAILABLE or source.get("type") != "base64":
+        return None
+    return ingest_pdf(base64.b64decode(source["data"]), cache=cache)
+
+
+def restrict_history_to_pages(
+    history: list[MessageParam], pages: List[int]
+) -> list[MessageParam]:
+    """
+    Copy of history whose paper carries only the given (1-based) pages: a
+    sub-PDF of those pages (needs pypdf), or the text sections touching them.
+    History is returned unchanged if the paper cannot be narrowed.
+    """
+    blocks = paper_blocks(history)
+    wanted = set(pages)
+    if len(blocks) != 1 or not wanted:
+        return history
+    block = blocks[0]
+
+    if block["type"] == "text":
+        chunks = [
+            match.group(0)
+            for match in _SECTION_CHUNK.finditer(block["text"])
+            if wanted & set(_parse_pages(match.group(4)))
+        ]
+        if not chunks:
+            return history
+        paper_block = {
+            "type": "text",
+            "text": f"{PAPER_TEXT_TAG}>\n" + "\n".join(chunks) + "\n</paper>",
+            "cache_control": CACHE_CONTROL,
+        }
+    else:
+        source = block.get("source", {})
+        if not PYPDF_AVAILABLE or source.get("type") != "base64":
+            return history
+        from pypdf import PdfReader, PdfWriter
+
+        reader = PdfReader(io.BytesIO(base64.b64decode(source["data"])))
+        writer = PdfWriter()
+        for page in sorted(wanted):
+            if 1 <= page <= len(reader.pages):
+                writer.add_page(reader.pages[page - 1])
+        if not writer.pages:
+            return history
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        paper_block = cacheable_document(
+            {
+                "type": "base64",
+                "media_type": "application/pdf",
+                "data": base64.b64encode(buffer.getvalue()).decode("utf-8"),
+            }
+        )
+
+    narrowed = []
+    for message in history:
+        content = message.get("content")
+        if message.get("role") != "user" or isinstance(content, str):
+            narrowed.append(message)
+            continue
+        new_content = []
+        for item in content:
+            if is_paper_block(item):
+                if paper_block is not None:
+                    new_content.append(paper_block)
+                    paper_block = None
+            else:
+                new_content.append(item)
+        narrowed.append({**message, "content": new_content})
+    return narrowed
+
+
+def split_paper_history(
+    history: list[MessageParam],
+    window_pages: int = DEFAULT_WINDOW_PAGES,
+    window_chars: int = DEFAULT_WINDOW_CHARS,
+) -> list[list[dict]]:
+    """
+    Split the paper carried by history into windows of paper content blocks
+
+    A PDF document is split into sub-PDFs of window_pages pages (needs pypdf);
+    extracted paper text is split on section boundaries into windows of about
+    window_chars characters. Returns an empty list if the paper cannot be split.
+    """
+    blocks = paper_blocks(history)
+    if len(blocks) != 1:
+        return []
+    block = blocks[0]
+
+    if block["type"] == "text":
+        sections = re.findall(r"<section .*?</section>", block["text"], re.DOTALL)
+        windows, current = [], ""
+        for section in sections:
+            if current and len(current) + len(section) > window_chars:
+                windows.append(current)
+                current = ""
+            current = f"{current}\n{section}" if current else section
+        if current:
+            windows.append(current)
+        return [
+            [{"type": "text", "text": f"{PAPER_TEXT_TAG}>\n{window}\n</paper>"}]
+            for window in windows
+        ]
+
+    source = block.get("source", {})
+    if not PYPDF_AVAILABLE or source.get("type") != "base64":
+        return []
+
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(io.BytesIO(base64.b64decode(source["data"])))
+    windows = []
+    for start in range(0, len(reader.pages), window_pages):
+        writer = PdfWriter()
+        for page in reader.pages[start : start + window_pages]:
+            writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        windows.append(
+            [
+                {
+                    "type": "document",
+                    "source": {
+                        "type": "base64",
+                        "media_type": "application/pdf",
+                        "data": base64.b64encode(buffer.getvalue()).decode("utf-8"),
+                    },
+                }
+            ]
+        )
+    return windows
+
+
+def _outline_titles(reader) -> set[str]:
+    """Normalized section titles from the PDF's bookmarks, if it has any"""
+    titles = set()
+
+    def walk(items):
+        for item in items:
+            if isinstance(item, list):
+                walk(item)
+            else:
+                titles.add(_normalize(getattr(item, "title", "") or ""))
+
+    try:
+        walk(reader.outline)
+    except Exception:
+        pass
+    titles.discard("")
+    return titles if len(titles) >= _MIN_OUTLINE_TITLES else set()
+
+
+def _strip_running_headers(pages: List[str]) -> List[str]:
+    """Drop page headers/footers (e.g. "4 Author et al.") repeated across pages"""
+    counts: dict[str, int] = {}
+    for page_text in pages:
+        lines = [line for line in page_text.splitlines() if line.strip()]
+        for line in {_header_key(line) for line in lines[:2] + lines[-2:]}:
+            counts[line] = counts.get(line, 0) + 1
+
+    repeated = {line for line, count in counts.items() if count >= 3 and line}
+    if not repeated:
+        return pages
+
+    return [
+        "\n".join(
+            line
+            for line in page_text.splitlines()
+            if _header_key(line) not in repeated
+        )
+        for page_text in pages
+    ]
+
+
+def _header_key(line: str) -> str:
+    # Page numbers change from page to page, the rest of a running header does not
+    return _normalize(re.sub(r"\d+", "", line))
+
+
+def _split_sections(pages: List[str], outline_titles: set[str]) -> List[PaperSection]:
+    """Group page lines into sections at detected headings"""
+    sections = []
+    heading = FRONT_MATTER_HEADING
+    last_number: tuple[int, ...] = ()
+    lines: List[str] = []
+    section_pages: List[int] = []
+
+    def close_section():
+        text = _clean_text(lines)
+        if text and _normalize(heading) not in _SKIPPED_SECTIONS:
+            sections.append(
+                PaperSection(
+                    heading=heading,
+                    pages=sorted(set(section_pages)),
+                    text=text,
+                    equations=[line.strip() for line in lines if _is_equation(line)],
+                )
+            )
+
+    for page_number, page_text in enumerate(pages, start=1):
+        for line in page_text.splitlines():
+            stripped = line.strip()
+            number = _heading_number(stripped, outline_titles, last_number)
+            if number is not None:
+                if number:
+                    last_number = number
+                close_section()
+                heading = stripped
+                lines = []
+                section_pages = [page_number]
+                continue
+
+            lines.append(line)
+            if stripped:
+                section_pages.append(page_number)
+
+    close_section()
+    return sections
+
+
+def _heading_number(
+    line: str, outline_titles: set[str], last_number: tuple[int, ...]
+) -> tuple[int, ...] | None:
+    """
+    Section number of a heading line (empty for unnumbered headings), or None
+    if the line is not a heading
+    """
+    if not line or len(line) > 80 or line.endswith((".", ",", ";", ":")):
+        return None
+
+    if _normalize(line) in _UNNUMBERED_HEADINGS:
+        return ()
+
+    match = _NUMBERED_HEADING.match(line)
+    if match is None:
+        return None
+
+    # Section numbers only ever increase through a paper
+    number = tuple(int(part) for part in match.group(1).split("."))
+    if number <= last_number:
+        return None
+
+    title = match.group(2)
+    if outline_titles:
+        return number if _normalize(title) in outline_titles else None
+
+    # Without bookmarks, accept short title-like lines only
+    if len(title.split()) > 8 or any(char in title for char in "=()[],"):
+        return None
+    return number
+
+
+def _is_equation(line: str) -> bool:
+    return "=" in line and bool(_EQUATION_NUMBER.search(line))
+
+
+def _clean_text(lines: List[str]) -> str:
+    """Join hyphenated line breaks and collapse whitespace"""
+    text = "\n".join(line.rstrip() for line in lines).strip()
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    return re.sub(r"\n{3,}", "\n\n", text)
+
+
+def _split_text(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+
+    parts, current = [], ""
+    for line in text.split("\n"):
+        if current and len(current) + len(line) + 1 > max_chars:
+            parts.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _parse_pages(page_range: str) -> List[int]:
+    """Inverse of _page_range: "3-5" -> [3, 4, 5]"""
+    pages = [int(page) for page in re.findall(r"\d+", page_range)]
+    if len(pages) == 2:
+        return list(range(pages[0], pages[1] + 1))
+    return pages
+
+
+def _page_range(pages: List[int]) -> str:
+    if not pages:
+        return ""
+    if pages[0] == pages[-1]:
+        return str(pages[0])
+    return f"{pages[0]}-{pages[-1]}"
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
@@ -0,0 +1,731 @@
+"""
+LLM Call Module
+Streaming Anthropic calls with prompt caching and per-call usage metrics
+The paper document and static prompt prefixes are marked cacheable so repeated
+calls for the same paper are served from the provider-side prefix cache
+Streams that stall before their first token or between chunks are hedged with
+an identical backup request; whichever finishes first wins
+Every call goes through the shared rate limits, retries and circuit breakers
+of resilience.py
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+
+from .resilience import StallWatchdog, StreamStalledError, anthropic_endpoint
+from .resilience import active_governor, endpoint_stats, try_admit
+from .resilience import call as resilient_call
+
+# Marks the end of a cacheable prompt prefix (provider-side, 5 minute TTL)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# How long a cached prefix lives after its last use (seconds)
+PROMPT_CACHE_TTL = 300.0
+
+# Opening tag of a paper sent as extracted text instead of a document block
+PAPER_TEXT_TAG = "<paper"
+
+# Usage fields reported by the Messages API
+USAGE_FIELDS = (
+    "input_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+    "output_tokens",
+)
+
+# Rough prompt size estimate used to reserve input tokens before a call (the
+# reservation is corrected with the real usage afterwards)
+CHARS_PER_TOKEN = 4
+PDF_BYTES_PER_TOKEN = 40
+
+# Hedging: disable with ANSCI_HEDGE=0
+HEDGE_ENABLED = os.environ.get("ANSCI_HEDGE", "1") != "0"
+
+# A stream is hedged once its wait for the first token, or for the next chunk,
+# exceeds this percentile of what completed calls of the same task saw
+HEDGE_PERCENTILE = float(os.environ.get("ANSCI_HEDGE_PERCENTILE", 0.95))
+
+# Thresholds (seconds) until a task has HEDGE_MIN_SAMPLES completed calls
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_TTFT = 20.0
+HEDGE_DEFAULT_GAP = 10.0
+
+# Never hedge sooner than this (seconds), however fast past calls were
+HEDGE_MIN_DELAY = 1.0
+
+# Backup requests allowed per primary request across the process, and how
+# many unused allowances can accumulate for a burst of stalls
+HEDGE_BUDGET = float(os.environ.get("ANSCI_HEDGE_BUDGET", 0.05))
+HEDGE_BURST = 2.0
+
+# Completed calls per task kept for the thresholds
+HEDGE_WINDOW = 200
+
+# How often a hedged call checks for stalls and cancellation (seconds)
+_HEDGE_POLL_INTERVAL = 0.25
+
+
+@dataclass
+class LLMResponse:
+    """Collected result of one streamed model call"""
+
+    text: str = ""
+    tool_input_json: str = ""
+    usage: Dict[str, int] = field(default_factory=dict)
+    time_to_first_token: Optional[float] = None
+    elapsed: float = 0.0
+    cancelled: bool = False
+
+
+# Running totals across all calls in this process
+_usage_lock = threading.Lock()
+USAGE_TOTALS: Dict[str, int] = {"calls": 0, **{name: 0 for name in USAGE_FIELDS}}
+
+# Per-task call count, latency and token totals (see routing.py for tasks)
+TASK_METRICS: Dict[str, Dict[str, Any]] = {}
+
+# Hedging counters: calls watched, backups launched, backups that finished
+# first, and stalls that went unhedged because the budget was spent or the
+# rate limits had no room for a backup
+_hedge_lock = threading.Lock()
+HEDGE_STATS: Dict[str, int] = {"requests": 0, "hedged": 0, "wins": 0, "denied": 0}
+_hedge_credit = HEDGE_BURST
+_ttft_samples: Dict[str, Deque[float]] = {}
+_gap_samples: Dict[str, Deque[float]] = {}
+
+# Cacheable prefixes (by digest) that a call has written to or read from the
+# provider's prompt cache, with when that call finished
+_prefix_lock = threading.Lock()
+_cached_prefixes: Dict[str, float] = {}
+
+# Totals of the innermost track_usage() block, if any
+_usage_scope: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "ansci_usage_scope", default=None
+)
+
+
+def cached_system(text: str) -> List[Dict[str, Any]]:
+    """System prompt as a single cacheable text block"""
+    return [{"type": "text", "text": text, "cache_control": CACHE_CONTROL}]
+
+
+def cacheable_document(source: Dict[str, Any]) -> Dict[str, Any]:
+    """Document content block marked as the end of a cacheable prefix"""
+    return {"type": "document", "source": source, "cache_control": CACHE_CONTROL}
+
+
+def is_paper_block(block: Any) -> bool:
+    """True for content blocks carrying the paper (a PDF document or its text)"""
+    if not isinstance(block, dict):
+        return False
+    if block.get("type") == "document":
+        return True
+    return block.get("type") == "text" and block.get("text", "").startswith(
+        PAPER_TEXT_TAG
+    )
+
+
+def paper_blocks(history: List[MessageParam] | None) -> List[Dict[str, Any]]:
+    """
+    Paper blocks from the user messages in history, with the last one marked
+    cacheable so every call that carries them shares one cached prefix
+    """
+    documents = []
+    for message in history or []:
+        content = message.get("content")
+        if message.get("role") != "user" or isinstance(content, str):
+            continue
+        documents.extend(
+            dict(block) for block in content or [] if is_paper_block(block)
+        )
+
+    if documents:
+        documents[-1]["cache_control"] = CACHE_CONTROL
+    return documents
+
+
+def with_paper_prefix(
+    history: List[MessageParam] | None, prompt: str
+) -> List[MessageParam]:
+    """
+    Messages for a call that should see the paper: the paper block(s) first,
+    then the task prompt. Without a paper in history this is just the prompt.
+    """
+    documents = paper_blocks(history)
+    if not documents:
+        return [{"role": "user", "content": prompt}]
+
+    return [
+        {
+            "role": "user",
+            "content": [*documents, {"type": "text", "text": prompt}],
+        }
+    ]
+
+
+def stream_message(
+    client,
+    label: str,
+    on_tool_delta: Optional[Callable[[str], None]] = None,
+    task: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+    hedge: bool = True,
+    **kwargs,
+) -> LLMResponse:
+    """
+    Run a streamed Messages API call and collect text, tool input and usage
+
+    Args:
+        client: Anthropic client
+        label: Short name for this call in the metrics output
+        on_tool_delta: Called with each tool-input JSON fragment as it arrives
+            (such calls are never hedged, since two streams would interleave)
+        task: Routing task of this call, for the per-task metrics
+        cancel: When set, the stream is closed at the next chunk and the
+            partial result is returned with cancelled=True
+        hedge: Launch a backup request if the stream stalls (see HEDGE_*)
+        **kwargs: Arguments for client.messages.create (stream is always on)
+
+    Returns:
+        LLMResponse with the collected text, tool input JSON and token usage
+
+    Raises:
+        Exception: The last API error once retries are exhausted (or at once
+            if it is not retryable, or tool deltas were already delivered)
+    """
+    delivered = threading.Event()
+    if on_tool_delta is not None:
+        deliver = on_tool_delta
+
+        def on_tool_delta(fragment: str) -> None:
+            delivered.set()
+            deliver(fragment)
+
+    tokens, prefixes = _prompt_tokens(kwargs)
+    estimated_input_tokens = _uncached_tokens(tokens, prefixes)
+
+    def attempt() -> LLMResponse:
+        if hedge and HEDGE_ENABLED and on_tool_delta is None:
+            return _stream_hedged(
+                client, label, task, cancel, kwargs, estimated_input_tokens
+            )
+        return _stream_once(client, label, task, cancel, on_tool_delta, kwargs)
+
+    response = resilient_call(
+        anthropic_endpoint(kwargs.get("model")),
+        attempt,
+        label=label,
+        estimated_input_tokens=estimated_input_tokens,
+        usage=_billed_tokens,
+        # A consumer that already saw part of the output cannot be replayed to
+        can_retry=lambda: not delivered.is_set()
+        and not (cancel is not None and cancel.is_set()),
+    )
+    if response.usage.get("cache_creation_input_tokens") or response.usage.get(
+        "cache_read_input_tokens"
+    ):
+        now = time.monotonic()
+        with _prefix_lock:
+            for digest, _ in prefixes:
+                _cached_prefixes[digest] = now
+    return response
+
+
+def estimate_input_tokens(kwargs: Dict[str, Any]) -> int:
+    """
+    Rough input token count of a Messages API request, as it counts against
+    the input token rate limit
+
+    A cacheable prefix that an earlier call already put in the provider's
+    prompt cache is read from there, and cache reads do not count towards the
+    limit, so it is left out.
+    """
+    return _uncached_tokens(*_prompt_tokens(kwargs))
+
+
+def hedge_stats() -> Dict[str, int]:
+    """Copy of the hedging counters (see HEDGE_STATS)"""
+    with _hedge_lock:
+        return dict(HEDGE_STATS)
+
+
+@contextmanager
+def track_usage():
+    """
+    Collect token usage of the calls made inside the block
+
+    Calls on other threads are included when they run in a copy of this
+    context (e.g. executor.submit(contextvars.copy_context().run, fn, ...)).
+
+    Yields:
+        Dict of call count and USAGE_FIELDS totals, updated as calls finish
+    """
+    totals = {"calls": 0, **{name: 0 for name in USAGE_FIELDS}}
+    token = _usage_scope.set(totals)
+    try:
+        yield totals
+    finally:
+        _usage_scope.reset(token)
+
+
+def format_usage(totals: Dict[str, int]) -> str:
+    """One-line summary of prompt cache use for a usage totals dict"""
+    prompt_tokens = (
+        totals["input_tokens"]
+        + totals["cache_creation_input_tokens"]
+        + totals["cache_read_input_tokens"]
+    )
+    hit_rate = totals["cache_read_input_tokens"] / prompt_tokens if prompt_tokens else 0
+    return (
+        f"{totals['calls']} calls, {prompt_tokens} prompt tokens "
+        f"({totals['cache_read_input_tokens']} cache read, "
+        f"{totals['cache_creation_input_tokens']} cache write, "
+        f"{hit_rate:.0%} from cache), {totals['output_tokens']} output tokens"
+    )
+
+
+def print_usage_summary() -> None:
+    """Print token usage and prompt cache effectiveness across all calls"""
+    with _usage_lock:
+        totals = dict(USAGE_TOTALS)
+
+    if not totals["calls"]:
+        return
+
+    print(f"📊 LLM usage: {format_usage(totals)}")
+
+    stats = hedge_stats()
+    if stats["hedged"] or stats["denied"]:
+        print(
+            f"   hedging: {stats['hedged']} of {stats['requests']} calls hedged, "
+            f"{stats['wins']} won by the backup, "
+            f"{stats['denied']} denied (budget or rate limits)"
+        )
+
+    for name, endpoint in sorted(endpoint_stats().items()):
+        if endpoint["retries"] or endpoint["throttled_seconds"] >= 1:
+            print(
+                f"   {name}: {endpoint['retries']} retries, "
+                f"{endpoint['throttled_seconds']:.1f}s waiting on rate limits, "
+                f"circuit opened {endpoint['circuit_opened']} times"
+            )
+
+    governor = active_governor()
+    if governor is not None:
+        for name, admitted in sorted(governor.stats.items()):
+            print(
+                f"   governor {name}: {admitted['acquired']} calls admitted, "
+                f"avg wait {admitted['waited'] / admitted['acquired']:.2f}s, "
+                f"max {admitted['max_wait']:.2f}s"
+            )
+
+    with _usage_lock:
+        tasks = {task: dict(metrics) for task, metrics in TASK_METRICS.items()}
+    for task, metrics in sorted(tasks.items()):
+        calls = metrics["calls"]
+        print(
+            f"   {task} ({', '.join(sorted(metrics['models']))}): {calls} calls, "
+            f"avg {metrics['elapsed'] / calls:.2f}s "
+            f"(first token {metrics['time_to_first_token'] / calls:.2f}s), "
+            f"{metrics['input_tokens'] / calls:.0f} in / "
+            f"{metrics['output_tokens'] / calls:.0f} out per call"
+        )
+
+
+class _StreamAttempt:
+    """One request of a hedged call, streamed on its own thread"""
+
+    def __init__(self, client, kwargs: Dict[str, Any], finished: threading.Event):
+        self.result = LLMResponse()
+        self.error: Optional[BaseException] = None
+        self.cancel = threading.Event()
+        self.done = threading.Event()
+        self.start = time.perf_counter()
+        self.last_chunk: Optional[float] = None
+        self.max_gap = 0.0
+        self._client = client
+        self._kwargs = kwargs
+        self._finished = finished
+        self._response = None
+        threading.Thread(target=self._run, name="ansci-stream", daemon=True).start()
+
+    def stalled_for(self, now: float) -> float:
+        """Seconds since the last chunk (or since the request, before the first)"""
+        return now - (self.last_chunk or self.start)
+
+    def stop(self) -> None:
+        """Cancel the attempt, closing its connection if it is blocked on a read"""
+        self.cancel.set()
+        self._close()
+
+    def _close(self) -> None:
+        close = getattr(self._response, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def _run(self) -> None:
+        watchdog = StallWatchdog(self._close)
+        try:
+            with watchdog:
+                self._response = self._client.messages.create(
+                    stream=True, **self._kwargs
+                )
+                _consume_stream(
+                    self._response,
+                    self.result,
+                    self.start,
+                    self.cancel,
+                    on_chunk=lambda: (self._on_chunk(), watchdog.feed()),
+                )
+        except BaseException as e:
+            if not self.cancel.is_set():
+                self.error = e
+        finally:
+            if watchdog.stalled and not self.cancel.is_set():
+                self.error = StreamStalledError("stream stalled")
+            self.result.elapsed = time.perf_counter() - self.start
+            self.done.set()
+            self._finished.set()
+
+    def _on_chunk(self) -> None:
+        now = time.perf_counter()
+        if self.last_chunk is not None:
+            self.max_gap = max(self.max_gap, now - self.last_chunk)
+        if self.result.time_to_first_token is not None:
+            self.last_chunk = now
+
+
+def _stream_once(
+    client,
+    label: str,
+    task: Optional[str],
+    cancel: Optional[threading.Event],
+    on_tool_delta: Optional[Callable[[str], None]],
+    kwargs: Dict[str, Any],
+) -> LLMResponse:
+    result = LLMResponse()
+    start = time.perf_counter()
+
+    response = client.messages.create(stream=True, **kwargs)
+    with StallWatchdog(getattr(response, "close", lambda: None)) as watchdog:
+        try:
+            _consume_stream(
+                response, result, start, cancel, on_tool_delta, on_chunk=watchdog.feed
+            )
+        except Exception as e:
+            if watchdog.stalled:
+                raise StreamStalledError(f"{label}: stream stalled") from e
+            raise
+    if watchdog.stalled:
+        raise StreamStalledError(f"{label}: stream stalled")
+
+    result.elapsed = time.perf_counter() - start
+    _record_usage(label, result, task, kwargs.get("model"))
+    return result
+
+
+def _stream_hedged(
+    client,
+    label: str,
+    task: Optional[str],
+    cancel: Optional[threading.Event],
+    kwargs: Dict[str, Any],
+    estimated_input_tokens: int,
+) -> LLMResponse:
+    # The primary streams on a worker thread so this one can watch it for stalls.
+    # It was admitted by the caller; a backup is admitted here, and only if the
+    # rate limits have room for it right away
+    key = task or label
+    endpoint = anthropic_endpoint(kwargs.get("model"))
+    ttft_threshold, gap_threshold = _stall_thresholds(key)
+    _count_hedge_request()
+
+    finished = threading.Event()
+    attempts = [_StreamAttempt(client, kwargs, finished)]
+    watching = True
+    while True:
+        winner = next(
+            (a for a in attempts if a.done.is_set() and a.error is None), None
+        )
+        if winner is not None:
+            break
+        if all(a.done.is_set() for a in attempts):
+            if len(attempts) > 1:
+                endpoint.settle(
+                    estimated_input_tokens, *_billed_tokens(attempts[1].result)
+                )
+            raise attempts[0].error or attempts[-1].error
+        if cancel is not None and cancel.is_set():
+            for attempt in attempts:
+                attempt.stop()
+            winner = attempts[0]
+            winner.result.cancelled = True
+            winner.result.elapsed = time.perf_counter() - winner.start
+            break
+
+        timeout = _HEDGE_POLL_INTERVAL
+        if watching:
+            primary = attempts[0]
+            threshold = (
+                gap_threshold
+                if primary.result.time_to_first_token is not None
+                else ttft_threshold
+            )
+            stalled = primary.stalled_for(time.perf_counter())
+            if stalled >= threshold:
+                # At most one backup; without budget or rate limit room keep
+                # waiting on the primary
+                watching = False
+                if _take_hedge_credit(
+                    lambda: try_admit(endpoint, estimated_input_tokens)
+                ):
+                    print(
+                        f"🪁 {label}: no data for {stalled:.1f}s, "
+                        "launching a backup request"
+                    )
+                    attempts.append(_StreamAttempt(client, kwargs, finished))
+            else:
+                timeout = min(timeout, threshold - stalled)
+
+        finished.wait(timeout)
+        finished.clear()
+
+    for attempt in attempts:
+        if attempt is not winner:
+            attempt.stop()
+
+    result = winner.result
+    model = kwargs.get("model")
+    if len(attempts) > 1:
+        if winner is not attempts[0]:
+            with _hedge_lock:
+                HEDGE_STATS["wins"] += 1
+            print(f"🪁 {label}: backup request finished first")
+        # The losing request was billed for what it consumed before cancelling.
+        # The caller settles the winner, so the loser settles the backup's
+        # reservation
+        loser = attempts[1] if winner is attempts[0] else attempts[0]
+        endpoint.settle(estimated_input_tokens, *_billed_tokens(loser.result))
+        _record_usage(f"{label} (cancelled hedge)", loser.result, None, model)
+
+    if not result.cancelled:
+        _add_stall_samples(key, winner)
+    _record_usage(label, result, task, model)
+    return result
+
+
+def _consume_stream(
+    response,
+    result: LLMResponse,
+    start: float,
+    cancel: Optional[threading.Event],
+    on_tool_delta: Optional[Callable[[str], None]] = None,
+    on_chunk: Optional[Callable[[], None]] = None,
+) -> None:
+    for chunk in response:
+        if cancel is not None and cancel.is_set():
+            result.cancelled = True
+            close = getattr(response, "close", None)
+            if close is not None:
+                close()
+            break
+        if chunk.type == "message_start":
+            _merge_usage(result.usage, getattr(chunk.message, "usage", None))
+        elif chunk.type == "message_delta":
+            # Delta usage is cumulative, so it overrides message_start values
+            _merge_usage(result.usage, getattr(chunk, "usage", None))
+        elif chunk.type == "content_block_delta":
+            if result.time_to_first_token is None:
+                result.time_to_first_token = time.perf_counter() - start
+            if chunk.delta.type == "text_delta":
+                result.text += chunk.delta.text
+            elif chunk.delta.type == "input_json_delta":
+                result.tool_input_json += chunk.delta.partial_json
+                if on_tool_delta is not None:
+                    on_tool_delta(chunk.delta.partial_json)
+        if on_chunk is not None:
+            on_chunk()
+
+
+def _stall_thresholds(key: str) -> Tuple[float, float]:
+    with _hedge_lock:
+        ttft = list(_ttft_samples.get(key, ()))
+        gaps = list(_gap_samples.get(key, ()))
+    return (
+        _percentile_threshold(ttft, HEDGE_DEFAULT_TTFT),
+        _percentile_threshold(gaps, HEDGE_DEFAULT_GAP),
+    )
+
+
+def _percentile_threshold(samples: List[float], default: float) -> float:
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return default
+    samples.sort()
+    index = min(len(samples) - 1, int(HEDGE_PERCENTILE * len(samples)))
+    return max(HEDGE_MIN_DELAY, samples[index])
+
+
+def _add_stall_samples(key: str, attempt: _StreamAttempt) -> None:
+    with _hedge_lock:
+        if attempt.result.time_to_first_token is not None:
+            _ttft_samples.setdefault(key, deque(maxlen=HEDGE_WINDOW)).append(
+                attempt.result.time_to_first_token
+            )
+        _gap_samples.setdefault(key, deque(maxlen=HEDGE_WINDOW)).append(
+            attempt.max_gap
+        )
+
+
+def _count_hedge_request() -> None:
+    global _hedge_credit
+    with _hedge_lock:
+        HEDGE_STATS["requests"] += 1
+        _hedge_credit = min(HEDGE_BURST, _hedge_credit + HEDGE_BUDGET)
+
+
+def _take_hedge_credit(admit: Callable[[], bool]) -> bool:
+    # Spends a credit only if admit() lets the backup through the rate limits
+    global _hedge_credit
+    with _hedge_lock:
+        if _hedge_credit < 1 or not admit():
+            HEDGE_STATS["denied"] += 1
+            return False
+        _hedge_credit -= 1
+        HEDGE_STATS["hedged"] += 1
+        return True
+
+
+def _prompt_tokens(kwargs: Dict[str, Any]) -> Tuple[int, List[Tuple[str, int]]]:
+    # Token estimate of the prompt, plus (digest, tokens up to there) for the
+    # prefix ending at each cache_control block. Like the provider's cache,
+    # the digest covers the model, tools, system prompt and messages in order
+    digest = hashlib.sha256(
+        json.dumps([kwargs.get("model"), kwargs.get("tools")], default=str).encode()
+    )
+    tokens, prefixes = 0, []
+    sections = [("system", kwargs.get("system"))] + [
+        (message.get("role"), message.get("content"))
+        for message in kwargs.get("messages") or []
+    ]
+    for role, content in sections:
+        digest.update(str(role).encode())
+        for block in content if isinstance(content, list) else [content]:
+            tokens += _content_tokens(block)
+            digest.update(json.dumps(block, sort_keys=True, default=str).encode())
+            if isinstance(block, dict) and block.get("cache_control"):
+                prefixes.append((digest.hexdigest(), tokens))
+    return tokens, prefixes
+
+
+def _uncached_tokens(tokens: int, prefixes: List[Tuple[str, int]]) -> int:
+    # Leave out the longest prefix still in the prompt cache
+    now = time.monotonic()
+    cached = 0
+    with _prefix_lock:
+        for digest, prefix_tokens in prefixes:
+            used = _cached_prefixes.get(digest)
+            if used is not None and now - used < PROMPT_CACHE_TTL:
+                cached = prefix_tokens
+    return tokens - cached
+
+
+def _content_tokens(content: Any) -> int:
+    # Text at CHARS_PER_TOKEN, base64 documents at PDF_BYTES_PER_TOKEN
+    chars, pdf_bytes = 0, 0
+
+    def visit(content: Any) -> None:
+        nonlocal chars, pdf_bytes
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for block in content:
+                visit(block)
+        elif isinstance(content, dict):
+            source = content.get("source")
+            if isinstance(source, dict) and source.get("type") == "base64":
+                pdf_bytes += len(source.get("data", "")) * 3 // 4
+            elif isinstance(source, dict):
+                visit(source.get("data"))
+            visit(content.get("text"))
+            visit(content.get("content"))
+
+    visit(content)
+    return chars // CHARS_PER_TOKEN + pdf_bytes // PDF_BYTES_PER_TOKEN
+
+
+def _billed_tokens(result: LLMResponse) -> Tuple[int, int]:
+    # Cache reads do not count towards the input token rate limit
+    usage = result.usage
+    return (
+        usage.get("input_tokens", 0) + usage.get("cache_creation_input_tokens", 0),
+        usage.get("output_tokens", 0),
+    )
+
+
+def _merge_usage(usage: Dict[str, int], reported) -> None:
+    if reported is None:
+        return
+    for name in USAGE_FIELDS:
+        value = getattr(reported, name, None)
+        if value is not None:
+            usage[name] = value
+
+
+def _record_usage(
+    label: str, result: LLMResponse, task: Optional[str], model: Optional[str]
+) -> None:
+    usage = result.usage
+    scope = _usage_scope.get()
+    scopes = [USAGE_TOTALS] if scope is None else [USAGE_TOTALS, scope]
+    with _usage_lock:
+        for totals in scopes:
+            totals["calls"] += 1
+            for name in USAGE_FIELDS:
+                totals[name] += usage.get(name, 0)
+
+        if task is not None:
+            metrics = TASK_METRICS.setdefault(
+                task,
+                {
+                    "calls": 0,
+                    "elapsed": 0.0,
+                    "time_to_first_token": 0.0,
+                    "models": set(),
+                    **{name: 0 for name in USAGE_FIELDS},
+                },
+            )
+            metrics["calls"] += 1
+            metrics["elapsed"] += result.elapsed
+            metrics["time_to_first_token"] += result.time_to_first_token or 0.0
+            metrics["models"].add(model or "?")
+            for name in USAGE_FIELDS:
+                metrics[name] += usage.get(name, 0)
+
+    ttft = (
+        f"{result.time_to_first_token:.2f}s"
+        if result.time_to_first_token is not None
+        else "n/a"
+    )
+    print(
+        f"📊 {label}: {usage.get('input_tokens', 0)} in, "
+        f"{usage.get('cache_read_input_tokens', 0)} cache read, "
+        f"{usage.get('cache_creation_input_tokens', 0)} cache write, "
+        f"{usage.get('output_tokens', 0)} out | "
+        f"first token {ttft}, total {result.elapsed:.2f}s"
+    )
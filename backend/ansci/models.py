@@ -29,3 +29,22 @@ class AnsciAnimation(BaseModel):
     """Animation - a list of scene blocks forming the animation"""
 
     blocks: list[AnsciSceneBlock] = Field(description="The blocks of the scene")
+
+
+class PaperSection(BaseModel):
+    """Section of a paper extracted locally from its PDF"""
+
+    heading: str = Field(description="Section heading as printed in the paper")
+    pages: list[int] = Field(description="1-based page numbers the section spans")
+    text: str = Field(description="Extracted section text")
+    equations: list[str] = Field(
+        default_factory=list, description="Numbered equations found in the section"
+    )
+
+
+class PaperText(BaseModel):
+    """Text content of a paper - a compact stand-in for the PDF document"""
+
+    digest: str = Field(description="SHA-256 digest of the PDF bytes")
+    page_count: int = Field(description="Number of pages in the PDF")
+    sections: list[PaperSection] = Field(description="Sections in reading order")
@@ -1,80 +1,581 @@
-from .models import AnsciOutline
-from anthropic.types import MessageParam
-import anthropic
-import os
+from __future__ import annotations
+
+from .models import AnsciOutline, AnsciOutlineBlock
+from .cache import DiskCache, make_key
+from .llm import cached_system, is_paper_block, stream_message
+from .ingest import split_paper_history
+from .routing import route
+from .resilience import anthropic_endpoint
+from .resilience import call as resilient_call
+from .clients import anthropic_client
 import base64
-import httpx
+import hashlib
 import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterator
+
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+
+
+# Outline request configuration (all of it, plus the "outline" route, feeds the
+# outline cache key)
+OUTLINE_SYSTEM_PROMPT = "You are a seasoned educator."  # <-- role prompt
+OUTLINE_TOOL = {
+    "name": "generate_animation_from_outline",
+    "description": "Generate an animation from an outline",
+    "input_schema": AnsciOutline.model_json_schema(),
+}
+
+# Papers whose outline prompt exceeds this many input tokens are outlined in
+# page/section windows (map) and then merged (reduce)
+MAP_REDUCE_TOKEN_THRESHOLD = 100_000
+
+# Maximum number of window outlines generated at once
+MAP_CONCURRENCY = 8
+
+MAP_PROMPT = """{prompt}
 
-# Load API key directly from environment
-api_key = os.environ.get("ANTHROPIC_API_KEY")
-if not api_key:
-    # Try loading from .env file manually
-    env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            for line in f:
-                if line.startswith("ANTHROPIC_API_KEY="):
-                    api_key = line.split("=", 1)[1].strip()
-                    break
+This request contains only part {index} of {count} of the paper. Outline just the
+material in this part; the partial outlines will be merged afterwards."""
 
-client = anthropic.Anthropic(api_key=api_key)
+MERGE_PROMPT = """{prompt}
 
+The paper was too long to outline in one pass, so it was outlined in {count}
+consecutive parts. The partial outlines, in paper order:
 
-def generate_outline(history: list[MessageParam]) -> tuple[str, AnsciOutline | None]:
+{parts}
+
+Merge them into a single outline for the whole animation:
+- Remove duplicate or overlapping blocks, combining their content
+- Keep blocks in the order the material appears in the paper
+- Keep each block's text self-contained - it is all the scene generator sees
+- Give the outline one overall title"""
+
+
+def generate_outline(
+    history: list[MessageParam],
+    cache: DiskCache | None = None,
+    refresh: bool = False,
+    on_block: Callable[[AnsciOutlineBlock], None] | None = None,
+    on_title: Callable[[str], None] | None = None,
+    map_reduce: bool | None = None,
+) -> tuple[str, AnsciOutline | None]:
     """
     Generate an outline for the animation from message history. We make sure
     that the history contains the paper as a file, and user messages.
+
+    Args:
+        history: Message history with the paper document and user prompt
+        cache: Optional outline cache; hits skip the model call entirely
+        refresh: Ignore any cached outline and regenerate (refreshing the cache)
+        on_block: Called with each outline block as soon as it is complete in
+            the stream (before the rest of the outline has been written)
+        on_title: Called with the outline title once it has streamed in
+        map_reduce: Outline the paper in windows and merge the partial outlines.
+            None decides automatically from the prompt's token count.
     """
-    response = client.messages.create(
-        max_tokens=32000,  # Maximum tokens for Sonnet 4
-        model="claude-sonnet-4-20250514",  # Use Sonnet 4 for higher quality outlines
-        system="You are a seasoned educator.",  # <-- role prompt
-        stream=True,  # Enable streaming for long requests
-        messages=history,
-        tools=[
-            {
-                "name": "generate_animation_from_outline",
-                "description": "Generate an animation from an outline",
-                "input_schema": AnsciOutline.model_json_schema(),
-            }
-        ],
+    cache_key = None
+    if cache is not None:
+        cache_key = _outline_cache_key(history, map_reduce)
+        if not refresh:
+            cached = cache.get_json(cache_key)
+            if cached is not None:
+                try:
+                    outline = AnsciOutline(**cached["outline"])
+                    print("💾 Outline cache hit - skipping model call")
+                    _replay_outline(outline, on_block, on_title)
+                    return (cached["text"], outline)
+                except Exception as e:
+                    print(f"⚠️  Ignoring unreadable cached outline: {e}")
+
+    if map_reduce is None:
+        map_reduce = _exceeds_token_threshold(history)
+
+    # Splitting decodes and re-encodes the whole PDF, so only long papers pay
+    windows = []
+    if map_reduce:
+        try:
+            windows = split_paper_history(history)
+        except Exception as e:
+            print(f"⚠️  Splitting the paper failed ({e})")
+
+    if len(windows) > 1:
+        text_content, outline = _generate_outline_map_reduce(
+            history, windows, on_block, on_title
+        )
+    else:
+        if map_reduce:
+            print("⚠️  Paper cannot be split into windows - using a single call")
+        # System prompt and paper document are cacheable, so a re-run for the
+        # same paper within the cache TTL is served from the prefix cache
+        text_content, outline = _stream_outline(
+            history, "outline", on_block, on_title
+        )
+
+    if outline is not None and cache is not None:
+        cache.put_json(
+            cache_key, {"text": text_content, "outline": outline.model_dump()}
+        )
+    return (text_content, outline)
+
+
+def select_outline_blocks(
+    outline: AnsciOutline, selection: list[str | int]
+) -> AnsciOutline:
+    """
+    Keep only the chosen outline blocks, in the order they were selected
+
+    Args:
+        outline: Complete outline
+        selection: 1-based block numbers (as printed after the outline step) or
+            block titles; a title matches exactly or, failing that, as a
+            case-insensitive substring of one block title
+
+    Raises:
+        ValueError: If an entry matches no block, or a title matches several
+    """
+    chosen = []
+    for entry in selection:
+        index = _selected_index(outline, entry)
+        if index not in chosen:
+            chosen.append(index)
+
+    return AnsciOutline(
+        title=outline.title, blocks=[outline.blocks[index] for index in chosen]
     )
 
-    # Collect streamed response
-    text_content = ""
-    tool_call = None
-    tool_input_json = ""
-
-    for chunk in response:
-        if chunk.type == "content_block_start":
-            if chunk.content_block.type == "text":
-                pass  # Text block started
-            elif chunk.content_block.type == "tool_use":
-                tool_call = chunk.content_block
-        elif chunk.type == "content_block_delta":
-            if chunk.delta.type == "text_delta":
-                text_content += chunk.delta.text
-            elif chunk.delta.type == "input_json_delta":
-                # Accumulate tool input JSON
-                tool_input_json += chunk.delta.partial_json
-        elif chunk.type == "content_block_stop":
-            pass  # Block completed
+
+def _selected_index(outline: AnsciOutline, entry: str | int) -> int:
+    text = str(entry).strip()
+    if text.isdigit():
+        number = int(text)
+        if not 1 <= number <= len(outline.blocks):
+            raise ValueError(
+                f"Block {number} is out of range (outline has {len(outline.blocks)})"
+            )
+        return number - 1
+
+    titles = [block.block_title.strip().lower() for block in outline.blocks]
+    wanted = text.lower()
+    if wanted in titles:
+        return titles.index(wanted)
+
+    matches = [index for index, title in enumerate(titles) if wanted in title]
+    if len(matches) == 1:
+        return matches[0]
+    if not matches:
+        raise ValueError(f"No outline block matches '{text}'")
+    raise ValueError(
+        f"'{text}' matches several outline blocks: "
+        + ", ".join(outline.blocks[index].block_title for index in matches)
+    )
+
+
+def _stream_outline(
+    messages: list[MessageParam],
+    label: str,
+    on_block: Callable[[AnsciOutlineBlock], None] | None = None,
+    on_title: Callable[[str], None] | None = None,
+) -> tuple[str, AnsciOutline | None]:
+    """Run one streamed outline tool call and parse its result"""
+    parser = OutlineBlockParser()
+
+    def handle_tool_delta(partial_json: str) -> None:
+        had_title = parser.title is not None
+        blocks = parser.feed(partial_json)
+        if on_title is not None and not had_title and parser.title is not None:
+            on_title(parser.title)
+        if on_block is not None:
+            for block in blocks:
+                on_block(block)
+
+    outline_route = route("outline")
+    client = anthropic_client()
+    if client is None:
+        raise RuntimeError("ANTHROPIC_API_KEY is not set")
+    response = stream_message(
+        client,
+        label,
+        on_tool_delta=handle_tool_delta if (on_block or on_title) else None,
+        task="outline",
+        max_tokens=outline_route.max_tokens,
+        model=outline_route.model,
+        system=cached_system(OUTLINE_SYSTEM_PROMPT),
+        messages=messages,
+        tools=[OUTLINE_TOOL],
+    )
+    text_content = response.text
 
     # Check if there's a tool call in the response
-    if tool_call and tool_input_json:
+    if response.tool_input_json:
         # Parse the accumulated tool call input into AnsciOutline object
         try:
-            tool_input = json.loads(tool_input_json)
+            tool_input = json.loads(response.tool_input_json)
             return (text_content, AnsciOutline(**tool_input))
         except (json.JSONDecodeError, Exception) as e:
             print(f"⚠️ Failed to parse tool input: {e}")
-            return (text_content, None)
 
     return (text_content, None)
 
 
+def _generate_outline_map_reduce(
+    history: list[MessageParam],
+    windows: list[list[dict]],
+    on_block: Callable[[AnsciOutlineBlock], None] | None = None,
+    on_title: Callable[[str], None] | None = None,
+) -> tuple[str, AnsciOutline | None]:
+    """
+    Outline each paper window concurrently, then merge the partial outlines in
+    one call that sees only the partial outlines (not the paper)
+    """
+    prompt = _user_prompt(history)
+    count = len(windows)
+    print(f"🗂️  Outlining the paper in {count} windows, then merging")
+
+    window_histories = [
+        [
+            {
+                "role": "user",
+                "content": [
+                    *window,
+                    {
+                        "type": "text",
+                        "text": MAP_PROMPT.format(
+                            prompt=prompt, index=index + 1, count=count
+                        ),
+                    },
+                ],
+            }
+        ]
+        for index, window in enumerate(windows)
+    ]
+
+    with ThreadPoolExecutor(
+        max_workers=min(MAP_CONCURRENCY, count),
+        thread_name_prefix="ansci-outline-map",
+    ) as executor:
+        results = list(
+            executor.map(
+                lambda job: _stream_outline(job[1], f"outline part {job[0]}/{count}"),
+                enumerate(window_histories, start=1),
+            )
+        )
+
+    partials = [outline for _, outline in results if outline is not None]
+    if len(partials) < count:
+        print(f"⚠️  {count - len(partials)} of {count} window outlines failed")
+    if not partials:
+        return ("", None)
+
+    parts = "\n\n".join(
+        f'<part index="{index}">\n{partial.model_dump_json()}\n</part>'
+        for index, partial in enumerate(partials, start=1)
+    )
+    merge_messages: list[MessageParam] = [
+        {
+            "role": "user",
+            "content": MERGE_PROMPT.format(prompt=prompt, count=count, parts=parts),
+        }
+    ]
+    # Merged blocks are held back until the whole merge has parsed: if it
+    # fails, the partial outlines below replace it, and blocks already handed
+    # to scene generation could not be taken back
+    text_content, outline = _stream_outline(merge_messages, "outline merge")
+    if outline is not None:
+        _replay_outline(outline, on_block, on_title)
+        return (text_content, outline)
+
+    # Merge failed - fall back to the partial outlines back to back
+    print("⚠️  Outline merge failed - concatenating the partial outlines")
+    outline = AnsciOutline(
+        title=partials[0].title,
+        blocks=[block for partial in partials for block in partial.blocks],
+    )
+    _replay_outline(outline, on_block, on_title)
+    return (text_content, outline)
+
+
+def _exceeds_token_threshold(history: list[MessageParam]) -> bool:
+    """Count the outline prompt's input tokens and compare to the threshold"""
+    try:
+        # Token counting has its own rate limit, separate from the model's
+        tokens = resilient_call(
+            anthropic_endpoint("count_tokens"),
+            lambda: anthropic_client().messages.count_tokens(
+                model=route("outline").model,
+                system=OUTLINE_SYSTEM_PROMPT,
+                messages=history,
+                tools=[OUTLINE_TOOL],
+            ),
+            label="outline token count",
+        ).input_tokens
+    except Exception as e:
+        print(f"⚠️  Token count failed ({e}) - using a single outline call")
+        return False
+
+    print(f"🔢 Outline prompt: {tokens} input tokens")
+    return tokens > MAP_REDUCE_TOKEN_THRESHOLD
+
+
+def _user_prompt(history: list[MessageParam]) -> str:
+    """The user's text from history, without the paper itself"""
+    texts = []
+    for message in history:
+        if message.get("role") != "user":
+            continue
+        content = message.get("content", "")
+        if isinstance(content, str):
+            texts.append(content)
+            continue
+        for block in content:
+            if is_paper_block(block):
+                continue
+            if isinstance(block, dict) and block.get("type") == "text":
+                texts.append(block.get("text", ""))
+    return "\n\n".join(texts)
+
+
+def _replay_outline(
+    outline: AnsciOutline,
+    on_block: Callable[[AnsciOutlineBlock], None] | None,
+    on_title: Callable[[str], None] | None,
+) -> None:
+    """Deliver an already complete outline through the streaming callbacks"""
+    if on_title is not None:
+        on_title(outline.title)
+    if on_block is not None:
+        for block in outline.blocks:
+            on_block(block)
+
+
+class OutlineBlockParser:
+    """
+    Incremental parser over the streamed outline tool input
+
+    Feed it input_json_delta fragments; it returns each element of the top-level
+    "blocks" array as an AnsciOutlineBlock as soon as that object is closed, and
+    picks up the top-level "title" string as soon as it is complete.
+    """
+
+    def __init__(self):
+        self.title: str | None = None
+        self._buffer = ""
+        self._stack: list[str] = []  # open containers, "{" or "["
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False  # next top-level string is a key
+        self._root_key: str | None = None  # key of the current top-level value
+        self._block_start: int | None = None
+
+    def feed(self, partial_json: str) -> list[AnsciOutlineBlock]:
+        """Consume a JSON fragment and return the blocks it completed"""
+        completed = []
+        start = len(self._buffer)
+        self._buffer += partial_json
+
+        for index in range(start, len(self._buffer)):
+            char = self._buffer[index]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._top_level_string(
+                            self._buffer[self._string_start : index + 1]
+                        )
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                self._stack.append(char)
+                if len(self._stack) == 1:
+                    self._expect_key = True
+                elif self._in_blocks_array() and len(self._stack) == 3:
+                    self._block_start = index
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if char == "}" and self._block_start is not None:
+                    if len(self._stack) == 2 and self._in_blocks_array():
+                        block = self._parse_block(
+                            self._buffer[self._block_start : index + 1]
+                        )
+                        if block is not None:
+                            completed.append(block)
+                        self._block_start = None
+            elif len(self._stack) == 1:
+                if char == ":":
+                    self._expect_key = False
+                elif char == ",":
+                    self._expect_key = True
+
+        return completed
+
+    def _in_blocks_array(self) -> bool:
+        return self._root_key == "blocks" and self._stack[:2] == ["{", "["]
+
+    def _top_level_string(self, literal: str) -> None:
+        value = json.loads(literal)
+        if self._expect_key:
+            self._root_key = value
+        elif self._root_key == "title":
+            self.title = value
+
+    def _parse_block(self, block_json: str) -> AnsciOutlineBlock | None:
+        try:
+            return AnsciOutlineBlock(**json.loads(block_json))
+        except Exception as e:
+            print(f"⚠️ Failed to parse streamed outline block: {e}")
+            return None
+
+
+class OutlineStream:
+    """
+    Outline generation running in the background
+
+    Blocks are handed out through iter_blocks() as soon as each one is complete,
+    so scene generation can start on the first block while the model is still
+    writing the rest. result() waits for the full outline.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        history: list[MessageParam],
+        cache: DiskCache | None = None,
+        refresh: bool = False,
+        map_reduce: bool | None = None,
+    ):
+        self._blocks: "queue.Queue" = queue.Queue()
+        self._title_ready = threading.Event()
+        self._emitted = 0
+        # (block_title, text) of every block handed out, so blocks delivered
+        # twice (e.g. replayed after a failed merge) go out once
+        self._sent: set[tuple[str, str]] = set()
+        self.title: str | None = None
+        self.text = ""
+        self.outline: AnsciOutline | None = None
+        self.error: Exception | None = None
+
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(history, cache, refresh, map_reduce),
+            name="ansci-outline",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def iter_blocks(self) -> Iterator[AnsciOutlineBlock]:
+        """Yield outline blocks in order as they arrive (single consumer)"""
+        while True:
+            block = self._blocks.get()
+            if block is self._DONE:
+                return
+            yield block
+
+    def wait_title(self) -> str:
+        """Block until the title has streamed in (or generation has finished)"""
+        self._title_ready.wait()
+        return self.title or ""
+
+    def result(self) -> tuple[str, AnsciOutline | None]:
+        """Wait for the complete outline, like generate_outline's return value"""
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return (self.text, self.outline)
+
+    def _run(self, history, cache, refresh, map_reduce) -> None:
+        try:
+            self.text, self.outline = generate_outline(
+                history,
+                cache=cache,
+                refresh=refresh,
+                on_block=self._emit,
+                on_title=self._set_title,
+                map_reduce=map_reduce,
+            )
+            if self.outline is not None:
+                self._set_title(self.outline.title)
+                # Anything the incremental parser missed comes from the full parse
+                for block in self.outline.blocks:
+                    self._emit(block)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._title_ready.set()
+            self._blocks.put(self._DONE)
+
+    def _set_title(self, title: str) -> None:
+        if self.title is None:
+            self.title = title
+        self._title_ready.set()
+
+    def _emit(self, block: AnsciOutlineBlock) -> None:
+        identity = (block.block_title, block.text)
+        if identity in self._sent:
+            return
+        self._sent.add(identity)
+        self._emitted += 1
+        print(f"📥 Outline block {self._emitted} ready: {block.block_title}")
+        self._blocks.put(block)
+
+
+def _outline_cache_key(
+    history: list[MessageParam], map_reduce: bool | None = None
+) -> str:
+    """
+    Cache key for an outline request: SHA-256 of the paper bytes plus the user
+    prompts, system prompt, model id, tool schema and outline mode
+    """
+    parts = []
+    for message in history:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            parts.append([message.get("role"), "text", content])
+            continue
+
+        for block in content:
+            if not isinstance(block, dict):
+                continue
+            if block.get("type") == "document":
+                source = block.get("source", {})
+                if source.get("type") == "base64":
+                    # Hash the PDF bytes themselves, not their encoding
+                    pdf_bytes = base64.b64decode(source.get("data", ""))
+                    digest = hashlib.sha256(pdf_bytes).hexdigest()
+                else:
+                    digest = make_key(source)
+                parts.append([message.get("role"), "document", digest])
+            elif block.get("type") == "text":
+                parts.append([message.get("role"), "text", block.get("text", "")])
+
+    return make_key(
+        "outline",
+        parts,
+        OUTLINE_SYSTEM_PROMPT,
+        route("outline"),
+        OUTLINE_TOOL,
+        map_reduce,
+        MAP_PROMPT,
+        MERGE_PROMPT,
+    )
+
+
 if __name__ == "__main__":
+    import httpx
+
     pdf_url = "https://www.cs.cmu.edu/~conitzer/visualAMM.pdf"
     pdf_data = base64.standard_b64encode(httpx.get(pdf_url).content).decode("utf-8")
 
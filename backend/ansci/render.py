@@ -4,25 +4,24 @@ Responsible for rendering AnsciAnimation objects to video files
 Includes quality assurance and validation during rendering
 """
 
+import os
 import sys
+import shutil
 import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
-from functools import wraps
 
 from .models import AnsciAnimation, AnsciSceneBlock
 from .audio import create_audiovisual_animation_with_embedded_audio
+from .render_pool import RUNTIME_PATH, ManimWorkerPool
+from .cache import AudioCache, RenderCache
+from .verify import RUNTIME_MODULE, SCENE_HEADER
 
-# Quality Assurance for Rendering
-try:
-    from manim import *
-    import numpy as np
-
-    MANIM_AVAILABLE = True
-except ImportError:
-    MANIM_AVAILABLE = False
-    print("Warning: Manim not available. Using fallback implementations.")
+# A scene render still running after this long is killed (seconds), whether it
+# runs in a manim subprocess or on a warm worker (ANSCI_RENDER_TIMEOUT)
+RENDER_TIMEOUT = float(os.environ.get("ANSCI_RENDER_TIMEOUT", 900))
 
 
 def validate_scene_block(scene_block: AnsciSceneBlock) -> bool:
@@ -87,12 +86,22 @@ def validate_animation(animation: AnsciAnimation) -> bool:
 class AnimationRenderer:
     """Service responsible for rendering animations to video files with quality assurance"""
 
-    def __init__(self, output_dir: str, enable_validation: bool = True):
+    def __init__(
+        self,
+        output_dir: str,
+        enable_validation: bool = True,
+        max_workers: int = 1,
+        worker_pool: Optional[ManimWorkerPool] = None,
+        render_cache: Optional[RenderCache] = None,
+    ):
         self.output_dir = (
             Path(output_dir) if output_dir else Path("generated_animations")
         )
         self.output_dir.mkdir(exist_ok=True)
         self.enable_validation = enable_validation
+        self.max_workers = max(1, max_workers)
+        self.worker_pool = worker_pool
+        self.render_cache = render_cache
 
     def render_animation(
         self, animation: AnsciAnimation, quality: str = "high"
@@ -107,35 +116,77 @@ class AnimationRenderer:
         Returns:
             List of paths to rendered video files
         """
-        print(f"🎬 Starting animation rendering (quality: {quality})")
+        scene_results = self.render_scenes(animation, quality)
+        return [video_path for video_path in scene_results if video_path]
+
+    def render_scenes(
+        self, animation: AnsciAnimation, quality: str = "high"
+    ) -> List[Optional[str]]:
+        """
+        Render all scenes in the animation, keeping one result slot per scene
+
+        Scenes are independent, so with max_workers > 1 they are rendered
+        concurrently. Each scene renders in its own temporary directory and
+        writes to its own output file, so a failing scene only leaves a None
+        in its own slot.
+
+        Args:
+            animation: AnsciAnimation object containing scene blocks
+            quality: Rendering quality ("high" or "low")
+
+        Returns:
+            List of video paths in scene order (None for scenes that failed)
+        """
+        total_scenes = len(animation.blocks)
+        workers = min(self.max_workers, max(1, total_scenes))
+        print(
+            f"🎬 Starting animation rendering (quality: {quality}, workers: {workers})"
+        )
 
         # Quality assurance validation
         if self.enable_validation:
             if not validate_animation(animation):
                 print("❌ Animation rendering aborted due to validation failures")
-                return []
-
-        video_paths = []
+                return [None] * total_scenes
 
-        for i, scene_block in enumerate(animation.blocks):
-            print(f"🎬 Rendering Scene {i+1}/{len(animation.blocks)}...")
+        def render_one(index: int) -> Optional[str]:
+            scene_block = animation.blocks[index]
+            print(f"🎬 Rendering Scene {index+1}/{total_scenes}...")
 
             # Additional per-scene validation
             if self.enable_validation and not validate_scene_block(scene_block):
-                print(f"⚠️  Skipping Scene {i+1} due to validation failure")
-                continue
+                print(f"⚠️  Skipping Scene {index+1} due to validation failure")
+                return None
+
+            try:
+                video_path = self._render_scene_block(
+                    scene_block, f"Scene{index+1}", quality
+                )
+            except Exception as e:
+                print(f"❌ Unexpected error rendering Scene {index+1}: {e}")
+                video_path = None
 
-            video_path = self._render_scene_block(scene_block, f"Scene{i+1}", quality)
             if video_path:
-                video_paths.append(video_path)
-                print(f"✅ Scene {i+1} rendered successfully: {video_path}")
+                print(f"✅ Scene {index+1} rendered successfully: {video_path}")
             else:
-                print(f"❌ Failed to render Scene {i+1}")
+                print(f"❌ Failed to render Scene {index+1}")
+            return video_path
 
+        if workers == 1:
+            scene_results = [render_one(i) for i in range(total_scenes)]
+        else:
+            # Each job drives its own manim subprocess, so threads are enough to
+            # keep `workers` renders in flight; map() preserves scene order
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="ansci-render"
+            ) as executor:
+                scene_results = list(executor.map(render_one, range(total_scenes)))
+
+        successful = sum(1 for video_path in scene_results if video_path)
         print(
-            f"🎬 Animation rendering complete: {len(video_paths)}/{len(animation.blocks)} scenes successful"
+            f"🎬 Animation rendering complete: {successful}/{total_scenes} scenes successful"
         )
-        return video_paths
+        return scene_results
 
     def render_scene_block(
         self, scene_block: AnsciSceneBlock, scene_name: str, quality: str = "high"
@@ -200,137 +251,105 @@ class AnimationRenderer:
     ) -> Optional[str]:
         """Internal method to render a single scene block"""
 
+        # Add proper imports to the generated code
+        enhanced_code = self._add_imports_to_manim_code(scene_block.manim_code)
+        output_path = self.output_dir / f"{scene_name}.mp4"
+
+        # Identical code, quality and audio render to an identical video
+        cache_key = None
+        if self.render_cache is not None:
+            cache_key = self.render_cache.key_for(enhanced_code, scene_name, quality)
+            if self.render_cache.fetch(cache_key, output_path):
+                print(f"💾 Render cache hit for {scene_name} - skipping manim")
+                return str(output_path)
+
         # Create temporary Python file with the Manim code
         temp_dir = Path(tempfile.mkdtemp())
         scene_file = temp_dir / f"{scene_name}.py"
 
-        # Add proper imports to the generated code
-        enhanced_code = self._add_imports_to_manim_code(scene_block.manim_code)
-
         with open(scene_file, "w") as f:
             f.write(enhanced_code)
 
-        # Quality flags
-        quality_flag = "-qh" if quality == "high" else "-ql"
-
-        # Render with Manim
         try:
-            result = subprocess.run(
-                [
-                    sys.executable,
-                    "-m",
-                    "manim",
-                    quality_flag,
-                    str(scene_file),
-                    scene_name,
-                ],
-                capture_output=True,
-                text=True,
-                check=True,
-                cwd=temp_dir,
-            )
+            if self.worker_pool is not None:
+                # Render on a warm worker that already has manim imported
+                rendered = self.worker_pool.render(
+                    scene_file, scene_name, quality, temp_dir / "media"
+                )
+                video_file = Path(rendered) if rendered else None
+            else:
+                video_file = self._render_with_subprocess(
+                    scene_file, scene_name, quality, temp_dir
+                )
 
-            # Find the output video
-            media_dir = temp_dir / "media" / "videos" / scene_name
-            for video_file in media_dir.rglob("*.mp4"):
-                # Copy to our output directory
-                output_path = self.output_dir / f"{scene_name}.mp4"
-                output_path.parent.mkdir(exist_ok=True)
+            if video_file is None or not video_file.exists():
+                return None
 
-                import shutil
+            # Copy to our output directory (replacing, never writing through,
+            # an old output that may be hard-linked into the render cache)
+            output_path.parent.mkdir(exist_ok=True)
+            output_path.unlink(missing_ok=True)
+            shutil.copy2(video_file, output_path)
 
-                shutil.copy2(video_file, output_path)
-                return str(output_path)
+            if cache_key is not None:
+                self.render_cache.store(cache_key, output_path)
+
+            return str(output_path)
 
         except subprocess.CalledProcessError as e:
             print(f"Error rendering {scene_name}: {e.stderr}")
             return None
 
+        except subprocess.TimeoutExpired:
+            print(f"❌ Rendering {scene_name} timed out after {RENDER_TIMEOUT:.0f}s")
+            return None
+
         finally:
             # Cleanup temp directory
-            import shutil
-
             shutil.rmtree(temp_dir, ignore_errors=True)
 
-        return None
+    def _render_with_subprocess(
+        self, scene_file: Path, scene_name: str, quality: str, temp_dir: Path
+    ) -> Optional[Path]:
+        """Render a scene file with a fresh `python -m manim` process"""
 
-    def _add_imports_to_manim_code(self, manim_code: str) -> str:
-        """Add necessary imports and quality assurance to manim code if not present"""
-        if "from manim import *" not in manim_code:
-            imports = '''"""
-Auto-generated Manim scene with integrated quality assurance
-"""
+        # Quality flags
+        quality_flag = "-qh" if quality == "high" else "-ql"
 
-import sys
-import os
-from pathlib import Path
-from manim import *
-import numpy as np
-from functools import wraps
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            filter(None, [RUNTIME_PATH, env.get("PYTHONPATH")])
+        )
 
-# Integrated Quality Assurance for standalone rendering
-class LayoutManager:
-    """Safe positioning for animations"""
-    
-    SAFE_MARGIN = 0.5
-    SCREEN_WIDTH = 14.22
-    SCREEN_HEIGHT = 8.0
-    LEFT_BOUND = -SCREEN_WIDTH/2 + SAFE_MARGIN
-    RIGHT_BOUND = SCREEN_WIDTH/2 - SAFE_MARGIN
-    TOP_BOUND = SCREEN_HEIGHT/2 - SAFE_MARGIN
-    BOTTOM_BOUND = -SCREEN_HEIGHT/2 + SAFE_MARGIN
-    
-    @classmethod
-    def safe_position(cls, mobject, target_position):
-        """Ensure objects stay within safe screen boundaries"""
-        x, y, z = target_position
-        try:
-            obj_width = mobject.get_width() if hasattr(mobject, 'get_width') else 1.0
-            obj_height = mobject.get_height() if hasattr(mobject, 'get_height') else 0.5
-        except:
-            obj_width, obj_height = 1.0, 0.5
-        
-        half_width = obj_width / 2
-        if x - half_width < cls.LEFT_BOUND:
-            x = cls.LEFT_BOUND + half_width
-        elif x + half_width > cls.RIGHT_BOUND:
-            x = cls.RIGHT_BOUND - half_width
-        
-        half_height = obj_height / 2
-        if y + half_height > cls.TOP_BOUND:
-            y = cls.TOP_BOUND - half_height
-        elif y - half_height < cls.BOTTOM_BOUND:
-            y = cls.BOTTOM_BOUND + half_height
-        
-        return np.array([x, y, z])
-
-def validate_scene(func):
-    """Quality validation decorator"""
-    @wraps(func)
-    def wrapper(self, *args, **kwargs):
-        result = func(self, *args, **kwargs)
-        print("✅ Quality check: Scene validated")
-        return result
-    return wrapper
-
-def run_quality_check(scene):
-    """Run quality check on scene"""
-    if hasattr(scene, 'mobjects'):
-        print(f"✅ Quality check: Validated {len(scene.mobjects)} objects")
-    return True
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "manim",
+                quality_flag,
+                str(scene_file),
+                scene_name,
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=temp_dir,
+            env=env,
+            timeout=RENDER_TIMEOUT,
+        )
+
+        # Find the output video
+        media_dir = temp_dir / "media" / "videos" / scene_name
+        for video_file in media_dir.rglob("*.mp4"):
+            return video_file
 
-class AnimationPresets:
-    """Animation timing and styling presets"""
-    FAST = 0.5
-    NORMAL = 1.0
-    SLOW = 1.5
-    TITLE_SIZE = 28
-    SUBTITLE_SIZE = 22
-    BODY_SIZE = 14
+        return None
 
-'''
-            return imports + "\n" + manim_code
-        return manim_code
+    def _add_imports_to_manim_code(self, manim_code: str) -> str:
+        """Add the manim and ansci.runtime imports to manim code if not present"""
+        if RUNTIME_MODULE in manim_code:
+            return manim_code
+        return SCENE_HEADER + "\n" + manim_code
 
 
 # # Convenience functions for easy use with quality assurance
@@ -467,6 +486,10 @@ def render_audiovisual_animation_embedded(
     quality: str = "high",
     enable_validation: bool = True,
     splits: Optional[int] = None,
+    max_workers: int = 1,
+    warm_workers: bool = False,
+    render_cache: Optional[RenderCache] = None,
+    tts_cache: Optional[AudioCache] = None,
 ) -> List[str]:
     """
     Render audiovisual animation using embedded audio approach
@@ -478,6 +501,11 @@ def render_audiovisual_animation_embedded(
         quality: Rendering quality
         enable_validation: Whether to validate before rendering
         splits: Number of video splits to create (None = single combined video)
+        max_workers: Number of scenes to render concurrently (1 = sequential)
+        warm_workers: Render on long-lived workers that import manim once
+            instead of starting a fresh interpreter per scene
+        render_cache: Optional cache of rendered scene videos; hits skip manim
+        tts_cache: Optional cache of processed narrations; hits skip LMNT
 
     Returns:
         List of paths to audiovisual video files
@@ -489,122 +517,130 @@ def render_audiovisual_animation_embedded(
 
     print("🎬🎙️  Starting embedded audiovisual animation rendering...")
 
-    # Handle splits logic
-    if splits is not None:
-        if splits <= 0:
-            print("❌ Error: splits must be a positive number")
-            return []
-        
-        total_scenes = len(animation.blocks)
-        
-        if splits == 1:
-            # Create one video per scene
-            print(f"🎞️  Creating {total_scenes} separate videos (one per scene)")
-            video_paths = []
-            
-            for i, scene_block in enumerate(animation.blocks):
-                print(f"🎬 Rendering Scene {i+1}/{total_scenes} as separate video...")
-                
-                # Create single-scene animation
-                single_scene_animation = AnsciAnimation(blocks=[scene_block])
-                
-                # Create audiovisual version
-                audiovisual_animation = create_audiovisual_animation_with_embedded_audio(
-                    single_scene_animation, output_dir
-                )
-                
-                # Render the single scene
-                renderer = AnimationRenderer(output_dir)
-                scene_videos = renderer.render_animation(audiovisual_animation, quality)
-                
-                if scene_videos:
-                    # Rename to indicate scene number
-                    for video_path in scene_videos:
-                        old_path = Path(video_path)
-                        new_path = old_path.parent / f"scene_{i+1:02d}_{old_path.name}"
-                        old_path.rename(new_path)
-                        video_paths.append(str(new_path))
-                        print(f"✅ Scene {i+1}: {new_path.name}")
-            
-            return video_paths
-            
-        elif splits > 1:
-            # Create multiple video files by grouping scenes
-            scenes_per_split = max(1, total_scenes // splits)
-            remainder = total_scenes % splits
-            
-            print(f"🎞️  Creating {splits} video splits from {total_scenes} scenes")
-            print(f"📊 ~{scenes_per_split} scenes per split")
-            
-            video_paths = []
-            scene_idx = 0
-            
-            for split_num in range(splits):
-                # Calculate scenes for this split
-                current_split_size = scenes_per_split
-                if split_num < remainder:
-                    current_split_size += 1
-                
-                if scene_idx >= total_scenes:
-                    break
-                
-                end_idx = min(scene_idx + current_split_size, total_scenes)
-                split_scenes = animation.blocks[scene_idx:end_idx]
-                
-                print(f"🎬 Rendering split {split_num + 1}/{splits} (scenes {scene_idx + 1}-{end_idx})...")
-                
-                # Create animation for this split
-                split_animation = AnsciAnimation(blocks=split_scenes)
-                
-                # Create audiovisual version
-                audiovisual_animation = create_audiovisual_animation_with_embedded_audio(
-                    split_animation, output_dir
-                )
-                
-                # Render the split
-                renderer = AnimationRenderer(output_dir)
-                split_videos = renderer.render_animation(audiovisual_animation, quality)
-                
-                if split_videos:
-                    # Combine scenes in this split if multiple videos
-                    if len(split_videos) > 1:
-                        combined_path = Path(output_dir) / f"animation_part_{split_num + 1:02d}.mp4"
-                        success = _combine_videos(split_videos, str(combined_path))
-                        if success:
-                            video_paths.append(str(combined_path))
-                            print(f"✅ Split {split_num + 1}: {combined_path.name}")
-                            # Clean up individual scene videos
-                            for video in split_videos:
-                                try:
-                                    Path(video).unlink()
-                                except:
-                                    pass
-                        else:
-                            # If combination fails, keep individual videos
-                            video_paths.extend(split_videos)
-                    else:
-                        # Single video, rename appropriately
-                        old_path = Path(split_videos[0])
-                        new_path = old_path.parent / f"animation_part_{split_num + 1:02d}.mp4"
-                        old_path.rename(new_path)
-                        video_paths.append(str(new_path))
-                        print(f"✅ Split {split_num + 1}: {new_path.name}")
-                
-                scene_idx = end_idx
-            
-            return video_paths
-    
-    # Default behavior: single combined video
-    print("🎞️  Creating single combined video from all scenes")
+    if splits is not None and splits <= 0:
+        print("❌ Error: splits must be a positive number")
+        return []
 
-    # Create animation with embedded audio
+    total_scenes = len(animation.blocks)
+
+    # Narrate the whole animation once so every scene keeps a unique name
+    # (Scene1..SceneN) and its own narration file, whichever way it is split
     audiovisual_animation = create_audiovisual_animation_with_embedded_audio(
-        animation, output_dir
+        animation, output_dir, tts_cache=tts_cache
     )
 
-    # Render the audiovisual animation normally
-    renderer = AnimationRenderer(output_dir)
-    video_paths = renderer.render_animation(audiovisual_animation, quality)
+    # Render every scene in one pass - scenes are independent, so this is where
+    # concurrent rendering pays off. Results stay aligned with scene order.
+    if warm_workers:
+        with ManimWorkerPool(
+            size=min(max_workers, max(1, total_scenes)), job_timeout=RENDER_TIMEOUT
+        ) as pool:
+            renderer = AnimationRenderer(
+                output_dir,
+                max_workers=max_workers,
+                worker_pool=pool,
+                render_cache=render_cache,
+            )
+            scene_videos = renderer.render_scenes(audiovisual_animation, quality)
+    else:
+        renderer = AnimationRenderer(
+            output_dir, max_workers=max_workers, render_cache=render_cache
+        )
+        scene_videos = renderer.render_scenes(audiovisual_animation, quality)
+
+    if render_cache is not None:
+        stats = render_cache.stats
+        print(
+            f"💾 Render cache: {stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions"
+        )
+
+    # Handle splits logic
+    if splits == 1:
+        # Create one video per scene
+        print(f"🎞️  Creating {total_scenes} separate videos (one per scene)")
+        video_paths = []
+
+        for i, video_path in enumerate(scene_videos):
+            if not video_path:
+                continue
+
+            # Rename to indicate scene number
+            old_path = Path(video_path)
+            new_path = old_path.parent / f"scene_{i+1:02d}_{old_path.name}"
+            old_path.rename(new_path)
+            video_paths.append(str(new_path))
+            print(f"✅ Scene {i+1}: {new_path.name}")
+
+        return video_paths
+
+    elif splits is not None and splits > 1:
+        # Create multiple video files by grouping scenes
+        scenes_per_split = max(1, total_scenes // splits)
+        remainder = total_scenes % splits
+
+        print(f"🎞️  Creating {splits} video splits from {total_scenes} scenes")
+        print(f"📊 ~{scenes_per_split} scenes per split")
+
+        video_paths = []
+        scene_idx = 0
+
+        for split_num in range(splits):
+            # Calculate scenes for this split
+            current_split_size = scenes_per_split
+            if split_num < remainder:
+                current_split_size += 1
+
+            if scene_idx >= total_scenes:
+                break
+
+            end_idx = min(scene_idx + current_split_size, total_scenes)
+            split_videos = [
+                video_path
+                for video_path in scene_videos[scene_idx:end_idx]
+                if video_path
+            ]
+
+            print(
+                f"🎬 Assembling split {split_num + 1}/{splits} (scenes {scene_idx + 1}-{end_idx})..."
+            )
+
+            if split_videos:
+                # Combine scenes in this split if multiple videos
+                if len(split_videos) > 1:
+                    combined_path = (
+                        Path(output_dir) / f"animation_part_{split_num + 1:02d}.mp4"
+                    )
+                    success = _combine_videos(split_videos, str(combined_path))
+                    if success:
+                        video_paths.append(str(combined_path))
+                        print(f"✅ Split {split_num + 1}: {combined_path.name}")
+                        # Clean up individual scene videos
+                        for video in split_videos:
+                            try:
+                                Path(video).unlink()
+                            except:
+                                pass
+                    else:
+                        # If combination fails, keep individual videos
+                        video_paths.extend(split_videos)
+                else:
+                    # Single video, rename appropriately
+                    old_path = Path(split_videos[0])
+                    new_path = (
+                        old_path.parent / f"animation_part_{split_num + 1:02d}.mp4"
+                    )
+                    old_path.rename(new_path)
+                    video_paths.append(str(new_path))
+                    print(f"✅ Split {split_num + 1}: {new_path.name}")
+
+            scene_idx = end_idx
+
+        return video_paths
+
+    # Default behavior: single combined video
+    print("🎞️  Creating single combined video from all scenes")
+    video_paths = [video_path for video_path in scene_videos if video_path]
 
     # Combine all videos into single file if multiple scenes
     if len(video_paths) > 1:
@@ -630,15 +666,7 @@ def render_audiovisual_animation_embedded(
             old_path.rename(new_path)
             return [str(new_path)]
 
-    if video_paths:
-        print(
-            f"✅ Embedded audiovisual rendering complete: {len(video_paths)} videos with synchronized audio"
-        )
-        for i, path in enumerate(video_paths):
-            print(f"   📹🎙️  Scene {i+1}: {Path(path).name}")
-    else:
-        print("❌ No audiovisual videos were rendered")
-
+    print("❌ No audiovisual videos were rendered")
     return video_paths
 
 
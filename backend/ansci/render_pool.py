@@ -0,0 +1,265 @@
+"""
+Warm Render Worker Pool
+Long-lived worker processes that import Manim once and render many scenes
+Avoids paying interpreter startup and `from manim import *` for every scene
+"""
+
+import os
+import sys
+import queue
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import Optional
+
+# Recycle a worker after this many renders or once its RSS exceeds this ceiling
+DEFAULT_MAX_JOBS_PER_WORKER = 25
+DEFAULT_MAX_MEMORY_MB = 2048
+
+# Manim quality names matching the -qh / -ql CLI flags used by AnimationRenderer
+_QUALITY_NAMES = {"high": "high_quality", "low": "low_quality"}
+
+# Directory containing the ansci package, so scene files outside it can import
+# ansci.runtime
+RUNTIME_PATH = str(Path(__file__).resolve().parent.parent)
+
+
+def _current_rss_mb() -> float:
+    """Resident memory of the current process in MB (best effort)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in KB elsewhere
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except Exception:
+        return 0.0
+
+
+def _render_in_worker(
+    scene_file: str, scene_name: str, quality: str, media_dir: str, job_id: int
+) -> str:
+    """Render one scene inside a warm worker and return the movie file path"""
+    import importlib.util
+    from manim import tempconfig
+
+    # Relative paths in generated code resolve against the scene's own directory
+    os.chdir(Path(scene_file).parent)
+
+    module_name = f"_ansci_scene_{scene_name}_{os.getpid()}_{job_id}"
+    spec = importlib.util.spec_from_file_location(module_name, scene_file)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot load scene module from {scene_file}")
+
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+        scene_class = getattr(module, scene_name, None)
+        if scene_class is None:
+            raise AttributeError(f"Scene class '{scene_name}' not found")
+
+        # Scoped config: nothing a scene sets leaks into the next job
+        with tempconfig(
+            {
+                "quality": _QUALITY_NAMES.get(quality, "high_quality"),
+                "media_dir": media_dir,
+                "progress_bar": "none",
+                "verbosity": "WARNING",
+            }
+        ):
+            scene = scene_class()
+            scene.render()
+            return str(scene.renderer.file_writer.movie_file_path)
+    finally:
+        sys.modules.pop(module_name, None)
+
+
+def _worker_main(conn, max_jobs: int, max_memory_mb: float) -> None:
+    """Worker loop: import Manim once, then render jobs until told to stop"""
+    import manim  # noqa: F401 - warm the import once for all jobs
+
+    if RUNTIME_PATH not in sys.path:
+        sys.path.insert(0, RUNTIME_PATH)
+
+    jobs_done = 0
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        if job is None:
+            break
+
+        scene_file, scene_name, quality, media_dir = job
+        try:
+            movie_path = _render_in_worker(
+                scene_file, scene_name, quality, media_dir, jobs_done
+            )
+            reply = {"ok": True, "path": movie_path}
+        except BaseException as e:
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+        jobs_done += 1
+        reply["recycle"] = (
+            jobs_done >= max_jobs or _current_rss_mb() > max_memory_mb
+        )
+
+        try:
+            conn.send(reply)
+        except (EOFError, OSError):
+            break
+
+        if reply["recycle"]:
+            break
+
+    conn.close()
+
+
+class _Worker:
+    """Handle on a single warm worker process"""
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+    def stop(self, timeout: float = 5.0) -> None:
+        try:
+            self.conn.send(None)
+        except (EOFError, OSError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.conn.close()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(5.0)
+        self.conn.close()
+
+
+class ManimWorkerPool:
+    """
+    Pool of long-lived Manim render workers
+
+    Each worker imports Manim once and then renders scene files sent over a
+    pipe under a scoped tempconfig. Workers are recycled after a fixed number
+    of jobs or when their memory grows past a ceiling. The pool is thread-safe:
+    concurrent render() calls each borrow one idle worker.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        max_jobs_per_worker: int = DEFAULT_MAX_JOBS_PER_WORKER,
+        max_memory_mb: float = DEFAULT_MAX_MEMORY_MB,
+        job_timeout: float | None = None,
+    ):
+        self.size = max(1, size)
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self.max_memory_mb = max_memory_mb
+        self.job_timeout = job_timeout
+
+        # Spawn (not fork) so workers never inherit the parent's threads or locks
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self.stats = {"jobs": 0, "failures": 0, "recycled": 0, "crashed": 0}
+
+        for _ in range(self.size):
+            self._idle.put(self._spawn_worker())
+
+        print(f"🔥 Started {self.size} warm Manim render worker(s)")
+
+    def __enter__(self) -> "ManimWorkerPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def render(
+        self, scene_file: Path, scene_name: str, quality: str, media_dir: Path
+    ) -> Optional[str]:
+        """
+        Render a scene file on a warm worker
+
+        Args:
+            scene_file: Path to the Python file containing the scene
+            scene_name: Name of the Scene class to render
+            quality: Rendering quality ("high" or "low")
+            media_dir: Media directory for this scene (keeps outputs isolated)
+
+        Returns:
+            Path to the rendered movie file, or None if rendering failed
+        """
+        if self._closed:
+            raise RuntimeError("ManimWorkerPool is closed")
+
+        worker = self._idle.get()
+        try:
+            worker.conn.send((str(scene_file), scene_name, quality, str(media_dir)))
+            if self.job_timeout is not None and not worker.conn.poll(
+                self.job_timeout
+            ):
+                raise TimeoutError(f"no result after {self.job_timeout:.0f}s")
+            reply = worker.conn.recv()
+        except (EOFError, OSError, TimeoutError) as e:
+            print(f"❌ Render worker failed on {scene_name}: {e}")
+            worker.kill()
+            self._count("crashed")
+            self._idle.put(self._spawn_worker())
+            return None
+
+        self._count("jobs")
+        if reply.get("recycle"):
+            worker.stop()
+            self._count("recycled")
+            worker = self._spawn_worker()
+        self._idle.put(worker)
+
+        if not reply.get("ok"):
+            self._count("failures")
+            print(f"Error rendering {scene_name}: {reply.get('error')}")
+            return None
+
+        return reply.get("path")
+
+    def close(self) -> None:
+        """Stop all workers"""
+        if self._closed:
+            return
+        self._closed = True
+
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+    def _spawn_worker(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.max_jobs_per_worker, self.max_memory_mb),
+            name="ansci-manim-worker",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
@@ -0,0 +1,665 @@
+"""
+Resilience Module
+Rate limiting, retries and circuit breaking shared by every Anthropic and LMNT
+call
+Each endpoint (an Anthropic model, or LMNT) gets token buckets sized to its
+per-minute quotas, so concurrent scenes queue just under the ceiling instead of
+bursting into 429s. Retryable failures back off with jitter (or for as long as
+retry-after asks) and trip a circuit breaker that holds callers back while the
+endpoint recovers.
+With a governor (governor.py) the buckets live in a ledger shared by every
+process on the host instead of in this process.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .governor import Governor
+
+# Per-minute quotas of each Anthropic model (0 disables a limit). Off unless
+# set to the account's limits with ANSCI_ANTHROPIC_RPM / _ITPM / _OTPM (tier 1
+# is 50 / 30000 / 8000). Anthropic replenishes them continuously, so the
+# buckets below do the same
+DEFAULT_ANTHROPIC_RPM = 0
+DEFAULT_ANTHROPIC_ITPM = 0
+DEFAULT_ANTHROPIC_OTPM = 0
+
+# Requests per minute to LMNT (off unless set with ANSCI_LMNT_RPM)
+DEFAULT_LMNT_RPM = 0
+
+# Retries after the first attempt, and the jittered backoff bounds (seconds)
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Consecutive retryable failures that open a circuit, how long it stays open
+# before one probe request is let through, and how long a caller waits for an
+# open circuit before giving up (seconds)
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+CIRCUIT_MAX_WAIT = 120.0
+
+# A stream that delivers nothing for this long is aborted and retried
+# (override with ANSCI_STREAM_STALL_TIMEOUT, 0 disables)
+STREAM_STALL_TIMEOUT = float(os.environ.get("ANSCI_STREAM_STALL_TIMEOUT", 120))
+
+# Status codes worth retrying (plus every 5xx)
+RETRYABLE_STATUS = (408, 409, 429)
+
+# Error types the Anthropic API reports inside an otherwise successful stream
+RETRYABLE_ERROR_TYPES = ("overloaded_error", "rate_limit_error", "api_error")
+
+
+class CircuitOpenError(Exception):
+    """Raised when an endpoint's circuit stays open longer than callers wait"""
+
+
+class StreamStalledError(Exception):
+    """Raised when a stream delivers nothing for STREAM_STALL_TIMEOUT seconds"""
+
+
+class TokenBucket:
+    """
+    Continuously refilled budget of requests or tokens per minute
+
+    reserve() debits immediately and returns how long the caller must wait for
+    the balance to recover, so concurrent callers are spaced out in arrival
+    order. settle() corrects an estimate once the real cost is known.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Debit amount and return the seconds to wait before using it"""
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    def try_reserve(self, amount: float) -> bool:
+        """Debit amount only if it can be used at once (a full bucket will do)"""
+        with self._lock:
+            self._refill()
+            if self.tokens < min(amount, self.capacity):
+                return False
+            self.tokens -= amount
+            return True
+
+    def settle(self, amount: float) -> None:
+        """Debit (or, if negative, credit back) a correction to a reservation"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back for at least seconds (e.g. on retry-after)"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+
+class CircuitBreaker:
+    """
+    Closed until failure_threshold consecutive failures, then open for
+    reset_timeout seconds, then half-open: a single probe call decides whether
+    it closes again or reopens
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def wait_time(self) -> float:
+        """0 if a call may go ahead now, else seconds until it might"""
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            now = time.monotonic()
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_timeout - now
+                if remaining > 0:
+                    return remaining
+                self.state = "half-open"
+                self._probing = False
+            if self._probing:
+                return min(1.0, self.reset_timeout)
+            self._probing = True
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                print(f"🔌 {self.name}: circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """End a probe that said nothing about the endpoint (next call probes)"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or (
+                self.state == "closed" and self.failures >= self.failure_threshold
+            ):
+                print(
+                    f"🔌 {self.name}: circuit open for {self.reset_timeout:.0f}s "
+                    f"after {self.failures} failures"
+                )
+                self.state = "open"
+                self.opened += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class Endpoint:
+    """Rate limits, circuit breaker and retry counters of one API endpoint"""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        input_tokens_per_minute: float = 0,
+        output_tokens_per_minute: float = 0,
+    ):
+        self.name = name
+        self.limits = {
+            "requests": requests_per_minute,
+            "input_tokens": input_tokens_per_minute,
+            "output_tokens": output_tokens_per_minute,
+        }
+        self.requests = _bucket(requests_per_minute)
+        self.input_tokens = _bucket(input_tokens_per_minute)
+        self.output_tokens = _bucket(output_tokens_per_minute)
+        self.breaker = CircuitBreaker(name)
+        self.stats = {"calls": 0, "retries": 0, "throttled_seconds": 0.0}
+        # Server-requested pause (retry-after), held whether or not limits are set
+        self._paused_until = 0.0
+        self._pause_lock = threading.Lock()
+
+    def reserve(self, input_tokens: int = 0) -> float:
+        """
+        Reserve a request and its estimated input tokens
+
+        Output tokens are only debited once known (settle), so a call waits
+        while earlier calls' output has the bucket overdrawn.
+
+        Returns:
+            Seconds to wait before sending
+        """
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.reserve(1))
+        if self.input_tokens is not None:
+            delays.append(self.input_tokens.reserve(input_tokens))
+        if self.output_tokens is not None:
+            delays.append(self.output_tokens.reserve(0))
+        return max(delays)
+
+    def try_reserve(self, input_tokens: int = 0) -> bool:
+        """Reserve like reserve(), but only if no wait is needed (else nothing)"""
+        reserved = []
+        for bucket, amount in (
+            (self.requests, 1),
+            (self.input_tokens, input_tokens),
+            (self.output_tokens, 0),
+        ):
+            if bucket is None:
+                continue
+            if not bucket.try_reserve(amount):
+                for earlier, earlier_amount in reserved:
+                    earlier.settle(-earlier_amount)
+                return False
+            reserved.append((bucket, amount))
+        return True
+
+    def settle(
+        self, estimated_input_tokens: int, input_tokens: int, output_tokens: int
+    ) -> None:
+        """Replace the input estimate with real usage and debit the output"""
+        governor = active_governor()
+        if governor is not None:
+            governor.settle(
+                self.name,
+                {
+                    "input_tokens": input_tokens - estimated_input_tokens,
+                    "output_tokens": output_tokens,
+                },
+                self.limits,
+            )
+            return
+        if self.input_tokens is not None:
+            self.input_tokens.settle(input_tokens - estimated_input_tokens)
+        if self.output_tokens is not None:
+            self.output_tokens.settle(output_tokens)
+
+    def paused_for(self) -> float:
+        """Seconds left of a pause requested by the server (0 if none)"""
+        with self._pause_lock:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller of this endpoint for seconds"""
+        with self._pause_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        governor = active_governor()
+        if governor is not None:
+            # Overdraw the shared request bucket by seconds' worth of requests
+            governor.settle(
+                self.name,
+                {"requests": seconds * self.limits["requests"] / 60.0},
+                self.limits,
+            )
+            return
+        if self.requests is not None:
+            self.requests.pause(seconds)
+
+
+# Endpoints by name, created on first use
+_endpoints: Dict[str, Endpoint] = {}
+_endpoints_lock = threading.Lock()
+
+# Cross-process governor, if enabled (use_governor() or ANSCI_GOVERNOR)
+_governor: Optional[Governor] = None
+_governor_configured = False
+
+
+def use_governor(governor: Optional[Governor]) -> None:
+    """Admit every call through a cross-process governor (None turns it off)"""
+    global _governor, _governor_configured
+    with _endpoints_lock:
+        _governor = governor
+        _governor_configured = True
+
+
+def active_governor() -> Optional[Governor]:
+    """
+    The governor in use, if any
+
+    Unless use_governor() was called, ANSCI_GOVERNOR enables one: "1" for the
+    ledger in the cache directory, or the path of a ledger file.
+    """
+    global _governor, _governor_configured
+    with _endpoints_lock:
+        if not _governor_configured:
+            _governor_configured = True
+            setting = os.environ.get("ANSCI_GOVERNOR", "")
+            if setting and setting != "0":
+                _governor = Governor(None if setting == "1" else setting)
+        return _governor
+
+
+def anthropic_endpoint(model: Optional[str]) -> Endpoint:
+    """
+    Endpoint for one Anthropic model (rate limits apply per model)
+
+    Limits come from ANSCI_ANTHROPIC_RPM, ANSCI_ANTHROPIC_ITPM and
+    ANSCI_ANTHROPIC_OTPM (unset limits are not enforced).
+    """
+    return _endpoint(
+        f"anthropic:{model or 'default'}",
+        lambda name: Endpoint(
+            name,
+            _env_limit("ANSCI_ANTHROPIC_RPM", DEFAULT_ANTHROPIC_RPM),
+            _env_limit("ANSCI_ANTHROPIC_ITPM", DEFAULT_ANTHROPIC_ITPM),
+            _env_limit("ANSCI_ANTHROPIC_OTPM", DEFAULT_ANTHROPIC_OTPM),
+        ),
+    )
+
+
+def lmnt_endpoint() -> Endpoint:
+    """Endpoint for LMNT speech synthesis (limit from ANSCI_LMNT_RPM)"""
+    return _endpoint(
+        "lmnt",
+        lambda name: Endpoint(name, _env_limit("ANSCI_LMNT_RPM", DEFAULT_LMNT_RPM)),
+    )
+
+
+def endpoint_stats() -> Dict[str, Dict[str, Any]]:
+    """Retry, throttling and circuit counters of every endpoint used so far"""
+    with _endpoints_lock:
+        endpoints = list(_endpoints.values())
+    return {
+        endpoint.name: {**endpoint.stats, "circuit_opened": endpoint.breaker.opened}
+        for endpoint in endpoints
+    }
+
+
+def call(
+    endpoint: Endpoint,
+    fn: Callable[[], Any],
+    label: str = "",
+    estimated_input_tokens: int = 0,
+    usage: Optional[Callable[[Any], Tuple[int, int]]] = None,
+    can_retry: Optional[Callable[[], bool]] = None,
+) -> Any:
+    """
+    Call fn under the endpoint's rate limits, retries and circuit breaker
+
+    Args:
+        endpoint: Endpoint the call goes to
+        fn: The request; raises on failure
+        label: Name of the call in log lines
+        estimated_input_tokens: Input tokens reserved before sending
+        usage: Maps fn's result to (billed input tokens, output tokens)
+        can_retry: Checked before each retry; False re-raises the failure
+            (e.g. once partial output has been handed to a consumer)
+
+    Returns:
+        fn's result
+
+    Raises:
+        CircuitOpenError: The endpoint's circuit stayed open too long
+        Exception: fn's last error if it is not retryable or retries ran out
+    """
+    label = label or endpoint.name
+    for attempt in range(MAX_RETRIES + 1):
+        time.sleep(_admit(endpoint, label, estimated_input_tokens))
+        try:
+            result = fn()
+        except Exception as e:
+            delay = _failed(endpoint, label, estimated_input_tokens, attempt, e)
+            if delay is None or (can_retry is not None and not can_retry()):
+                raise
+            time.sleep(delay)
+            continue
+        _succeeded(endpoint, estimated_input_tokens, usage, result)
+        return result
+
+
+async def call_async(
+    endpoint: Endpoint,
+    fn: Callable[[], Awaitable[Any]],
+    label: str = "",
+    estimated_input_tokens: int = 0,
+    usage: Optional[Callable[[Any], Tuple[int, int]]] = None,
+) -> Any:
+    """Async version of call() for coroutine requests (see call for Args)"""
+    label = label or endpoint.name
+    for attempt in range(MAX_RETRIES + 1):
+        await asyncio.sleep(
+            await asyncio.to_thread(_admit, endpoint, label, estimated_input_tokens)
+        )
+        try:
+            result = await fn()
+        except Exception as e:
+            delay = _failed(endpoint, label, estimated_input_tokens, attempt, e)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        _succeeded(endpoint, estimated_input_tokens, usage, result)
+        return result
+
+
+def try_admit(endpoint: Endpoint, estimated_input_tokens: int = 0) -> bool:
+    """
+    Admit an optional call (e.g. a hedge) only if it can go out right away
+
+    Args:
+        endpoint: Endpoint the call goes to
+        estimated_input_tokens: Input tokens reserved if admitted (settle them
+            with endpoint.settle once the call is over)
+
+    Returns:
+        True if the call was admitted under the rate limits, False if the
+        circuit is not closed or the limits (or the governor) have no room now
+    """
+    if endpoint.breaker.state != "closed" or endpoint.paused_for() > 0:
+        return False
+    governor = active_governor()
+    if governor is not None:
+        admitted = governor.try_acquire(
+            endpoint.name,
+            {"requests": 1, "input_tokens": estimated_input_tokens},
+            endpoint.limits,
+        )
+    else:
+        admitted = endpoint.try_reserve(estimated_input_tokens)
+    if admitted:
+        with _endpoints_lock:
+            endpoint.stats["calls"] += 1
+    return admitted
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for rate limits, overloads, server errors, timeouts and stalls"""
+    if isinstance(
+        error,
+        (StreamStalledError, ConnectionError, TimeoutError, asyncio.TimeoutError),
+    ):
+        return True
+    # Only look at SDKs that are already loaded - an error can't come from
+    # one that isn't, and importing one here would cost a second
+    anthropic = sys.modules.get("anthropic")
+    if anthropic is not None and isinstance(error, anthropic.APIConnectionError):
+        return True
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+
+    body = getattr(error, "body", None)
+    if isinstance(body, dict):
+        error_type = (body.get("error") or {}).get("type")
+        if error_type in RETRYABLE_ERROR_TYPES:
+            return True
+
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    return isinstance(status, int) and (status in RETRYABLE_STATUS or status >= 500)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait (retry-after headers), if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backoff_delay(attempt: int, server_delay: Optional[float] = None) -> float:
+    """
+    Seconds to wait before retry number attempt + 1
+
+    Full jitter over an exponentially growing window, so callers that failed
+    together do not retry together. A server-requested delay is honoured,
+    with up to BACKOFF_BASE of jitter on top.
+    """
+    if server_delay is not None:
+        return server_delay + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+class StallWatchdog:
+    """
+    Calls on_stall from a background thread if feed() is not called for
+    timeout seconds (use as a context manager around a stream)
+    """
+
+    def __init__(self, on_stall: Callable[[], None], timeout: Optional[float] = None):
+        self.timeout = STREAM_STALL_TIMEOUT if timeout is None else timeout
+        self.stalled = False
+        self._on_stall = on_stall
+        self._last_feed = time.monotonic()
+        self._stop = threading.Event()
+
+    def __enter__(self) -> "StallWatchdog":
+        if self.timeout > 0:
+            threading.Thread(
+                target=self._watch, name="ansci-watchdog", daemon=True
+            ).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+
+    def feed(self) -> None:
+        """Record progress"""
+        self._last_feed = time.monotonic()
+
+    def _watch(self) -> None:
+        while True:
+            remaining = self._last_feed + self.timeout - time.monotonic()
+            if remaining <= 0:
+                self.stalled = True
+                try:
+                    self._on_stall()
+                except Exception:
+                    pass
+                return
+            if self._stop.wait(remaining):
+                return
+
+
+def _admit(endpoint: Endpoint, label: str, estimated_input_tokens: int) -> float:
+    # Wait out an open circuit here, then return the rate limit (or pause) delay
+    deadline = time.monotonic() + CIRCUIT_MAX_WAIT
+    while True:
+        wait = endpoint.breaker.wait_time()
+        if wait <= 0:
+            break
+        if time.monotonic() + wait > deadline:
+            raise CircuitOpenError(f"{endpoint.name} circuit is open")
+        time.sleep(wait)
+
+    governor = active_governor()
+    if governor is not None:
+        # The shared ledger waits and debits, so the local buckets stay unused
+        waited = governor.acquire(
+            endpoint.name,
+            {"requests": 1, "input_tokens": estimated_input_tokens},
+            endpoint.limits,
+        )
+        delay = 0.0
+        if waited >= 1:
+            print(f"🚦 {label}: waited {waited:.1f}s for {endpoint.name} capacity")
+    else:
+        waited = 0.0
+        delay = endpoint.reserve(estimated_input_tokens)
+        if delay >= 1:
+            print(f"🚦 {label}: waiting {delay:.1f}s for {endpoint.name} rate limits")
+
+    paused = endpoint.paused_for()
+    if paused > delay:
+        delay = paused
+        if paused >= 1:
+            print(f"🚦 {label}: {endpoint.name} asked for a {paused:.1f}s pause")
+
+    with _endpoints_lock:
+        endpoint.stats["calls"] += 1
+        endpoint.stats["throttled_seconds"] += delay + waited
+    return delay
+
+
+def _failed(
+    endpoint: Endpoint,
+    label: str,
+    estimated_input_tokens: int,
+    attempt: int,
+    error: Exception,
+) -> Optional[float]:
+    # Returns the backoff before the next attempt, or None to give up
+    endpoint.settle(estimated_input_tokens, 0, 0)
+    if not is_retryable(error):
+        if _is_client_error_response(error):
+            # The endpoint answered, so it is healthy (this also ends a probe)
+            endpoint.breaker.record_success()
+        else:
+            # Raised on our side (e.g. a bug in a stream callback): the
+            # endpoint's health is unknown, so the probe is simply released
+            endpoint.breaker.release_probe()
+        return None
+
+    endpoint.breaker.record_failure()
+    server_delay = retry_after(error)
+    if server_delay is not None:
+        # Everyone sharing the quota waits, not just this caller
+        endpoint.pause(server_delay)
+    if attempt >= MAX_RETRIES:
+        return None
+
+    delay = backoff_delay(attempt, server_delay)
+    with _endpoints_lock:
+        endpoint.stats["retries"] += 1
+    print(
+        f"⏳ {label}: {type(error).__name__} - retry {attempt + 1}/{MAX_RETRIES} "
+        f"in {delay:.1f}s"
+    )
+    return delay
+
+
+def _succeeded(
+    endpoint: Endpoint,
+    estimated_input_tokens: int,
+    usage: Optional[Callable[[Any], Tuple[int, int]]],
+    result: Any,
+) -> None:
+    endpoint.breaker.record_success()
+    if usage is not None:
+        input_tokens, output_tokens = usage(result)
+        endpoint.settle(estimated_input_tokens, input_tokens, output_tokens)
+
+
+def _is_client_error_response(error: BaseException) -> bool:
+    # A 4xx answer from the Anthropic API (the SDK is loaded if it raised one)
+    anthropic = sys.modules.get("anthropic")
+    return (
+        anthropic is not None
+        and isinstance(error, anthropic.APIStatusError)
+        and 400 <= error.status_code < 500
+    )
+
+
+def _endpoint(name: str, create: Callable[[str], Endpoint]) -> Endpoint:
+    with _endpoints_lock:
+        endpoint = _endpoints.get(name)
+        if endpoint is None:
+            endpoint = _endpoints[name] = create(name)
+        return endpoint
+
+
+def _bucket(per_minute: float) -> Optional[TokenBucket]:
+    return TokenBucket(per_minute) if per_minute > 0 else None
+
+
+def _env_limit(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
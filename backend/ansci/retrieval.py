@@ -0,0 +1,182 @@
+"""
+Retrieval Module
+Local BM25 index over a paper's passages (no network calls)
+Grounds each scene prompt in the few passages its outline block is about,
+instead of sending the full paper with every scene call
+"""
+
+from __future__ import annotations
+
+import re
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from .cache import DiskCache
+from .ingest import paper_from_history
+from .models import PaperText
+
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+
+# Passages retrieved per outline block
+DEFAULT_TOP_K = 4
+
+# Passage size in words, and words shared between consecutive passages
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 30
+
+# Standard BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Frequent words that carry no topical signal
+_STOPWORDS = frozenset(
+    """a an and are as at be by can for from has have in into is it its of on or
+    that the their this to was we were which with our these those than then
+    such also each not but all any between both more most other over only""".split()
+)
+
+
+@dataclass
+class Passage:
+    """A window of paper text with the section it came from"""
+
+    heading: str
+    pages: List[int]
+    text: str
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [
+        token
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in _STOPWORDS
+    ]
+
+
+class PaperIndex:
+    """
+    BM25 index over overlapping passages of a paper
+
+    Build it once per paper with from_paper() or build_paper_index(), then call
+    search() for each outline block.
+    """
+
+    def __init__(self, passages: List[Passage]):
+        self.passages = passages
+        self._term_counts = [Counter(tokenize(p.text)) for p in passages]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = (
+            sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        )
+
+        document_frequency: Counter = Counter()
+        for counts in self._term_counts:
+            document_frequency.update(counts.keys())
+        total = len(passages)
+        self._idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    @classmethod
+    def from_paper(
+        cls,
+        paper: PaperText,
+        passage_words: int = PASSAGE_WORDS,
+        overlap: int = PASSAGE_OVERLAP,
+    ) -> "PaperIndex":
+        """Index a paper split into overlapping passages within each section"""
+        step = max(1, passage_words - overlap)
+        passages = []
+        for section in paper.sections:
+            words = section.text.split()
+            for start in range(0, max(1, len(words) - overlap), step):
+                text = " ".join(words[start : start + passage_words])
+                if text:
+                    passages.append(Passage(section.heading, section.pages, text))
+        return cls(passages)
+
+    def search(
+        self, query: str, k: int = DEFAULT_TOP_K
+    ) -> List[Tuple[Passage, float]]:
+        """Top-k passages for a query, best first (passages scoring 0 are dropped)"""
+        query_terms = set(tokenize(query))
+        if not query_terms or not self.passages:
+            return []
+
+        scores = []
+        for index, counts in enumerate(self._term_counts):
+            length_norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * self._lengths[index] / self._average_length
+            )
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if frequency:
+                    score += (
+                        self._idf[term]
+                        * frequency
+                        * (BM25_K1 + 1)
+                        / (frequency + length_norm)
+                    )
+            if score > 0:
+                scores.append((score, index))
+
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [(self.passages[index], score) for score, index in scores[:k]]
+
+
+def relevant_pages(
+    index: PaperIndex, queries: List[str], k: int = DEFAULT_TOP_K
+) -> List[int]:
+    """Sorted pages holding the top-k passages for any of the queries"""
+    pages = set()
+    for query in queries:
+        for passage, _ in index.search(query, k):
+            pages.update(passage.pages)
+    return sorted(pages)
+
+
+def build_paper_index(
+    history: list[MessageParam], cache: Optional[DiskCache] = None
+) -> Optional[PaperIndex]:
+    """
+    Build the retrieval index for the paper in history
+
+    Args:
+        history: Message history carrying the paper (document or extracted text)
+        cache: Optional ingest cache, so a PDF is only extracted once
+
+    Returns:
+        PaperIndex, or None if the paper text is unavailable (e.g. no pypdf)
+    """
+    try:
+        paper = paper_from_history(history, cache=cache)
+    except Exception as e:
+        print(f"⚠️  Could not extract paper text for retrieval: {e}")
+        return None
+
+    if paper is None:
+        return None
+
+    index = PaperIndex.from_paper(paper)
+    print(f"🔎 Indexed {len(index.passages)} paper passages for retrieval")
+    return index
+
+
+def format_passages(results: List[Tuple[Passage, float]]) -> str:
+    """Retrieved passages as a prompt section (empty string if there are none)"""
+    if not results:
+        return ""
+
+    lines = ["RELEVANT PAPER PASSAGES (ground the scene in these):"]
+    for number, (passage, _) in enumerate(results, start=1):
+        pages = ", ".join(str(page) for page in passage.pages)
+        lines.append(f"[{number}] {passage.heading} (p. {pages}): {passage.text}")
+    return "\n".join(lines)
@@ -0,0 +1,67 @@
+"""
+Model Routing Module
+Assigns each LLM task a model and an output token budget sized to what it writes
+Short text tasks go to a fast model, code to a strong one, and repairs of code
+that failed validation escalate to the strongest
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict
+
+FAST_MODEL = "claude-3-5-haiku-20241022"
+STRONG_MODEL = "claude-sonnet-4-20250514"
+ESCALATION_MODEL = "claude-opus-4-20250514"
+
+
+@dataclass(frozen=True)
+class Route:
+    """Model and output token budget for one task"""
+
+    model: str
+    max_tokens: int
+
+
+# Default route per task - override with ANSCI_<TASK>_MODEL and
+# ANSCI_<TASK>_MAX_TOKENS (e.g. ANSCI_TRANSCRIPT_MODEL=claude-sonnet-4-20250514)
+DEFAULT_ROUTES: Dict[str, Route] = {
+    # Structured outline of the whole paper (a few thousand tokens of JSON)
+    "outline": Route(STRONG_MODEL, 16000),
+    # 75-150 word narration
+    "transcript": Route(FAST_MODEL, 1024),
+    # 20-40 word visual description
+    "description": Route(FAST_MODEL, 512),
+    # Complete Manim scene
+    "code": Route(STRONG_MODEL, 8192),
+    # Transcript, description and code in one structured call
+    "scene_block": Route(STRONG_MODEL, 10000),
+    # Regenerating code that failed validation
+    "repair": Route(ESCALATION_MODEL, 8192),
+}
+
+# Tasks that produce a scene (their routes feed the scene cache key)
+SCENE_TASKS = ("transcript", "description", "code", "scene_block", "repair")
+
+
+def route(task: str) -> Route:
+    """
+    Model and token budget for a task, with environment overrides applied
+
+    Args:
+        task: One of DEFAULT_ROUTES
+
+    Returns:
+        Route for the task
+    """
+    default = DEFAULT_ROUTES[task]
+    prefix = f"ANSCI_{task.upper()}"
+    max_tokens = os.environ.get(f"{prefix}_MAX_TOKENS")
+    return Route(
+        model=os.environ.get(f"{prefix}_MODEL", default.model),
+        max_tokens=int(max_tokens) if max_tokens else default.max_tokens,
+    )
+
+
+def scene_routes() -> Dict[str, Route]:
+    """Current routes of the scene generation tasks"""
+    return {task: route(task) for task in SCENE_TASKS}
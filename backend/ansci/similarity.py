@@ -0,0 +1,225 @@
+"""
+Scene Similarity Module
+Persistent TF-IDF index over previously generated, validated scenes
+Outline blocks that restate a stock concept (attention, softmax, gradient
+descent...) can reuse a stored scene instead of calling the LLM, and since the
+reused scene is byte-identical its narration and render cache entries hit too
+"""
+
+import os
+import json
+import math
+import time
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .cache import DiskCache, default_cache_dir, make_key
+from .models import AnsciOutlineBlock, AnsciSceneBlock
+from .retrieval import tokenize
+
+# Cosine similarity above which a stored scene is reused
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+
+# Entries kept in the index - override with ANSCI_SIMILAR_SCENES_MAX
+DEFAULT_MAX_ENTRIES = 2000
+
+# Blocks with fewer distinct terms are too short to match reliably
+MIN_TERMS = 8
+
+
+class SceneIndex:
+    """
+    Index of validated scenes for near-duplicate outline block lookup
+
+    Each entry holds the term counts of an outline block (title and text); the
+    scene itself lives in a DiskCache namespace next to the index file. Entries
+    are evicted least-recently-used beyond max_entries. Scenes added during
+    this run are never matched, so one animation does not repeat a scene.
+    """
+
+    def __init__(
+        self,
+        root: str | Path | None = None,
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+        max_entries: int | None = None,
+    ):
+        if max_entries is None:
+            max_entries = int(
+                os.environ.get("ANSCI_SIMILAR_SCENES_MAX", DEFAULT_MAX_ENTRIES)
+            )
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.scenes = DiskCache("similar", root=root or default_cache_dir())
+        self.index_path = self.scenes.directory / "index.json"
+        self.stats = {"lookups": 0, "reused": 0, "added": 0, "evictions": 0}
+
+        self._lock = threading.Lock()
+        self._added_this_run = set()
+        self._removed = set()
+        self._entries: Dict[str, dict] = self._load()
+        self._document_frequency: Counter = Counter()
+        for entry in self._entries.values():
+            self._document_frequency.update(entry["terms"].keys())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(
+        self, outline_block: AnsciOutlineBlock
+    ) -> Optional[Tuple[AnsciSceneBlock, str, float]]:
+        """
+        Find a stored scene for a near-duplicate outline block
+
+        Args:
+            outline_block: Block about to be generated
+
+        Returns:
+            (scene block, its scene class name, similarity) for the best match
+            above the threshold, or None
+        """
+        terms = _block_terms(outline_block)
+        if len(terms) < MIN_TERMS:
+            return None
+
+        with self._lock:
+            self.stats["lookups"] += 1
+            query = self._weights(terms)
+            best_key, best_score = None, 0.0
+            for key, entry in self._entries.items():
+                if key in self._added_this_run:
+                    continue
+                score = _cosine(query, self._weights(entry["terms"]))
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None or best_score < self.threshold:
+                return None
+            entry = self._entries[best_key]
+
+        stored = self.scenes.get_json(best_key)
+        if stored is None:
+            # Scene file was removed behind the index's back
+            with self._lock:
+                self._forget(best_key)
+            self._save()
+            return None
+
+        with self._lock:
+            entry["last_used"] = time.time()
+            self.stats["reused"] += 1
+        self._save()
+        return (
+            AnsciSceneBlock(**stored["block"]),
+            stored["scene_name"],
+            best_score,
+        )
+
+    def add(
+        self,
+        outline_block: AnsciOutlineBlock,
+        scene_name: str,
+        scene_block: AnsciSceneBlock,
+    ) -> None:
+        """Store a validated scene for future lookups"""
+        terms = _block_terms(outline_block)
+        if len(terms) < MIN_TERMS:
+            return
+
+        key = make_key("similar", outline_block.block_title, outline_block.text)
+        self.scenes.put_json(
+            key, {"scene_name": scene_name, "block": scene_block.model_dump()}
+        )
+
+        with self._lock:
+            if key in self._entries:
+                self._document_frequency.subtract(self._entries[key]["terms"].keys())
+            self._entries[key] = {
+                "title": outline_block.block_title,
+                "terms": dict(terms),
+                "last_used": time.time(),
+            }
+            self._document_frequency.update(terms.keys())
+            self._added_this_run.add(key)
+            self._removed.discard(key)
+            self.stats["added"] += 1
+            evicted = self._evict()
+
+        for evicted_key in evicted:
+            self.scenes.delete(evicted_key, ".json")
+        self._save()
+
+    def _weights(self, terms: Dict[str, int]) -> Dict[str, float]:
+        # Smoothed IDF so terms unseen in the index still carry weight
+        total = len(self._entries)
+        return {
+            term: count
+            * (math.log((1 + total) / (1 + self._document_frequency[term])) + 1)
+            for term, count in terms.items()
+        }
+
+    def _evict(self) -> list:
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return []
+        oldest = sorted(self._entries, key=lambda key: self._entries[key]["last_used"])
+        evicted = oldest[:excess]
+        for key in evicted:
+            self._forget(key)
+        self.stats["evictions"] += len(evicted)
+        return evicted
+
+    def _forget(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._document_frequency.subtract(entry["terms"].keys())
+        self._removed.add(key)
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️  Could not read scene similarity index, starting fresh: {e}")
+            return {}
+
+    def _save(self) -> None:
+        # Merge with entries other processes wrote since we loaded the index
+        with self._lock:
+            merged = self._load()
+            for key in self._removed:
+                merged.pop(key, None)
+            for key, entry in self._entries.items():
+                other = merged.get(key)
+                if other is None or other["last_used"] <= entry["last_used"]:
+                    merged[key] = entry
+
+            fd, temp_path = tempfile.mkstemp(dir=self.index_path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(merged, f, ensure_ascii=False)
+                os.replace(temp_path, self.index_path)
+            except OSError as e:
+                print(f"⚠️  Could not save scene similarity index: {e}")
+            finally:
+                Path(temp_path).unlink(missing_ok=True)
+
+
+def _block_terms(outline_block: AnsciOutlineBlock) -> Counter:
+    return Counter(tokenize(f"{outline_block.block_title} {outline_block.text}"))
+
+
+def _cosine(first: Dict[str, float], second: Dict[str, float]) -> float:
+    if len(first) > len(second):
+        first, second = second, first
+    dot = sum(weight * second.get(term, 0.0) for term, weight in first.items())
+    if not dot:
+        return 0.0
+    norm = math.sqrt(sum(w * w for w in first.values())) * math.sqrt(
+        sum(w * w for w in second.values())
+    )
+    return dot / norm
@@ -3,6 +3,7 @@ Python Code Validation Module
 Validates that generated Manim code from animate.py is syntactically correct and executable
 """
 
+import os
 import ast
 import sys
 import traceback
@@ -14,6 +15,23 @@ import importlib.util
 from dataclasses import dataclass
 
 from .models import AnsciOutline, AnsciSceneBlock, AnsciAnimation
+from .render_pool import RUNTIME_PATH
+
+# Shared helpers generated scenes import from ansci/runtime.py instead of
+# defining their own copies
+RUNTIME_MODULE = "ansci.runtime"
+RUNTIME_HELPERS = (
+    "LayoutManager",
+    "AnimationPresets",
+    "validate_scene",
+    "run_quality_check",
+)
+
+# Imports every generated scene starts with
+SCENE_HEADER = f"from manim import *\nfrom {RUNTIME_MODULE} import *\n"
+
+# Upper bound on a `manim --dry_run` of one scene
+DRY_RUN_TIMEOUT = 120
 
 
 @dataclass
@@ -166,6 +184,8 @@ class PythonCodeValidator:
                     scene_name=scene_name,
                 )
 
+            warnings.extend(_runtime_warnings(tree))
+
             # Check for common Manim issues
             code_lower = code.lower()
             if "manim" not in code_lower and "scene" not in code_lower:
@@ -221,6 +241,34 @@ class PythonCodeValidator:
         return ValidationResult(is_valid=True, errors=errors, warnings=warnings)
 
 
+def _runtime_warnings(tree: ast.Module) -> List[str]:
+    """Warnings for scenes that redefine or forget to import the runtime helpers"""
+    warnings = []
+    defined = {
+        node.name
+        for node in tree.body
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef))
+    }
+    for name in RUNTIME_HELPERS:
+        if name in defined:
+            warnings.append(
+                f"Redefines {name} - import it with 'from {RUNTIME_MODULE} import *'"
+            )
+
+    imports_runtime = any(
+        isinstance(node, ast.ImportFrom) and node.module == RUNTIME_MODULE
+        for node in tree.body
+    )
+    used = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    missing = [name for name in RUNTIME_HELPERS if name in used - defined]
+    if missing and not imports_runtime:
+        warnings.append(
+            f"Uses {', '.join(missing)} without 'from {RUNTIME_MODULE} import *' "
+            "(added before rendering)"
+        )
+    return warnings
+
+
 def validate_generated_manim_code(manim_code: str) -> ValidationResult:
     """
     Comprehensive validation of generated Manim code
@@ -372,6 +420,62 @@ def test_manim_code_execution(
             pass
 
 
+def dry_run_manim_code(manim_code: str, scene_name: str) -> ValidationResult:
+    """
+    Run a scene's construct() with `manim --dry_run` (no frames are rendered)
+
+    Catches runtime errors static validation cannot see - bad arguments,
+    missing attributes, LaTeX failures - at a fraction of a render's cost.
+
+    Args:
+        manim_code: The Manim code to run
+        scene_name: Name of the scene class
+
+    Returns:
+        ValidationResult with the last lines of the error output on failure
+    """
+    if RUNTIME_MODULE not in manim_code:
+        manim_code = SCENE_HEADER + "\n" + manim_code
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [RUNTIME_PATH, env.get("PYTHONPATH")])
+    )
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        scene_file = Path(temp_dir) / f"{scene_name}.py"
+        scene_file.write_text(manim_code)
+        try:
+            result = subprocess.run(
+                [sys.executable, "-m", "manim", "--dry_run", str(scene_file), scene_name],
+                capture_output=True,
+                text=True,
+                cwd=temp_dir,
+                env=env,
+                timeout=DRY_RUN_TIMEOUT,
+            )
+        except subprocess.TimeoutExpired:
+            return ValidationResult(
+                is_valid=False,
+                errors=[f"Dry run timed out after {DRY_RUN_TIMEOUT}s"],
+                warnings=[],
+                scene_name=scene_name,
+            )
+
+    if result.returncode != 0:
+        tail = (result.stderr or result.stdout).strip().splitlines()[-5:]
+        return ValidationResult(
+            is_valid=False,
+            errors=[f"Dry run failed: {' | '.join(tail)}"],
+            warnings=[],
+            scene_name=scene_name,
+        )
+
+    return ValidationResult(
+        is_valid=True, errors=[], warnings=[], scene_name=scene_name
+    )
+
+
 def print_validation_summary(validation_results: List[ValidationResult]) -> None:
     """
     Print a summary of validation results
@@ -1,17 +1,57 @@
+from __future__ import annotations
+
 from io import BytesIO
 import base64
 from pathlib import Path
-from typing import List, Optional
-from anthropic.types import MessageParam
+from typing import TYPE_CHECKING, List, Optional
 
-from .outline import generate_outline
+from .outline import OutlineStream, generate_outline, select_outline_blocks
 from .animate import create_ansci_animation
 from .models import AnsciAnimation
 from .render import render_audiovisual_animation_embedded
+from .cache import AudioCache, DiskCache, RenderCache
+from .llm import cacheable_document, print_usage_summary
+from .ingest import (
+    PYPDF_AVAILABLE,
+    build_text_history,
+    ingest_pdf,
+    restrict_history_to_pages,
+)
+from .retrieval import build_paper_index, relevant_pages
+from .similarity import SceneIndex
+
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+
+# How the paper is sent to the model
+INGEST_MODES = ("document", "text")
+
+# Outline modes and the generate_outline map_reduce flag they map to
+OUTLINE_MODES = {"auto": None, "single": False, "map-reduce": True}
 
 
 def create_animation(
-    file: BytesIO, filename: str, prompt: str | None = None, splits: int | None = None
+    file: BytesIO,
+    filename: str,
+    prompt: str | None = None,
+    splits: int | None = None,
+    *,
+    render_workers: int = 1,
+    warm_workers: bool = False,
+    use_cache: bool = True,
+    generation_workers: int = 1,
+    single_call: bool = False,
+    refresh_cache: bool = False,
+    paper_context: bool = False,
+    stream_outline: bool = False,
+    ingest: str = "document",
+    outline_mode: str = "auto",
+    retrieval_k: int = 0,
+    sections: list[str] | None = None,
+    deterministic: bool = False,
+    reuse_similar: float | None = None,
+    code_candidates: int = 1,
+    dry_run: bool = False,
 ) -> Optional[List[str]]:
     """
     Complete animation workflow: PDF → Outline → Animation → Audio → Video
@@ -21,6 +61,38 @@ def create_animation(
         filename: Output filename/path for the animation
         prompt: Optional custom prompt for animation generation
         splits: Number of video splits to create (None = single combined video)
+        render_workers: Number of scenes to render concurrently (1 = sequential)
+        warm_workers: Render on long-lived manim workers instead of one
+            interpreter per scene
+        use_cache: Reuse cached artifacts from previous runs (outline, generated
+            scenes, narration audio, rendered scenes)
+        generation_workers: Number of scenes generated concurrently by the LLM
+        single_call: Generate each scene with one structured LLM call instead of
+            separate transcript, description and code calls
+        refresh_cache: Regenerate the outline and scenes even if they are cached
+            (and update the cache)
+        paper_context: Include the paper itself in scene generation calls (read
+            from the provider's prompt cache after the first call)
+        stream_outline: Start generating scenes as soon as each outline block
+            has streamed in, instead of waiting for the whole outline
+        ingest: How the paper is sent to the model - "document" (the PDF itself,
+            best for figure-heavy papers) or "text" (sections extracted locally,
+            far fewer input tokens)
+        outline_mode: "single" outline call, "map-reduce" over page/section
+            windows for very long papers, or "auto" to decide by token count
+        retrieval_k: Ground each scene in the top-k paper passages retrieved from
+            a local index over the paper (0 = off)
+        sections: Animate only these outline blocks, given as 1-based numbers
+            or titles. Only their scenes are generated, narrated and rendered,
+            and scene calls carrying the paper get only the relevant pages.
+        deterministic: Generate scenes at temperature 0 so an unchanged outline
+            gives the same scenes on every run
+        reuse_similar: Reuse a validated scene from an earlier run (any paper)
+            when an outline block's TF-IDF cosine similarity to it is at least
+            this value (None = off; needs use_cache)
+        code_candidates: Manim code candidates requested concurrently per scene;
+            the first to pass validation wins and the rest are cancelled
+        dry_run: Require a winning candidate to also pass `manim --dry_run`
 
     Returns:
         List of paths to generated video files with embedded audio
@@ -33,52 +105,144 @@ def create_animation(
 
     # Step 1: Process PDF and create history
     print("📄 Step 1: Processing PDF...")
-    pdf_data = base64.b64encode(file.read()).decode("utf-8")
-
-    history: list[MessageParam] = [
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "document",
-                    "source": {
-                        "type": "base64",
-                        "media_type": "application/pdf",
-                        "data": pdf_data,
+    pdf_bytes = file.read()
+
+    if ingest == "text" and not PYPDF_AVAILABLE:
+        print("⚠️  pypdf not installed - sending the PDF as a document instead")
+        ingest = "document"
+
+    history: list[MessageParam] = []
+    if ingest == "text":
+        # Compact per-section text instead of the base64 PDF
+        try:
+            paper = ingest_pdf(
+                pdf_bytes, cache=DiskCache("ingest") if use_cache else None
+            )
+            history = build_text_history(paper, prompt)
+        except Exception as e:
+            print(f"⚠️  Text extraction failed ({e}) - sending the PDF instead")
+
+    if not history:
+        pdf_data = base64.b64encode(pdf_bytes).decode("utf-8")
+
+        history = [
+            {
+                "role": "user",
+                "content": [
+                    # The paper is the bulk of every request that carries it, so it
+                    # closes a cacheable prefix shared by the outline and scene calls
+                    cacheable_document(
+                        {
+                            "type": "base64",
+                            "media_type": "application/pdf",
+                            "data": pdf_data,
+                        }
+                    ),
+                    {
+                        "type": "text",
+                        "text": prompt,
                     },
-                },
-                {
-                    "type": "text",
-                    "text": prompt,
-                },
-            ],
-        },
-    ]
+                ],
+            },
+        ]
     print(f"✅ PDF processed and prompt set: '{prompt[:50]}...'")
 
     # Step 2: Generate outline
     print("\n📋 Step 2: Generating outline with AI...")
-    try:
-        outline_text, outline = generate_outline(history)
-        print(f"Assistant: {outline_text}")
+    outline_cache = DiskCache("outlines") if use_cache else None
+    map_reduce = OUTLINE_MODES.get(outline_mode)
+    if stream_outline and sections:
+        print("⚠️  Section selection needs the full outline - not streaming it")
+        stream_outline = False
+
+    if stream_outline:
+        # Scenes start as soon as each block streams in; checked after step 3
+        outline = OutlineStream(
+            history,
+            cache=outline_cache,
+            refresh=refresh_cache,
+            map_reduce=map_reduce,
+        )
+        print("🌊 Streaming outline blocks straight into scene generation")
+    else:
+        try:
+            outline_text, outline = generate_outline(
+                history,
+                cache=outline_cache,
+                refresh=refresh_cache,
+                map_reduce=map_reduce,
+            )
+            print(f"Assistant: {outline_text}")
 
-        if outline is None:
-            print("❌ Failed to generate outline")
-            return None
+            if outline is None:
+                print("❌ Failed to generate outline")
+                return None
 
-        print(f"✅ Outline generated: '{outline.title}'")
-        print(f"📊 Found {len(outline.blocks)} animation sections:")
-        for i, block in enumerate(outline.blocks):
-            print(f"   {i+1}. {block.block_title}")
+            print(f"✅ Outline generated: '{outline.title}'")
+            print(f"📊 Found {len(outline.blocks)} animation sections:")
+            for i, block in enumerate(outline.blocks):
+                print(f"   {i+1}. {block.block_title}")
 
-    except Exception as e:
-        print(f"❌ Error generating outline: {e}")
-        return None
+        except Exception as e:
+            print(f"❌ Error generating outline: {e}")
+            return None
+
+        if sections:
+            try:
+                outline = select_outline_blocks(outline, sections)
+            except ValueError as e:
+                print(f"❌ Invalid section selection: {e}")
+                return None
+            print(f"🎯 Animating {len(outline.blocks)} selected section(s):")
+            for block in outline.blocks:
+                print(f"   - {block.block_title}")
 
     # Step 3: Create animation scenes
     print("\n🎬 Step 3: Creating animation scenes with AI...")
     try:
-        animation_generator = create_ansci_animation(history, outline)
+        paper_index = None
+        if retrieval_k > 0:
+            paper_index = build_paper_index(
+                history, cache=DiskCache("ingest") if use_cache else None
+            )
+            if paper_index is None:
+                print("⚠️  Paper text unavailable - scenes will not get passages")
+
+        scene_history = history
+        if sections and paper_context:
+            # Scene calls only need the pages the selected blocks are about
+            page_index = paper_index or build_paper_index(
+                history, cache=DiskCache("ingest") if use_cache else None
+            )
+            if page_index is not None:
+                pages = relevant_pages(
+                    page_index,
+                    [f"{block.block_title} {block.text}" for block in outline.blocks],
+                )
+                scene_history = restrict_history_to_pages(history, pages)
+                if scene_history is not history:
+                    print(f"📄 Sending pages {pages} of the paper to scene calls")
+
+        similar_scenes = None
+        if reuse_similar is not None and use_cache:
+            similar_scenes = SceneIndex(threshold=reuse_similar)
+            print(f"♻️  Scene similarity index: {len(similar_scenes)} earlier scenes")
+
+        animation_generator = create_ansci_animation(
+            scene_history,
+            outline,
+            max_concurrency=generation_workers,
+            single_call=single_call,
+            paper_context=paper_context,
+            paper_index=paper_index,
+            retrieval_k=retrieval_k,
+            scene_cache=DiskCache("scenes") if use_cache else None,
+            refresh_cache=refresh_cache,
+            deterministic=deterministic,
+            similar_scenes=similar_scenes,
+            code_candidates=code_candidates,
+            dry_run=dry_run,
+        )
 
         # Convert generator to list of scene blocks
         scene_blocks = []
@@ -86,6 +250,18 @@ def create_animation(
             scene_blocks.append(scene)
             print(f"✅ Scene {i+1}: {scene.description[:60]}...")
 
+        if isinstance(outline, OutlineStream):
+            outline_text, final_outline = outline.result()
+            print(f"Assistant: {outline_text}")
+            if final_outline is None:
+                print("❌ Failed to generate outline")
+                return None
+            print(
+                f"✅ Outline streamed: '{final_outline.title}' "
+                f"({len(final_outline.blocks)} sections)"
+            )
+            outline = final_outline
+
         if not scene_blocks:
             print("❌ No animation scenes were generated")
             return None
@@ -109,6 +285,7 @@ def create_animation(
         # Create complete animation
         animation = AnsciAnimation(blocks=scene_blocks)
         print(f"✅ Animation created with {len(animation.blocks)} scenes")
+        print_usage_summary()
 
     except Exception as e:
         print(f"❌ Error creating animation: {e}")
@@ -130,6 +307,10 @@ def create_animation(
             quality="high",
             enable_validation=True,
             splits=splits,
+            max_workers=render_workers,
+            warm_workers=warm_workers,
+            render_cache=RenderCache() if use_cache else None,
+            tts_cache=AudioCache() if use_cache else None,
         )
 
         if video_paths:
@@ -201,7 +382,27 @@ def _verify_audio_in_video(video_path: str) -> bool:
 
 # Convenience function for direct usage
 def create_animation_from_pdf_path(
-    pdf_path: str, output_path: str, prompt: str | None = None, splits: int | None = None
+    pdf_path: str,
+    output_path: str,
+    prompt: str | None = None,
+    splits: int | None = None,
+    *,
+    render_workers: int = 1,
+    warm_workers: bool = False,
+    use_cache: bool = True,
+    generation_workers: int = 1,
+    single_call: bool = False,
+    refresh_cache: bool = False,
+    paper_context: bool = False,
+    stream_outline: bool = False,
+    ingest: str = "document",
+    outline_mode: str = "auto",
+    retrieval_k: int = 0,
+    sections: list[str] | None = None,
+    deterministic: bool = False,
+    reuse_similar: float | None = None,
+    code_candidates: int = 1,
+    dry_run: bool = False,
 ) -> Optional[List[str]]:
     """
     Create animation directly from PDF file path
@@ -211,6 +412,22 @@ def create_animation_from_pdf_path(
         output_path: Path for output videos
         prompt: Optional custom prompt
         splits: Number of video splits to create (None = single combined video)
+        render_workers: Number of scenes to render concurrently (1 = sequential)
+        warm_workers: Render on long-lived manim workers
+        use_cache: Reuse cached artifacts from previous runs
+        generation_workers: Number of scenes generated concurrently by the LLM
+        single_call: Generate each scene with one structured LLM call
+        refresh_cache: Regenerate the outline and scenes even if cached
+        paper_context: Include the paper itself in scene generation calls
+        stream_outline: Overlap outline streaming with scene generation
+        ingest: Send the paper as a "document" or as extracted "text"
+        outline_mode: "auto", "single" or "map-reduce" outline generation
+        retrieval_k: Paper passages retrieved per scene (0 = off)
+        sections: Outline blocks to animate (numbers or titles; None = all)
+        deterministic: Generate scenes at temperature 0 for repeatable output
+        reuse_similar: Similarity threshold for reusing earlier scenes (None = off)
+        code_candidates: Concurrent code candidates per scene (first valid wins)
+        dry_run: Require the winning candidate to pass `manim --dry_run`
 
     Returns:
         List of paths to generated video files
@@ -218,7 +435,28 @@ def create_animation_from_pdf_path(
     try:
         with open(pdf_path, "rb") as f:
             pdf_bytes = BytesIO(f.read())
-            return create_animation(pdf_bytes, output_path, prompt, splits)
+            return create_animation(
+                pdf_bytes,
+                output_path,
+                prompt,
+                splits,
+                render_workers=render_workers,
+                warm_workers=warm_workers,
+                use_cache=use_cache,
+                generation_workers=generation_workers,
+                single_call=single_call,
+                refresh_cache=refresh_cache,
+                paper_context=paper_context,
+                stream_outline=stream_outline,
+                ingest=ingest,
+                outline_mode=outline_mode,
+                retrieval_k=retrieval_k,
+                sections=sections,
+                deterministic=deterministic,
+                reuse_similar=reuse_similar,
+                code_candidates=code_candidates,
+                dry_run=dry_run,
+            )
     except Exception as e:
         print(f"❌ Error reading PDF file: {e}")
         return None
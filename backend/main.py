@@ -2,10 +2,33 @@ from io import BytesIO
 import argparse
 import sys
 from pathlib import Path
-from ansci.workflow import create_animation
+from ansci.similarity import DEFAULT_SIMILARITY_THRESHOLD
 
 
-def main(paper_path: str, output_path: str, prompt: str | None = None, splits: int | None = None):
+def main(
+    paper_path: str,
+    output_path: str,
+    prompt: str | None = None,
+    splits: int | None = None,
+    *,
+    render_workers: int = 1,
+    warm_workers: bool = False,
+    use_cache: bool = True,
+    generation_workers: int = 1,
+    single_call: bool = False,
+    refresh_cache: bool = False,
+    paper_context: bool = False,
+    stream_outline: bool = False,
+    ingest: str = "document",
+    outline_mode: str = "auto",
+    retrieval_k: int = 0,
+    sections: list[str] | None = None,
+    deterministic: bool = False,
+    reuse_similar: float | None = None,
+    code_candidates: int = 1,
+    dry_run: bool = False,
+    governor: str | None = None,
+):
     """
     Main entry point for PDF to Animation workflow
     
@@ -14,6 +37,24 @@ def main(paper_path: str, output_path: str, prompt: str | None = None, splits: i
         output_path: Output directory for generated videos
         prompt: Optional custom prompt for animation generation
         splits: Number of video splits to create (if None, create one combined video)
+        render_workers: Number of scenes to render concurrently (1 = sequential)
+        warm_workers: Render on long-lived manim workers (imports manim once)
+        use_cache: Reuse cached artifacts from previous runs
+        generation_workers: Number of scenes generated concurrently by the LLM
+        single_call: Generate each scene with one structured LLM call
+        refresh_cache: Regenerate the outline and scenes even if cached
+        paper_context: Include the paper itself in scene generation calls
+        stream_outline: Start scene generation while the outline is still streaming
+        ingest: Send the paper as a "document" (PDF) or as extracted "text"
+        outline_mode: "auto", "single" or "map-reduce" outline generation
+        retrieval_k: Paper passages retrieved locally for each scene (0 = off)
+        sections: Outline blocks to animate, by number or title (None = all)
+        deterministic: Generate scenes at temperature 0 for repeatable output
+        reuse_similar: Similarity threshold for reusing earlier scenes (None = off)
+        code_candidates: Concurrent code candidates per scene (first valid wins)
+        dry_run: Require the winning candidate to pass `manim --dry_run`
+        governor: Share API quotas with other processes through this ledger
+            file ("" = the ledger in the cache directory, None = off)
     """
     print("🎬🎙️ AnSci Animation Generator")
     print("=" * 40)
@@ -25,6 +66,44 @@ def main(paper_path: str, output_path: str, prompt: str | None = None, splits: i
         print(f"🎞️  Video splits: {splits} separate videos")
     else:
         print(f"🎞️  Video output: Single combined video")
+    if generation_workers > 1:
+        print(f"⚡ Generation workers: {generation_workers} scenes in parallel")
+    if single_call:
+        print("🧩 Scene generation: one structured call per scene")
+    if paper_context:
+        print("📄 Scene generation: paper included via prompt cache")
+    if stream_outline:
+        print("🌊 Streaming outline: scenes start as outline blocks arrive")
+    if ingest == "text":
+        print("📑 Paper ingest: locally extracted section text")
+    if outline_mode != "auto":
+        print(f"🗂️  Outline mode: {outline_mode}")
+    if retrieval_k > 0:
+        print(f"🔎 Retrieval: top {retrieval_k} paper passages per scene")
+    if sections:
+        print(f"🎯 Sections: {', '.join(sections)}")
+    if deterministic:
+        print("🎯 Deterministic scene generation (temperature 0)")
+    if reuse_similar is not None:
+        print(f"♻️  Reusing earlier scenes at ≥{reuse_similar:.0%} similarity")
+    if code_candidates > 1:
+        dry_run_note = ", dry run required" if dry_run else ""
+        print(f"🎲 Code candidates: {code_candidates} per scene{dry_run_note}")
+    if governor is not None:
+        from ansci.governor import Governor
+        from ansci.resilience import use_governor
+
+        ledger = Governor(governor or None)
+        use_governor(ledger)
+        print(f"🚥 Governor: API quotas shared via {ledger.path} as job {ledger.job}")
+    if render_workers > 1:
+        print(f"⚙️  Render workers: {render_workers} scenes in parallel")
+    if warm_workers:
+        print("🔥 Warm render workers: manim imported once per worker")
+    if not use_cache:
+        print("🚫 Caching disabled")
+    elif refresh_cache:
+        print("🔄 Refreshing cached outline and scenes")
     print()
     
     # Validate input file
@@ -41,10 +120,34 @@ def main(paper_path: str, output_path: str, prompt: str | None = None, splits: i
     output_dir.mkdir(parents=True, exist_ok=True)
     
     try:
+        # Imported here so --help and argument errors return immediately
+        from ansci.workflow import create_animation
+
         # Run the complete workflow
         with open(paper_path, "rb") as paper_file:
             paper_bytes = BytesIO(paper_file.read())
-            video_paths = create_animation(paper_bytes, output_path, prompt, splits)
+            video_paths = create_animation(
+                paper_bytes,
+                output_path,
+                prompt,
+                splits,
+                render_workers=render_workers,
+                warm_workers=warm_workers,
+                use_cache=use_cache,
+                generation_workers=generation_workers,
+                single_call=single_call,
+                refresh_cache=refresh_cache,
+                paper_context=paper_context,
+                stream_outline=stream_outline,
+                ingest=ingest,
+                outline_mode=outline_mode,
+                retrieval_k=retrieval_k,
+                sections=sections,
+                deterministic=deterministic,
+                reuse_similar=reuse_similar,
+                code_candidates=code_candidates,
+                dry_run=dry_run,
+            )
         
         if video_paths:
             print(f"\n🎉 SUCCESS! Generated {len(video_paths)} animation videos:")
@@ -77,6 +180,8 @@ Examples:
   python main.py --paper attention.pdf --output ./transformer_videos --prompt "Explain the attention mechanism visually"
   python main.py --paper paper.pdf --output ./videos --splits 3  # Create 3 separate video files
   python main.py --paper paper.pdf --output ./videos --splits 1  # Create 1 video per scene
+  python main.py --paper paper.pdf --output ./videos --generation-workers 4 --render-workers 8
+  python main.py --paper paper.pdf --output ./videos --splits 1 --warm-workers  # Reuse warm manim workers
         """
     )
     parser.add_argument("--paper", type=str, required=True, 
@@ -87,6 +192,72 @@ Examples:
                        help="Custom prompt to guide animation generation (optional)")
     parser.add_argument("--splits", type=int,
                        help="Number of video splits to create (default: single combined video)")
+    parser.add_argument("--generation-workers", type=int, default=1,
+                       help="Number of scenes to generate concurrently with the LLM (default: 1, sequential)")
+    parser.add_argument("--single-call", action="store_true",
+                       help="Generate each scene's transcript, description and code in one structured LLM call")
+    parser.add_argument("--render-workers", type=int, default=1,
+                       help="Number of scenes to render concurrently (default: 1, sequential)")
+    parser.add_argument("--warm-workers", action="store_true",
+                       help="Render on long-lived workers that import manim once")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Disable caches and regenerate everything from scratch")
+    parser.add_argument("--refresh-cache", action="store_true",
+                       help="Regenerate the outline and scenes even if they are cached, and update the cache")
+    parser.add_argument("--paper-context", action="store_true",
+                       help="Send the paper with every scene generation call (served from the prompt cache after the first)")
+    parser.add_argument("--stream-outline", action="store_true",
+                       help="Start generating scenes as soon as each outline block streams in")
+    parser.add_argument("--ingest", choices=["document", "text"], default="document",
+                       help="Send the paper as the PDF document (default, best for figure-heavy papers) or as locally extracted text (requires pypdf)")
+    parser.add_argument("--outline-mode", choices=["auto", "single", "map-reduce"], default="auto",
+                       help="Outline in one call, or map-reduce over page/section windows for very long papers (auto decides by token count)")
+    parser.add_argument("--retrieval-k", type=int, default=0,
+                       help="Ground each scene in the top K paper passages from a local BM25 index (0 = off, default)")
+    parser.add_argument("--sections", nargs="+", metavar="SECTION",
+                       help="Animate only these outline blocks, by number (as listed after the outline step) or title")
+    parser.add_argument("--deterministic", action="store_true",
+                       help="Generate scenes at temperature 0 so reruns of an unchanged outline give the same scenes")
+    parser.add_argument("--code-candidates", type=int, default=1,
+                       help="Request N Manim code candidates per scene concurrently and keep the first that passes validation, cancelling the rest (default: 1)")
+    parser.add_argument("--dry-run", action="store_true",
+                       help="With --code-candidates, also require the winning candidate to pass `manim --dry_run`")
+    parser.add_argument("--reuse-similar", type=float, nargs="?", const=DEFAULT_SIMILARITY_THRESHOLD, metavar="THRESHOLD",
+                       help=f"Reuse validated scenes from earlier runs for near-duplicate outline blocks, e.g. stock concepts shared across papers (TF-IDF cosine threshold, default {DEFAULT_SIMILARITY_THRESHOLD})")
+    parser.add_argument("--governor", nargs="?", const="", metavar="LEDGER",
+                       help="Share Anthropic and LMNT rate limits with other AnSci processes on this host through a SQLite ledger (default: governor.sqlite in the cache directory)")
     
     args = parser.parse_args()
-    main(args.paper, args.output, args.prompt, args.splits)
+    if args.render_workers < 1:
+        parser.error("--render-workers must be at least 1")
+    if args.generation_workers < 1:
+        parser.error("--generation-workers must be at least 1")
+    if args.retrieval_k < 0:
+        parser.error("--retrieval-k cannot be negative")
+    if args.reuse_similar is not None and not 0 < args.reuse_similar <= 1:
+        parser.error("--reuse-similar threshold must be in (0, 1]")
+    if args.code_candidates < 1:
+        parser.error("--code-candidates must be at least 1")
+    main(
+        args.paper,
+        args.output,
+        args.prompt,
+        args.splits,
+        render_workers=args.render_workers,
+        warm_workers=args.warm_workers,
+        use_cache=not args.no_cache,
+        generation_workers=args.generation_workers,
+        single_call=args.single_call,
+        refresh_cache=args.refresh_cache,
+        paper_context=args.paper_context,
+        stream_outline=args.stream_outline,
+        ingest=args.ingest,
+        outline_mode=args.outline_mode,
+        retrieval_k=args.retrieval_k,
+        sections=args.sections,
+        deterministic=args.deterministic,
+        reuse_similar=args.reuse_similar,
+        code_candidates=args.code_candidates,
+        dry_run=args.dry_run,
+        governor=args.governor,
+    )
@@ -0,0 +1,33 @@
+from ansci import animate
+from ansci.cache import DiskCache
+from ansci.models import AnsciOutlineBlock
+from ansci.similarity import SceneIndex
+from ansci.verify import ValidationResult
+
+
+BLOCK = AnsciOutlineBlock(
+    block_title="Scaled dot-product attention",
+    text="Queries are compared with keys, scaled and softmaxed into weights "
+    "that average the values",
+)
+
+
+def test_fallback_scenes_are_not_cached_or_indexed(monkeypatch, tmp_path):
+    # Without a client every part of the scene comes from a fallback, and the
+    # template code passes validation
+    monkeypatch.setattr(animate, "anthropic_client", lambda: None)
+    monkeypatch.setattr(
+        animate,
+        "validate_generated_manim_code",
+        lambda code: ValidationResult(is_valid=True, errors=[], warnings=[]),
+    )
+    cache = DiskCache("scenes", root=tmp_path)
+    index = SceneIndex(root=tmp_path)
+
+    scene = animate._build_scene_block(
+        [], BLOCK, 0, "Paper", 1, {}, scene_cache=cache, similar_scenes=index
+    )
+
+    assert scene.transcript == BLOCK.text
+    assert cache.stats["stores"] == 0
+    assert len(index) == 0
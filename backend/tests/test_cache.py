@@ -0,0 +1,80 @@
+import os
+import time
+from pathlib import Path
+
+from ansci import cache as cache_module
+from ansci.cache import DiskCache, RenderCache, make_key
+
+
+def test_disk_cache_hit_miss_and_json_roundtrip(tmp_path):
+    cache = DiskCache("test", root=tmp_path)
+    key = make_key("outline", "paper")
+
+    assert cache.get_json(key) is None
+    cache.put_json(key, {"title": "Attention"})
+
+    assert cache.get_json(key) == {"title": "Attention"}
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+    assert cache.stats["stores"] == 1
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache("test", root=tmp_path, max_bytes=250)
+    source = tmp_path / "blob"
+    source.write_bytes(b"x" * 100)
+
+    cache.put_file("a" * 64, source)
+    cache.put_file("b" * 64, source)
+    # Touch "a" so "b" becomes the least recently used entry
+    old = time.time() - 60
+    os.utime(cache.path_for("b" * 64), (old, old))
+    cache.get_file("a" * 64)
+    cache.put_file("c" * 64, source)
+
+    assert cache.path_for("a" * 64).exists()
+    assert not cache.path_for("b" * 64).exists()
+    assert cache.path_for("c" * 64).exists()
+    assert cache.stats["evictions"] == 1
+
+
+def test_render_cache_key_uses_audio_content_not_path(tmp_path):
+    cache = RenderCache(root=tmp_path)
+    first = tmp_path / "run1" / "Scene1_narration.mp3"
+    second = tmp_path / "run2" / "Scene1_narration.mp3"
+    for path in (first, second):
+        path.parent.mkdir()
+        path.write_bytes(b"narration")
+
+    code = 'class Scene1(Scene):\n    def construct(self):\n        self.add_sound("{}")\n'
+    key_one = cache.key_for(code.format(first), "Scene1", "high")
+    key_two = cache.key_for(code.format(second), "Scene1", "high")
+    assert key_one == key_two
+
+    second.write_bytes(b"different narration")
+    assert cache.key_for(code.format(second), "Scene1", "high") != key_one
+    assert cache.key_for(code.format(first), "Scene1", "low") != key_one
+
+
+def test_render_cache_key_changes_with_the_runtime_helpers(tmp_path, monkeypatch):
+    runtime = tmp_path / "runtime.py"
+    runtime.write_text("class LayoutManager: pass\n")
+    monkeypatch.setattr(cache_module, "RUNTIME_FILE", runtime)
+    code = "class Scene1(Scene):\n    def construct(self):\n        pass\n"
+    key = RenderCache(root=tmp_path).key_for(code, "Scene1", "high")
+
+    runtime.write_text("class LayoutManager:\n    BUFFER = 0.5\n")
+    assert RenderCache(root=tmp_path).key_for(code, "Scene1", "high") != key
+
+
+def test_render_cache_fetch_links_cached_video(tmp_path):
+    cache = RenderCache(root=tmp_path / "cache")
+    video = tmp_path / "Scene1.mp4"
+    video.write_bytes(b"video")
+    key = cache.key_for("class Scene1(Scene): pass", "Scene1", "high")
+
+    output = tmp_path / "out" / "Scene1.mp4"
+    assert not cache.fetch(key, output)
+    cache.store(key, video)
+    assert cache.fetch(key, output)
+    assert Path(output).read_bytes() == b"video"
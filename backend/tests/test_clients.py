@@ -0,0 +1,48 @@
+import sys
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from ansci import clients
+
+
+def test_anthropic_client_is_created_once_from_the_env_file(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("# keys\nANTHROPIC_API_KEY=sk-test\n")
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.setattr(clients, "ENV_FILE", env_file)
+    monkeypatch.setattr(clients, "_env_file_values", None)
+    monkeypatch.setattr(clients, "_anthropic_client", None)
+    monkeypatch.setattr(clients, "_anthropic_client_created", False)
+
+    client = clients.anthropic_client()
+
+    assert client.api_key == "sk-test"
+    assert client.max_retries == 0
+    assert clients.anthropic_client() is client
+
+
+def test_concurrent_first_lmnt_calls_share_one_session(monkeypatch):
+    opened = []
+
+    class Speech:
+        def __init__(self, key):
+            opened.append(self)
+
+        async def __aenter__(self):
+            await asyncio.sleep(0.1)
+            return self
+
+    monkeypatch.setenv("LMNT_API_KEY", "test")
+    monkeypatch.setitem(sys.modules, "lmnt.api", SimpleNamespace(Speech=Speech))
+    monkeypatch.setattr(clients, "_lmnt_speech", None)
+    monkeypatch.setattr(clients, "_lmnt_speech_lock", None)
+
+    async def session(speech):
+        return speech
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        sessions = list(executor.map(lambda _: clients.run_lmnt(session), range(4)))
+
+    assert len(opened) == 1
+    assert all(speech is opened[0] for speech in sessions)
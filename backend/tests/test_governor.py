@@ -0,0 +1,56 @@
+import threading
+import time
+
+from ansci.governor import Governor
+
+LIMITS = {"requests": 120}
+
+
+def test_processes_share_one_quota(tmp_path):
+    first = Governor(tmp_path / "ledger.sqlite", job="first")
+    second = Governor(tmp_path / "ledger.sqlite", job="second")
+
+    # The first job drains the shared minute of quota, the second has to wait
+    assert first.acquire("api", {"requests": 120}, LIMITS) < 0.1
+    waited = second.acquire("api", {"requests": 1}, LIMITS)
+
+    assert 0.3 < waited < 2.0
+    assert second.stats["api"]["acquired"] == 1
+    assert set(first.job_stats()) == {"first", "second"}
+
+
+def test_waiting_jobs_take_turns(tmp_path):
+    busy = Governor(tmp_path / "ledger.sqlite", job="busy")
+    quiet = Governor(tmp_path / "ledger.sqlite", job="quiet")
+    busy.acquire("api", {"requests": 120}, LIMITS)
+
+    order = []
+
+    def acquire(governor):
+        governor.acquire("api", {"requests": 1}, LIMITS)
+        order.append(governor.job)
+
+    threads = [threading.Thread(target=acquire, args=(busy,))]
+    threads[0].start()
+    time.sleep(0.1)
+    threads.append(threading.Thread(target=acquire, args=(quiet,)))
+    threads[1].start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    # The quiet job queued later but goes first: busy was served last
+    assert order == ["quiet", "busy"]
+
+
+def test_try_acquire_never_waits(tmp_path):
+    first = Governor(tmp_path / "ledger.sqlite", job="first")
+    second = Governor(tmp_path / "ledger.sqlite", job="second")
+
+    assert second.try_acquire("api", {"requests": 119}, LIMITS)
+    assert first.try_acquire("api", {"requests": 1}, LIMITS)
+
+    # The quota is spent: no grant, and nothing was debited
+    start = time.monotonic()
+    assert not second.try_acquire("api", {"requests": 1}, LIMITS)
+    assert time.monotonic() - start < 0.1
+    assert first.acquire("api", {"requests": 1}, LIMITS) < 1.0
@@ -0,0 +1,78 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from ansci import llm
+
+
+def _chunks(text, delay):
+    time.sleep(delay)
+    yield SimpleNamespace(
+        type="content_block_delta",
+        delta=SimpleNamespace(type="text_delta", text=text),
+    )
+
+
+class StallingClient:
+    """First request stalls before its first token, later ones answer at once"""
+
+    def __init__(self, stall):
+        self.stall = stall
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.messages = self
+
+    def create(self, stream, **kwargs):
+        with self._lock:
+            self.requests += 1
+            number = self.requests
+        if number == 1:
+            return _chunks("primary", self.stall)
+        return _chunks("backup", 0.0)
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(llm, "HEDGE_DEFAULT_TTFT", 0.05)
+    monkeypatch.setattr(llm, "HEDGE_STATS", dict.fromkeys(llm.HEDGE_STATS, 0))
+    monkeypatch.setattr(llm, "_hedge_credit", llm.HEDGE_BURST)
+    monkeypatch.setattr(llm, "_ttft_samples", {})
+    monkeypatch.setattr(llm, "_gap_samples", {})
+
+
+def test_stalled_stream_is_hedged_and_backup_wins(hedging):
+    client = StallingClient(stall=2.0)
+
+    start = time.perf_counter()
+    result = llm.stream_message(client, "test", task="test-hedge", model="m")
+
+    assert result.text == "backup"
+    assert time.perf_counter() - start < 1.0
+    assert client.requests == 2
+    assert llm.hedge_stats() == {"requests": 1, "hedged": 1, "wins": 1, "denied": 0}
+
+
+def test_hedging_respects_budget(hedging, monkeypatch):
+    monkeypatch.setattr(llm, "_hedge_credit", 0.0)
+    monkeypatch.setattr(llm, "HEDGE_BUDGET", 0.0)
+    client = StallingClient(stall=0.3)
+
+    result = llm.stream_message(client, "test", task="test-hedge", model="m")
+
+    assert result.text == "primary"
+    assert client.requests == 1
+    assert llm.hedge_stats()["denied"] == 1
+
+
+def test_hedge_is_skipped_without_rate_limit_room(hedging, monkeypatch):
+    # One request per minute: the primary takes it, the backup would wait
+    monkeypatch.setenv("ANSCI_ANTHROPIC_RPM", "1")
+    client = StallingClient(stall=0.3)
+
+    result = llm.stream_message(client, "test", task="test-hedge", model="m-rpm1")
+
+    assert result.text == "primary"
+    assert client.requests == 1
+    assert llm.hedge_stats() == {"requests": 1, "hedged": 0, "wins": 0, "denied": 1}
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+# Cold-start budgets (seconds, best of a few runs) - generous next to the
+# ~0.3s and ~0.15s these take, but well below what importing manim or the
+# anthropic SDK up front costs
+HELP_BUDGET = 1.5
+VERIFY_BUDGET = 1.0
+
+# Dependencies that must only load in the code paths that use them
+HEAVY_MODULES = ("manim", "numpy", "anthropic", "lmnt", "httpx", "pypdf")
+
+
+def _best_time(args, runs=3):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, cwd=BACKEND, check=True, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_cli_help_starts_within_budget():
+    assert _best_time([sys.executable, "main.py", "--help"]) < HELP_BUDGET
+
+
+def test_verify_imports_within_budget():
+    assert _best_time([sys.executable, "-c", "import ansci.verify"]) < VERIFY_BUDGET
+
+
+@pytest.mark.parametrize("module", ["ansci.workflow", "ansci.verify"])
+def test_import_defers_heavy_dependencies(module):
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {module}; "
+            f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+        ],
+        cwd=BACKEND,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+
+    assert loaded == []
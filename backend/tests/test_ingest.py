@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pypdf")
+
+from ansci.cache import DiskCache
+from ansci.ingest import build_text_history, ingest_pdf
+from ansci.llm import paper_blocks
+
+PAPER = Path(__file__).resolve().parents[2] / "papers" / "1706.03762v7.pdf"
+
+
+@pytest.mark.skipif(not PAPER.exists(), reason="sample paper not available")
+def test_ingest_extracts_sections_and_caches(tmp_path):
+    pdf_bytes = PAPER.read_bytes()
+    cache = DiskCache("ingest", root=tmp_path)
+
+    paper = ingest_pdf(pdf_bytes, cache=cache)
+    headings = [section.heading for section in paper.sections]
+
+    assert "3.2.1 Scaled Dot-Product Attention" in headings
+    assert not any("References" in heading for heading in headings)
+    assert any(
+        "softmax" in equation
+        for section in paper.sections
+        for equation in section.equations
+    )
+
+    # Second ingest of the same bytes comes from the cache
+    assert ingest_pdf(pdf_bytes, cache=cache) == paper
+    assert cache.stats["hits"] == 1
+
+    # The extracted text is a small fraction of the PDF and counts as the paper
+    history = build_text_history(paper, "Explain attention")
+    assert len(history[0]["content"][0]["text"]) < len(pdf_bytes) / 20
+    assert len(paper_blocks(history)) == 1
@@ -0,0 +1,78 @@
+from ansci import outline as outline_module
+from ansci.models import AnsciOutline
+
+PARTS = [
+    AnsciOutline(title="Part 1", blocks=[{"block_title": "Intro", "text": "a"}]),
+    AnsciOutline(title="Part 2", blocks=[{"block_title": "Method", "text": "b"}]),
+]
+MERGED = AnsciOutline(
+    title="Paper",
+    blocks=[
+        {"block_title": "Intro and method", "text": "a and b"},
+        {"block_title": "Results", "text": "c"},
+    ],
+)
+
+
+def _fake_stream_outline(merge_result):
+    def stream_outline(history, label, on_block=None, on_title=None):
+        if label.startswith("outline part"):
+            index = int(label.split()[-1].split("/")[0])
+            return ("", PARTS[index - 1])
+        # The merge streams its first block, then (maybe) fails to parse
+        if on_block is not None:
+            on_block(MERGED.blocks[0])
+        return ("", merge_result)
+
+    return stream_outline
+
+
+def _run(monkeypatch, merge_result):
+    monkeypatch.setattr(
+        outline_module, "_stream_outline", _fake_stream_outline(merge_result)
+    )
+    monkeypatch.setattr(
+        outline_module, "split_paper_history", lambda history: [["w1"], ["w2"]]
+    )
+    emitted = []
+    _, outline = outline_module.generate_outline(
+        [{"role": "user", "content": "Explain"}],
+        on_block=emitted.append,
+        map_reduce=True,
+    )
+    return outline, emitted
+
+
+def test_failed_merge_emits_only_the_partial_outlines(monkeypatch):
+    outline, emitted = _run(monkeypatch, None)
+
+    assert [block.block_title for block in emitted] == ["Intro", "Method"]
+    assert emitted == outline.blocks
+
+
+def test_merged_blocks_are_emitted_once_the_merge_parses(monkeypatch):
+    outline, emitted = _run(monkeypatch, MERGED)
+
+    assert outline == MERGED
+    assert emitted == MERGED.blocks
+
+
+def test_auto_mode_splits_only_long_papers(monkeypatch):
+    def split(history):
+        raise ValueError("encrypted PDF")
+
+    monkeypatch.setattr(outline_module, "split_paper_history", split)
+    monkeypatch.setattr(
+        outline_module,
+        "_stream_outline",
+        lambda history, label, on_block=None, on_title=None: ("", MERGED),
+    )
+    history = [{"role": "user", "content": "Explain"}]
+
+    # Short paper: the split is never attempted
+    monkeypatch.setattr(outline_module, "_exceeds_token_threshold", lambda h: False)
+    assert outline_module.generate_outline(history)[1] == MERGED
+
+    # Long paper whose split fails: one outline call instead
+    monkeypatch.setattr(outline_module, "_exceeds_token_threshold", lambda h: True)
+    assert outline_module.generate_outline(history)[1] == MERGED
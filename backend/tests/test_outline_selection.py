@@ -0,0 +1,32 @@
+import pytest
+
+from ansci.models import AnsciOutline
+from ansci.outline import select_outline_blocks
+
+OUTLINE = AnsciOutline(
+    title="Attention Is All You Need",
+    blocks=[
+        {"block_title": "Why Not Recurrence", "text": "Sequential bottleneck"},
+        {"block_title": "Scaled Dot-Product Attention", "text": "softmax(QK^T)V"},
+        {"block_title": "Multi-Head Attention", "text": "h parallel heads"},
+    ],
+)
+
+
+def test_select_by_number_and_title_keeps_selection_order():
+    selected = select_outline_blocks(OUTLINE, ["3", "why not recurrence", 3])
+
+    assert [block.block_title for block in selected.blocks] == [
+        "Multi-Head Attention",
+        "Why Not Recurrence",
+    ]
+    assert selected.title == OUTLINE.title
+
+
+def test_select_rejects_unknown_and_ambiguous_entries():
+    with pytest.raises(ValueError, match="out of range"):
+        select_outline_blocks(OUTLINE, ["4"])
+    with pytest.raises(ValueError, match="several"):
+        select_outline_blocks(OUTLINE, ["attention"])
+    with pytest.raises(ValueError, match="No outline block"):
+        select_outline_blocks(OUTLINE, ["positional encoding"])
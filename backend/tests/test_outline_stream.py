@@ -0,0 +1,64 @@
+import json
+
+from ansci import outline as outline_module
+from ansci.models import AnsciOutline
+from ansci.outline import OutlineBlockParser, OutlineStream
+
+
+OUTLINE = {
+    "title": 'Attention {is} "all" you need',
+    "blocks": [
+        {"block_title": "Intro", "text": "Sequences [one] at a time"},
+        {"block_title": "Braces {}", "text": 'Escaped \\" quote and } brace'},
+        {"block_title": "Heads", "text": "Multi-head attention\nin parallel"},
+    ],
+}
+
+
+def test_parser_emits_blocks_as_soon_as_they_close():
+    payload = json.dumps(OUTLINE)
+    parser = OutlineBlockParser()
+
+    emitted = []
+    emitted_at = []
+    for index in range(0, len(payload), 3):
+        for block in parser.feed(payload[index : index + 3]):
+            emitted.append(block)
+            emitted_at.append(index + 3)
+
+    expected = AnsciOutline(**OUTLINE)
+    assert emitted == expected.blocks
+    assert parser.title == OUTLINE["title"]
+
+    # The first block is available long before the stream ends
+    assert emitted_at[0] < len(payload) // 2
+
+
+def test_parser_ignores_nested_objects_outside_blocks():
+    payload = json.dumps({"meta": {"blocks": [{"x": 1}]}, **OUTLINE})
+    parser = OutlineBlockParser()
+
+    emitted = [block for char in payload for block in parser.feed(char)]
+
+    assert [block.block_title for block in emitted] == ["Intro", "Braces {}", "Heads"]
+
+
+def test_stream_hands_out_each_final_block_once(monkeypatch):
+    expected = AnsciOutline(**OUTLINE)
+
+    def fake_generate_outline(history, on_block=None, on_title=None, **kwargs):
+        # Merge streamed its second block, failed, then the fallback replayed
+        on_block(expected.blocks[1])
+        for block in expected.blocks[:2]:
+            on_block(block)
+        return ("", expected)
+
+    monkeypatch.setattr(outline_module, "generate_outline", fake_generate_outline)
+    stream = OutlineStream([])
+
+    blocks = list(stream.iter_blocks())
+
+    assert sorted(block.block_title for block in blocks) == sorted(
+        block.block_title for block in expected.blocks
+    )
+    assert len(blocks) == len(expected.blocks)
@@ -0,0 +1,22 @@
+from ansci.render_pool import ManimWorkerPool
+
+
+def test_stuck_job_times_out_and_worker_is_respawned(tmp_path, monkeypatch):
+    # Workers import manim on start; the stuck scene never gets to use it
+    fake = tmp_path / "fake" / "manim"
+    fake.mkdir(parents=True)
+    (fake / "__init__.py").write_text("tempconfig = None\n")
+    monkeypatch.syspath_prepend(str(fake.parent))
+
+    scene_file = tmp_path / "Scene1.py"
+    scene_file.write_text("import time\ntime.sleep(60)\n")
+
+    with ManimWorkerPool(size=1, job_timeout=1.0) as pool:
+        stuck = pool._idle.queue[0]
+
+        assert pool.render(scene_file, "Scene1", "low", tmp_path / "media") is None
+
+        assert not stuck.process.is_alive()
+        assert pool.stats["crashed"] == 1
+        replacement = pool._idle.queue[0]
+        assert replacement is not stuck and replacement.process.is_alive()
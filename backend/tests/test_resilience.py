@@ -0,0 +1,160 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ansci import llm, resilience
+from ansci.resilience import CircuitBreaker, Endpoint, TokenBucket
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__("rate limited")
+        self.headers = {"retry-after": str(retry_after)}
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Sleeping advances a fake clock instead of waiting
+    slept = []
+    clock = [resilience.time.monotonic()]
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(resilience.time, "sleep", sleep)
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    return slept
+
+
+def test_token_bucket_spaces_requests_at_the_quota():
+    bucket = TokenBucket(per_minute=60)
+
+    # A full minute's quota goes out at once, then one request per second
+    assert [bucket.reserve(1) for _ in range(60)] == [0.0] * 60
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_call_honours_retry_after_then_succeeds(sleeps):
+    endpoint = Endpoint("test")
+    responses = [RateLimited(7), "ok"]
+
+    def request():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert resilience.call(endpoint, request) == "ok"
+    assert 7 <= sum(sleeps) <= 7 + resilience.BACKOFF_BASE
+    assert endpoint.stats["retries"] == 1
+
+
+def test_retry_after_holds_back_other_callers_without_limits(sleeps):
+    endpoint = Endpoint("test")  # no rate limits configured
+
+    def rate_limited():
+        raise RateLimited(30)
+
+    # One scene's call is rate limited and gives up
+    with pytest.raises(RateLimited):
+        resilience.call(endpoint, rate_limited, can_retry=lambda: False)
+
+    # Another scene's call waits out the pause, and hedges are refused
+    assert not resilience.try_admit(endpoint)
+    assert resilience.call(endpoint, lambda: "ok") == "ok"
+    assert sum(sleeps) == pytest.approx(30)
+
+
+def test_non_retryable_errors_are_raised_at_once(sleeps):
+    endpoint = Endpoint("test")
+    calls = []
+
+    def request():
+        calls.append(1)
+        raise BadRequest("bad request")
+
+    with pytest.raises(BadRequest):
+        resilience.call(endpoint, request)
+    assert len(calls) == 1
+
+
+def test_circuit_opens_then_lets_one_probe_through():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.0)
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # After the reset timeout one caller probes while the others wait
+    assert breaker.wait_time() == 0.0
+    assert breaker.state == "half-open"
+    breaker.reset_timeout = 5.0
+    assert breaker.wait_time() > 0
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.wait_time() == 0.0
+
+
+def test_only_api_answers_close_a_half_open_circuit(sleeps):
+    import anthropic
+    import httpx
+
+    endpoint = Endpoint("test")
+    endpoint.breaker.state = "half-open"
+
+    def local_bug():
+        raise KeyError("callback bug")
+
+    # An error raised on our side leaves the circuit half-open for a new probe
+    with pytest.raises(KeyError):
+        resilience.call(endpoint, local_bug)
+    assert endpoint.breaker.state == "half-open"
+
+    def bad_request():
+        request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+        response = httpx.Response(400, request=request)
+        raise anthropic.BadRequestError("bad", response=response, body=None)
+
+    # The next call probes, and the API's 4xx answer closes the circuit
+    with pytest.raises(anthropic.BadRequestError):
+        resilience.call(endpoint, bad_request)
+    assert endpoint.breaker.state == "closed"
+
+
+class CachingClient:
+    """Reports the prompt as written to the prompt cache"""
+
+    def __init__(self):
+        self.messages = self
+
+    def create(self, stream, **kwargs):
+        usage = SimpleNamespace(
+            input_tokens=5, cache_creation_input_tokens=7500, output_tokens=1
+        )
+        message = SimpleNamespace(usage=usage)
+        return iter([SimpleNamespace(type="message_start", message=message)])
+
+
+def test_cached_paper_prefix_is_not_reserved_again(monkeypatch):
+    monkeypatch.setattr(llm, "_cached_prefixes", {})
+    paper = llm.cacheable_document(
+        {"type": "base64", "media_type": "application/pdf", "data": "A" * 400_000}
+    )
+    prompt = {"type": "text", "text": "Explain the key ideas"}
+    kwargs = {"model": "m", "messages": [{"role": "user", "content": [paper, prompt]}]}
+
+    assert llm.estimate_input_tokens(kwargs) == 7505
+    llm.stream_message(CachingClient(), "test", hedge=False, **kwargs)
+
+    # The paper is read from the prompt cache now; only the prompt is reserved
+    assert llm.estimate_input_tokens(kwargs) == 5
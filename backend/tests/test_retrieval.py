@@ -0,0 +1,51 @@
+from ansci.models import PaperSection, PaperText
+from ansci.retrieval import PaperIndex, format_passages
+
+
+def _paper():
+    return PaperText(
+        digest="test",
+        page_count=3,
+        sections=[
+            PaperSection(
+                heading="1 Introduction",
+                pages=[1],
+                text="Recurrent networks process tokens one at a time. " * 10,
+            ),
+            PaperSection(
+                heading="3.2 Attention",
+                pages=[2],
+                text="Scaled dot-product attention divides the query key dot "
+                "products by the square root of the key dimension before the "
+                "softmax. " * 5,
+            ),
+            PaperSection(
+                heading="5 Training",
+                pages=[3],
+                text="We trained on eight GPUs with the Adam optimizer and "
+                "label smoothing. " * 8,
+            ),
+        ],
+    )
+
+
+def test_search_ranks_the_matching_section_first():
+    index = PaperIndex.from_paper(_paper())
+
+    results = index.search("Why is attention scaled by the square root?", k=2)
+
+    assert results[0][0].heading == "3.2 Attention"
+    assert all(score > 0 for _, score in results)
+    assert index.search("quantum chromodynamics") == []
+
+
+def test_long_sections_split_into_overlapping_passages():
+    index = PaperIndex.from_paper(_paper(), passage_words=20, overlap=5)
+
+    intro = [p for p in index.passages if p.heading == "1 Introduction"]
+    assert len(intro) > 1
+    assert intro[0].text.split()[-5:] == intro[1].text.split()[:5]
+
+    prompt = format_passages(index.search("optimizer", k=1))
+    assert prompt.startswith("RELEVANT PAPER PASSAGES")
+    assert "5 Training (p. 3)" in prompt
@@ -0,0 +1,10 @@
+from ansci.routing import DEFAULT_ROUTES, Route, route, scene_routes
+
+
+def test_routes_use_defaults_and_environment_overrides(monkeypatch):
+    assert route("transcript") == DEFAULT_ROUTES["transcript"]
+
+    monkeypatch.setenv("ANSCI_TRANSCRIPT_MODEL", "claude-sonnet-4-20250514")
+    monkeypatch.setenv("ANSCI_TRANSCRIPT_MAX_TOKENS", "2048")
+    assert route("transcript") == Route("claude-sonnet-4-20250514", 2048)
+    assert scene_routes()["transcript"].max_tokens == 2048
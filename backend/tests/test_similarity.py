@@ -0,0 +1,50 @@
+from ansci.models import AnsciOutlineBlock, AnsciSceneBlock
+from ansci.similarity import SceneIndex
+
+
+SOFTMAX = AnsciOutlineBlock(
+    block_title="Scaled dot-product attention",
+    text="Queries are compared with keys by dot products, scaled by the square "
+    "root of the key dimension, and a softmax turns the scores into weights "
+    "over the values.",
+)
+REPHRASED = AnsciOutlineBlock(
+    block_title="Scaled dot-product attention",
+    text="Queries are compared with keys using dot products scaled by the square "
+    "root of the key dimension, then a softmax turns the scores into weights "
+    "over values.",
+)
+UNRELATED = AnsciOutlineBlock(
+    block_title="Training schedule",
+    text="The model trains for three days on eight GPUs with a warmup learning "
+    "rate schedule, label smoothing and residual dropout for regularization.",
+)
+SCENE = AnsciSceneBlock(
+    transcript="t", description="d", manim_code="class Scene2(Scene): pass"
+)
+
+
+def test_index_reuses_near_duplicates_across_runs(tmp_path):
+    SceneIndex(root=tmp_path).add(SOFTMAX, "Scene2", SCENE)
+    SceneIndex(root=tmp_path).add(UNRELATED, "Scene5", SCENE)
+
+    index = SceneIndex(root=tmp_path)
+    scene, scene_name, score = index.lookup(REPHRASED)
+    assert scene == SCENE
+    assert scene_name == "Scene2"
+    assert score >= index.threshold
+
+    # Scenes added in the same run are not reused within it
+    index.add(REPHRASED, "Scene3", SCENE)
+    assert index.lookup(REPHRASED)[1] == "Scene2"
+
+
+def test_index_evicts_least_recently_used(tmp_path):
+    index = SceneIndex(root=tmp_path, max_entries=1)
+    index.add(SOFTMAX, "Scene2", SCENE)
+    index.add(UNRELATED, "Scene5", SCENE)
+
+    reloaded = SceneIndex(root=tmp_path, max_entries=1)
+    assert len(reloaded) == 1
+    assert reloaded.lookup(REPHRASED) is None
+    assert index.stats["evictions"] == 1
@@ -0,0 +1,28 @@
+from ansci.verify import SCENE_HEADER, PythonCodeValidator
+
+
+SCENE = """
+class Scene1(Scene):
+    @validate_scene
+    def construct(self):
+        title = Text("Attention", font_size=AnimationPresets.TITLE_SIZE)
+        title.move_to(LayoutManager.safe_position(title, [0, 3, 0]))
+"""
+
+
+def test_scenes_importing_the_runtime_pass_cleanly():
+    result = PythonCodeValidator().validate_manim_specific(SCENE_HEADER + SCENE)
+
+    assert result.is_valid
+    assert result.warnings == []
+
+
+def test_redefined_or_unimported_runtime_helpers_are_flagged():
+    inline = "class LayoutManager:\n    pass\n" + SCENE
+    result = PythonCodeValidator().validate_manim_specific(inline)
+
+    assert result.is_valid
+    assert any("Redefines LayoutManager" in w for w in result.warnings)
+    assert any(
+        "Uses AnimationPresets, validate_scene without" in w for w in result.warnings
+    )
@@ -0,0 +1,48 @@
+from io import BytesIO
+
+from ansci import workflow
+from ansci.models import AnsciOutline, AnsciSceneBlock
+
+
+OUTLINE = AnsciOutline(
+    title="Attention",
+    blocks=[
+        {"block_title": "Intro", "text": "Sequences"},
+        {"block_title": "Heads", "text": "Multi-head attention"},
+    ],
+)
+
+
+class FakeOutlineStream:
+    def __init__(self, history, **kwargs):
+        pass
+
+    def result(self):
+        return ("outline", OUTLINE)
+
+
+def test_streamed_outline_reaches_the_success_summary(monkeypatch, tmp_path, capsys):
+    scenes = [
+        AnsciSceneBlock(transcript="t", description="d", manim_code="c")
+        for _ in OUTLINE.blocks
+    ]
+    monkeypatch.setattr(workflow, "OutlineStream", FakeOutlineStream)
+    monkeypatch.setattr(
+        workflow, "create_ansci_animation", lambda history, outline, **kw: scenes
+    )
+    monkeypatch.setattr(
+        workflow,
+        "render_audiovisual_animation_embedded",
+        lambda animation, **kw: [str(tmp_path / "scene_1.mp4")],
+    )
+    monkeypatch.setattr(workflow, "_verify_audio_in_video", lambda path: True)
+
+    paths = workflow.create_animation(
+        BytesIO(b"%PDF-1.4"),
+        str(tmp_path / "out"),
+        use_cache=False,
+        stream_outline=True,
+    )
+
+    assert paths == [str(tmp_path / "scene_1.mp4")]
+    assert "📋 Outline: 2 sections" in capsys.readouterr().out